@@ -11,6 +11,7 @@ from django.contrib.auth import authenticate
 from django.core.mail import send_mail
 from django.conf import settings
 from django.utils import timezone
+from securecrop import http
 from .models import User, PasswordResetToken
 from .permissions import IsAdminUser
 from .serializers import (
@@ -291,8 +292,6 @@ class PasswordResetRequestView(APIView):
                 error_message = None
                 
                 try:
-                    import requests
-                    
                     # Use Brevo API instead of SMTP (Render blocks SMTP ports on free tier)
                     brevo_api_key = os.getenv('BREVO_API_KEY')
                     
@@ -340,7 +339,7 @@ class PasswordResetRequestView(APIView):
                     """
                     
                     # Send via Brevo HTTP API
-                    response = requests.post(
+                    response = http.post(
                         'https://api.brevo.com/v3/smtp/email',
                         headers={
                             'accept': 'application/json',
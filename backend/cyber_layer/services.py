@@ -4,69 +4,49 @@ Cybersecurity services for data validation and anomaly detection.
 This module provides:
 1. Pre-ML checks: Input validation, anomaly detection, integrity hashing
 2. Post-ML checks: Confidence validation, result verification
-3. Security logging to CyberLog
+3. Security logging to CyberLog (buffered, see logs.writer)
 """
 
 import hashlib
 import numpy as np
-from sklearn.ensemble import IsolationForest
-import joblib
-from pathlib import Path
-from logs.models import CyberLog
+from django.conf import settings
+from logs.writer import log_security_event
+from ml_engine import registry
+from ml_engine.anomaly import anomaly_scores
+from securecrop.cache import TieredCache
 
 
-# Cache for anomaly detector
-_anomaly_detector = None
+# Anomaly verdicts of recently checked inputs, keyed by (model version, integrity hash)
+_anomaly_cache = TieredCache(
+    'anomaly',
+    maxsize=getattr(settings, 'PREDICTION_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'PREDICTION_CACHE_TTL', 3600)
+)
+
+# Soil parameters in detector feature order
+SOIL_FIELDS = ('N_level', 'P_level', 'K_level', 'ph', 'moisture', 'temperature')
 
 
 def get_anomaly_detector():
     """
-    Load or create anomaly detection model (IsolationForest).
+    Return the anomaly detection model (IsolationForest).
+    
+    The detector is trained offline by ml_engine/train_model.py and loaded
+    with the crop models by the model registry at warm-up.
     
     Returns:
         Trained IsolationForest model
     """
-    global _anomaly_detector
-    
-    if _anomaly_detector is not None:
-        return _anomaly_detector
-    
-    # Try to load pre-trained detector
-    base_dir = Path(__file__).resolve().parent
-    detector_path = base_dir / 'anomaly_detector.joblib'
-    
-    if detector_path.exists():
-        _anomaly_detector = joblib.load(detector_path)
-    else:
-        # Create and train a new detector with typical soil parameter ranges
-        # Generate training data based on normal ranges
-        np.random.seed(42)
-        training_data = []
-        
-        # Generate normal samples
-        for _ in range(500):
-            sample = [
-                np.random.uniform(10, 150),   # N
-                np.random.uniform(5, 100),    # P
-                np.random.uniform(5, 100),    # K
-                np.random.uniform(4.5, 8.5),  # pH
-                np.random.uniform(20, 95),    # moisture
-                np.random.uniform(5, 45)      # temperature
-            ]
-            training_data.append(sample)
-        
-        # Train IsolationForest
-        _anomaly_detector = IsolationForest(
-            contamination=0.1,
-            random_state=42,
-            n_estimators=100
-        )
-        _anomaly_detector.fit(training_data)
-        
-        # Save detector
-        joblib.dump(_anomaly_detector, detector_path)
-    
-    return _anomaly_detector
+    return registry.get_anomaly_detector()
+
+
+def _active_detector():
+    """Return (detector, model_version); the version is None without crop models."""
+    try:
+        bundle = registry.get_bundle()
+        return bundle.anomaly_detector, bundle.version
+    except FileNotFoundError:
+        return registry.get_anomaly_detector(), None
 
 
 def compute_integrity_hash(soil_data):
@@ -120,6 +100,28 @@ def validate_ranges(soil_data):
     return True, None
 
 
+def detect_anomalies_batch(feature_matrix, detector=None):
+    """
+    Score many soil readings with the IsolationForest in one call.
+    
+    Args:
+        feature_matrix: 2-D array with columns N, P, K, pH, moisture, temperature
+        detector: Optional detector (default: the active one)
+        
+    Returns:
+        tuple: (is_anomalous, scores)
+            - is_anomalous: Boolean array, True where the row is anomalous
+            - scores: Continuous anomaly score per row (positive means
+              anomalous, higher is more unusual)
+    """
+    features = np.asarray(feature_matrix, dtype=float).reshape(-1, len(SOIL_FIELDS))
+    if features.shape[0] == 0:
+        return np.zeros(0, dtype=bool), np.zeros(0)
+    
+    detector = detector or get_anomaly_detector()
+    return anomaly_scores(detector, features)
+
+
 def detect_anomaly(soil_data):
     """
     Detect if soil data is anomalous using IsolationForest.
@@ -130,22 +132,21 @@ def detect_anomaly(soil_data):
     Returns:
         bool: True if anomaly detected, False otherwise
     """
-    detector = get_anomaly_detector()
-    
-    # Prepare features
-    features = np.array([[
-        soil_data['N_level'],
-        soil_data['P_level'],
-        soil_data['K_level'],
-        soil_data['ph'],
-        soil_data['moisture'],
-        soil_data['temperature']
-    ]])
-    
-    # Predict: -1 for anomaly, 1 for normal
-    prediction = detector.predict(features)
-    
-    return prediction[0] == -1
+    is_anomalous, _ = detect_anomalies_batch([[soil_data[field] for field in SOIL_FIELDS]])
+    return bool(is_anomalous[0])
+
+
+def _describe_anomaly(soil_data, is_anomalous):
+    """Return (integrity_status, details) for a checked reading."""
+    if is_anomalous:
+        return 'ANOMALY', (
+            f"Anomaly detected in soil data. "
+            f"Values: N={soil_data['N_level']:.1f}, P={soil_data['P_level']:.1f}, "
+            f"K={soil_data['K_level']:.1f}, pH={soil_data['ph']:.1f}, "
+            f"moisture={soil_data['moisture']:.1f}%, temp={soil_data['temperature']:.1f}°C. "
+            f"Data appears unusual but within valid ranges."
+        )
+    return 'OK', "All pre-ML security checks passed. Data appears normal."
 
 
 def pre_ml_checks(soil_data, user):
@@ -155,7 +156,7 @@ def pre_ml_checks(soil_data, user):
     Steps:
     1. Validate data types and schema
     2. Check value ranges
-    3. Detect anomalies using IsolationForest
+    3. Detect anomalies using IsolationForest (cached per model version and integrity hash)
     4. Compute integrity hash
     5. Log results to CyberLog
     
@@ -168,7 +169,8 @@ def pre_ml_checks(soil_data, user):
             'anomaly_detected': bool,
             'integrity_status': str,
             'integrity_hash': str,
-            'details': str
+            'details': str,
+            'cyber_log': unsaved CyberLog event (set its input once saved)
         }
         
     Raises:
@@ -180,8 +182,7 @@ def pre_ml_checks(soil_data, user):
     is_valid, error_msg = validate_ranges(soil_data)
     if not is_valid:
         # Log severe validation failure
-        CyberLog.objects.create(
-            input=None,
+        log_security_event(
             anomaly_detected=True,
             integrity_status='OUT_OF_RANGE',
             details=f"Range validation failed: {error_msg}"
@@ -191,26 +192,20 @@ def pre_ml_checks(soil_data, user):
     # 2. Compute integrity hash
     integrity_hash = compute_integrity_hash(soil_data)
     
-    # 3. Detect anomalies
-    is_anomalous = detect_anomaly(soil_data)
+    # 3. Detect anomalies (repeat submissions reuse the earlier verdict)
+    detector, model_version = _active_detector()
+    is_anomalous = _anomaly_cache.get((model_version, integrity_hash))
+    if is_anomalous is None:
+        is_anomalous = bool(
+            detect_anomalies_batch([[soil_data[field] for field in SOIL_FIELDS]], detector)[0][0]
+        )
+        _anomaly_cache.set((model_version, integrity_hash), is_anomalous)
     
     # 4. Determine integrity status
-    if is_anomalous:
-        integrity_status = 'ANOMALY'
-        details = (
-            f"Anomaly detected in soil data. "
-            f"Values: N={soil_data['N_level']:.1f}, P={soil_data['P_level']:.1f}, "
-            f"K={soil_data['K_level']:.1f}, pH={soil_data['ph']:.1f}, "
-            f"moisture={soil_data['moisture']:.1f}%, temp={soil_data['temperature']:.1f}°C. "
-            f"Data appears unusual but within valid ranges."
-        )
-    else:
-        integrity_status = 'OK'
-        details = "All pre-ML security checks passed. Data appears normal."
+    integrity_status, details = _describe_anomaly(soil_data, is_anomalous)
     
-    # 5. Log to CyberLog (will be updated with input reference after SoilInput is saved)
-    cyber_log = CyberLog.objects.create(
-        input=None,  # Will be updated after SoilInput creation
+    # 5. Log to CyberLog (linked to the SoilInput once it is saved, see logs.writer)
+    cyber_log = log_security_event(
         anomaly_detected=is_anomalous,
         integrity_status=integrity_status,
         details=details
@@ -221,10 +216,88 @@ def pre_ml_checks(soil_data, user):
         'integrity_status': integrity_status,
         'integrity_hash': integrity_hash,
         'details': details,
-        'cyber_log_id': cyber_log.id
+        'cyber_log': cyber_log
     }
 
 
+def pre_ml_checks_batch(soil_data_list, user):
+    """
+    Perform pre-ML cybersecurity checks on many soil readings at once.
+    
+    Same checks as pre_ml_checks, but every uncached reading is scored in a
+    single IsolationForest call.
+    
+    Args:
+        soil_data_list: List of soil parameter dictionaries
+        user: User object who submitted the data
+        
+    Returns:
+        list: One pre_ml_checks-style result dict per reading, plus 'anomaly_score'
+            (None for readings served from the verdict cache)
+        
+    Raises:
+        ValidationError: If any reading is out of range ({'index', 'detail'})
+    """
+    from rest_framework.exceptions import ValidationError
+    
+    # 1. Validate ranges (the whole batch is rejected on the first failure)
+    for index, soil_data in enumerate(soil_data_list):
+        is_valid, error_msg = validate_ranges(soil_data)
+        if not is_valid:
+            log_security_event(
+                anomaly_detected=True,
+                integrity_status='OUT_OF_RANGE',
+                details=f"Range validation failed: {error_msg}"
+            )
+            raise ValidationError({'index': index, 'detail': error_msg})
+    
+    # 2. Compute integrity hashes
+    integrity_hashes = [compute_integrity_hash(soil_data) for soil_data in soil_data_list]
+    
+    # 3. Detect anomalies for all uncached readings in one pass
+    detector, model_version = _active_detector()
+    verdicts = [_anomaly_cache.get((model_version, h)) for h in integrity_hashes]
+    scores = [None] * len(soil_data_list)
+    missing = [index for index, verdict in enumerate(verdicts) if verdict is None]
+    if missing:
+        is_anomalous, anomaly_score = detect_anomalies_batch(
+            [[soil_data_list[index][field] for field in SOIL_FIELDS] for index in missing],
+            detector
+        )
+        for index, anomalous, score in zip(missing, is_anomalous, anomaly_score):
+            verdicts[index] = bool(anomalous)
+            scores[index] = float(score)
+            _anomaly_cache.set((model_version, integrity_hashes[index]), verdicts[index])
+    
+    # 4-5. Determine integrity status and log to CyberLog
+    descriptions = [
+        _describe_anomaly(soil_data, verdict)
+        for soil_data, verdict in zip(soil_data_list, verdicts)
+    ]
+    cyber_logs = [
+        log_security_event(
+            anomaly_detected=verdict,
+            integrity_status=integrity_status,
+            details=details
+        )
+        for verdict, (integrity_status, details) in zip(verdicts, descriptions)
+    ]
+    
+    return [
+        {
+            'anomaly_detected': verdict,
+            'anomaly_score': score,
+            'integrity_status': integrity_status,
+            'integrity_hash': integrity_hash,
+            'details': details,
+            'cyber_log': cyber_log
+        }
+        for verdict, score, (integrity_status, details), integrity_hash, cyber_log in zip(
+            verdicts, scores, descriptions, integrity_hashes, cyber_logs
+        )
+    ]
+
+
 def post_ml_checks(prediction, probability, soil_input):
     """
     Perform post-ML cybersecurity checks on prediction results.
@@ -266,11 +339,11 @@ def post_ml_checks(prediction, probability, soil_input):
         anomaly_detected = False
     
     # Log to CyberLog
-    CyberLog.objects.create(
-        input=soil_input,
+    log_security_event(
         anomaly_detected=anomaly_detected,
         integrity_status=integrity_status,
-        details=details
+        details=details,
+        input=soil_input
     )
     
     return {
@@ -1,3 +1,64 @@
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
 from django.test import TestCase
 
-# Create your tests here.
+from accounts.models import User
+from logs.models import CyberLog
+from ml_engine import registry
+from ml_engine.tests import TrainedModelsMixin
+from . import services
+
+
+NORMAL = {'N_level': 80, 'P_level': 45, 'K_level': 40, 'ph': 6.5, 'moisture': 80, 'temperature': 24}
+UNUSUAL = {'N_level': 195, 'P_level': 190, 'K_level': 5, 'ph': 3.0, 'moisture': 2, 'temperature': 55}
+
+
+class AnomalyDetectionTest(TrainedModelsMixin, TestCase):
+    """Test cases for vectorized anomaly scoring."""
+    
+    def setUp(self):
+        services._anomaly_cache.clear()
+        self.user = User.objects.create_user(
+            email='cyber@example.com',
+            username='cyberuser',
+            password='testpass123'
+        )
+    
+    def test_detector_loaded_with_bundle(self):
+        """The detector comes from the published model version."""
+        self.assertIs(services.get_anomaly_detector(), registry.get_bundle().anomaly_detector)
+    
+    def test_batch_scores_match_predict(self):
+        """Batch verdicts agree with IsolationForest.predict and scores are continuous."""
+        rows = [[NORMAL[f] for f in services.SOIL_FIELDS], [UNUSUAL[f] for f in services.SOIL_FIELDS]]
+        is_anomalous, scores = services.detect_anomalies_batch(rows)
+        predicted = services.get_anomaly_detector().predict(np.array(rows, dtype=float)) == -1
+        np.testing.assert_array_equal(is_anomalous, predicted)
+        self.assertEqual(list(is_anomalous), [False, True])
+        self.assertLess(scores[0], 0)
+        self.assertGreater(scores[1], 0)
+    
+    def test_pre_ml_checks_batch(self):
+        """Batch checks score all rows at once and bulk-insert the logs."""
+        with mock.patch.object(services, 'detect_anomalies_batch', wraps=services.detect_anomalies_batch) as batch, \
+                self.captureOnCommitCallbacks(execute=True):
+            results = services.pre_ml_checks_batch([NORMAL, UNUSUAL], self.user)
+            self.assertEqual(batch.call_count, 1)
+        
+        self.assertEqual([r['integrity_status'] for r in results], ['OK', 'ANOMALY'])
+        self.assertEqual(results[0]['integrity_hash'], services.compute_integrity_hash(NORMAL))
+        self.assertEqual(CyberLog.objects.count(), 2)
+    
+    def test_request_never_fits_detector(self):
+        """Without crop models the shipped detector is used, never fitted per request."""
+        registry.MODELS_DIR = Path(self._models_tmpdir) / 'missing'
+        try:
+            registry.reset()
+            with mock.patch('ml_engine.registry.fit_synthetic_detector') as fit:
+                self.assertFalse(services.detect_anomaly(NORMAL))
+                fit.assert_not_called()
+        finally:
+            registry.MODELS_DIR = Path(self._models_tmpdir)
+            registry.reset()
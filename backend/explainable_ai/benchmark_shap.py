@@ -0,0 +1,103 @@
+"""
+Latency benchmark for SHAP explanations.
+
+Compares the per-request cost of:
+1. The original path (scaler.transform + model.predict + full multi-class
+   SHAP with the additivity check)
+2. SHAP for the predicted class only, reusing the inference step's
+   scaled features and class
+3. The same, batched over many rows (per-row cost)
+
+Usage (from backend/, after training):
+    python explainable_ai/benchmark_shap.py [--iterations 50] [--batch-size 200]
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+import django
+
+# Setup Django (the explanation services read cache settings)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'securecrop.settings')
+os.environ.setdefault('ML_EAGER_LOAD', 'False')
+django.setup()
+
+from ml_engine import registry
+from explainable_ai.services import compute_shap_values
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark SHAP explanation latency')
+    parser.add_argument('--iterations', type=int, default=50, help='single-row requests per path')
+    parser.add_argument('--batch-size', type=int, default=200, help='rows for the batched test')
+    args = parser.parse_args()
+    
+    try:
+        bundle = registry.get_bundle()
+    except FileNotFoundError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    
+    rf_model = bundle.rf_model
+    scaler = bundle.scaler
+    explainer = bundle.explainer
+    if explainer is None:
+        print("❌ SHAP explainer could not be created for this model")
+        sys.exit(1)
+    
+    # Random rows around the training distribution
+    rng = np.random.RandomState(42)
+    raw = rng.uniform([0, 5, 5, 10, 15, 4], [140, 145, 205, 40, 100, 9], size=(args.iterations, 6))
+    rows_scaled = scaler.transform(raw)
+    class_indices = np.argmax(rf_model.predict_proba(rows_scaled), axis=1)
+    
+    def original_path(index):
+        features_scaled = scaler.transform(raw[index:index + 1])
+        rf_model.predict(features_scaled)
+        explainer.shap_values(features_scaled)
+    
+    def class_path(index):
+        compute_shap_values(explainer, rows_scaled[index:index + 1], class_indices[index:index + 1])
+    
+    print("=" * 60)
+    print(f"SHAP latency per request ({args.iterations} requests, "
+          f"{len(rf_model.estimators_)} trees, {len(rf_model.classes_)} classes, version {bundle.version})")
+    print("=" * 60)
+    
+    results = {}
+    for name, fn in [('original (all classes)', original_path), ('predicted class only', class_path)]:
+        fn(0)  # warm up
+        latencies = []
+        for index in range(args.iterations):
+            start = time.perf_counter()
+            fn(index)
+            latencies.append((time.perf_counter() - start) * 1000)
+        results[name] = np.percentile(latencies, 50)
+        print(f"{name:30s} p50={np.percentile(latencies, 50):8.2f} ms  "
+              f"p99={np.percentile(latencies, 99):8.2f} ms")
+    
+    batch_raw = rng.uniform([0, 5, 5, 10, 15, 4], [140, 145, 205, 40, 100, 9], size=(args.batch_size, 6))
+    batch_scaled = scaler.transform(batch_raw)
+    batch_classes = np.argmax(rf_model.predict_proba(batch_scaled), axis=1)
+    start = time.perf_counter()
+    compute_shap_values(explainer, batch_scaled, batch_classes)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"{'batched, predicted class':30s} {elapsed / args.batch_size:8.2f} ms/row  "
+          f"({args.batch_size} rows, {len(np.unique(batch_classes))} distinct classes)")
+    
+    speedup = results['original (all classes)'] / results['predicted class only']
+    print(f"\nSingle-request speedup: {speedup:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,204 +5,369 @@ This module provides:
 1. SHAP value computation for tree-based models
 2. Feature importance analysis
 3. Human-readable explanations for farmers
+4. AI farming guides from Gemini, cached per crop and soil profile
+
+SHAP is the slowest step of a recommendation, so explanations reuse the
+scaled features and predicted class from the inference step, compute
+SHAP values for the predicted class only and process many rows per call.
+Repeated inputs skip this step through the prediction cache
+(recommendations.cache), which stores the explanation with the crop.
 """
 
+import copy
+import threading
+import weakref
+
 import numpy as np
 import shap
-from ml_engine.services import get_feature_names, load_scaler, load_label_encoder
+from django.conf import settings
+from ml_engine.registry import get_bundle
+from ml_engine.services import get_feature_names, get_class_names
+from securecrop.cache import TieredCache
+
+
+# Single-output views of each explainer, built lazily per predicted class
+_class_explainers = weakref.WeakKeyDictionary()
+_class_explainers_lock = threading.Lock()
+
+# Gemini farming guides keyed by (crop, bucketed soil profile); the prompt
+# only carries the bucket ranges, so a guide holds no one farmer's readings
+_farming_guide_cache = TieredCache(
+    'farming_guide_ranges',
+    maxsize=getattr(settings, 'FARMING_GUIDE_CACHE_SIZE', 512),
+    ttl=getattr(settings, 'FARMING_GUIDE_CACHE_TTL', 7 * 24 * 3600)
+)
 
+# Bucket width per soil parameter for the farming guide cache key
+SOIL_PROFILE_BUCKETS = {
+    'N_level': 20,
+    'P_level': 20,
+    'K_level': 20,
+    'ph': 0.5,
+    'moisture': 10,
+    'temperature': 5,
+}
 
-# Cache for SHAP explainer
-_explainer_cache = None
+# Gemini generateContent endpoint (GEMINI_API_URL overrides it, e.g. for a local stub)
+GEMINI_API_URL = 'https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent'
 
 
-def get_explainer(model):
+def get_explainer(model, bundle=None):
     """
-    Get or create SHAP explainer for the model.
+    Get SHAP explainer for the model.
+    
+    The explainer for the active Random Forest is built once per model
+    version and held in the model registry bundle, so it is swapped
+    together with the model it explains.
     
     Args:
         model: Trained scikit-learn model
-        
+        bundle: Optional ModelBundle (if None, the active bundle is used)
+    
     Returns:
         SHAP explainer object
     """
-    global _explainer_cache
+    bundle = bundle or get_bundle()
     
-    if _explainer_cache is not None:
-        return _explainer_cache
+    if model is bundle.rf_model and bundle.explainer is not None:
+        return bundle.explainer
     
     # Create appropriate explainer based on model type
     model_name = type(model).__name__
     
     if 'RandomForest' in model_name or 'Tree' in model_name:
         # Use TreeExplainer for tree-based models
-        _explainer_cache = shap.TreeExplainer(model)
-    else:
-        # Use KernelExplainer for other models (slower but universal)
-        # Generate background data for KernelExplainer
-        background = shap.sample(np.random.randn(100, 6), 50)
-        _explainer_cache = shap.KernelExplainer(model.predict, background)
+        return shap.TreeExplainer(model)
     
-    return _explainer_cache
+    # Use KernelExplainer for other models (slower but universal)
+    # Generate background data for KernelExplainer
+    background = shap.sample(np.random.randn(100, 6), 50)
+    return shap.KernelExplainer(model.predict, background)
 
 
-def generate_explanation(model, soil_input):
+def _slice_tree_explainer(explainer, class_index):
     """
-    Generate human-readable explanation for crop recommendation using SHAP.
+    Build a TreeExplainer that only explains one output of a multi-class model.
+    
+    Tree SHAP accumulates every output at each leaf, so explaining one class
+    instead of all of them skips most of the work. The copy shares the tree
+    structure and only holds that class's leaf values.
+    """
+    tree_model = explainer.model
+    values = getattr(tree_model, 'values', None)
+    if values is None or values.ndim != 3 or values.shape[2] < 2:
+        return explainer
+    
+    class_model = copy.copy(tree_model)
+    class_model.values = np.ascontiguousarray(values[:, :, class_index:class_index + 1])
+    class_model.num_outputs = 1
+    if np.ndim(tree_model.base_offset):
+        class_model.base_offset = np.asarray(tree_model.base_offset)[class_index:class_index + 1]
+    
+    class_explainer = copy.copy(explainer)
+    class_explainer.model = class_model
+    expected_value = np.atleast_1d(explainer.expected_value)
+    class_explainer.expected_value = expected_value[class_index] if len(expected_value) > class_index else None
+    return class_explainer
+
+
+def get_class_explainer(explainer, class_index):
+    """
+    Return a (cached) explainer for a single predicted class.
     
     Args:
-        model: Trained ML model
-        soil_input: SoilInput instance
-        
+        explainer: Multi-class SHAP explainer
+        class_index: Column of the class in model.predict_proba
+    
     Returns:
-        str: Natural language explanation
+        SHAP explainer with one output, or the original explainer if it
+        cannot be restricted to one class
     """
-    try:
-        # Get feature names and values
-        feature_names = get_feature_names()
-        feature_values = soil_input.to_feature_array()
-        
-        # Scale features
-        scaler = load_scaler()
-        features_scaled = scaler.transform(np.array(feature_values).reshape(1, -1))
-        
-        # Get prediction (encoded)
-        prediction_encoded = model.predict(features_scaled)[0]
-        
-        # Decode prediction to crop name
-        try:
-            label_encoder = load_label_encoder()
-            if isinstance(prediction_encoded, (int, np.integer)):
-                prediction = label_encoder.inverse_transform([prediction_encoded])[0]
-            else:
-                prediction = prediction_encoded  # Already decoded
-        except:
-            prediction = str(prediction_encoded)  # Fallback to raw prediction
-        
-        # Get SHAP explainer
-        explainer = get_explainer(model)
-        
-        # Compute SHAP values
-        shap_values = explainer.shap_values(features_scaled)
-        
-        # Handle multi-class output (SHAP returns list of arrays)
-        if isinstance(shap_values, list):
-            # Get the class index for the prediction (use encoded value)
-            classes = model.classes_
-            pred_idx = np.where(classes == prediction_encoded)[0][0]
-            shap_values_for_pred = shap_values[pred_idx][0]
-        else:
-            shap_values_for_pred = shap_values[0]
-        
-        # Get top 3 most influential features
-        feature_importance = list(zip(feature_names, feature_values, shap_values_for_pred))
-        feature_importance.sort(key=lambda x: abs(x[2]), reverse=True)
-        top_features = feature_importance[:3]
-        
-        # Build explanation
-        explanation_parts = [
-            f"The recommended crop is **{prediction}** based on your soil analysis."
-        ]
-        
-        # Feature descriptions
-        feature_descriptions = {
-            'N': ('Nitrogen level', 'mg/kg'),
-            'P': ('Phosphorus level', 'mg/kg'),
-            'K': ('Potassium level', 'mg/kg'),
-            'ph': ('pH level', ''),
-            'moisture': ('Moisture content', '%'),
-            'temperature': ('Temperature', '°C')
-        }
-        
-        # Add key factors
-        explanation_parts.append("\n\n**Key factors influencing this recommendation:**")
-        
-        for i, (feature, value, importance) in enumerate(top_features, 1):
-            desc, unit = feature_descriptions[feature]
-            
-            # Determine if feature supports or opposes the recommendation
-            if importance > 0:
-                effect = "strongly supports"
-            else:
-                effect = "moderately influences"
-            
-            explanation_parts.append(
-                f"\n{i}. **{desc}**: {value:.1f} {unit} - This {effect} the recommendation for {prediction}."
-            )
-        
-        # Add soil condition assessment
-        explanation_parts.append("\n\n**Soil Condition Summary:**")
-        
-        # NPK assessment
-        npk_avg = (feature_values[0] + feature_values[1] + feature_values[2]) / 3
-        if npk_avg > 100:
-            npk_status = "high nutrient levels"
-        elif npk_avg > 50:
-            npk_status = "moderate nutrient levels"
-        else:
-            npk_status = "low to moderate nutrient levels"
-        
-        explanation_parts.append(f"- Your soil has {npk_status} (N: {feature_values[0]:.1f}, P: {feature_values[1]:.1f}, K: {feature_values[2]:.1f}).")
+    if not isinstance(explainer, shap.TreeExplainer):
+        return explainer
+    
+    with _class_explainers_lock:
+        per_class = _class_explainers.setdefault(explainer, {})
+        class_explainer = per_class.get(class_index)
+        if class_explainer is None:
+            try:
+                class_explainer = _slice_tree_explainer(explainer, class_index)
+            except Exception as e:
+                print(f"Per-class SHAP explainer unavailable: {e}")
+                class_explainer = explainer
+            per_class[class_index] = class_explainer
+        return class_explainer
+
+
+def _select_class(shap_values, class_index):
+    """Pick one class from the multi-class SHAP output formats."""
+    if isinstance(shap_values, list):
+        return shap_values[class_index]
+    shap_values = np.asarray(shap_values)
+    if shap_values.ndim == 3:
+        return shap_values[:, :, class_index]
+    return shap_values
+
+
+def compute_shap_values(explainer, features_scaled, class_indices):
+    """
+    Compute SHAP values of each row's predicted class.
+    
+    Rows are grouped by predicted class, so a batch needs one SHAP call per
+    distinct class instead of one per row.
+    
+    Args:
+        explainer: SHAP explainer for the model
+        features_scaled: 2-D array of scaled features
+        class_indices: Predicted class column per row
+    
+    Returns:
+        np.ndarray: Shape (n_samples, n_features)
+    """
+    features_scaled = np.asarray(features_scaled, dtype=float)
+    class_indices = np.asarray(class_indices)
+    shap_matrix = np.zeros(features_scaled.shape)
+    
+    for class_index in np.unique(class_indices):
+        rows = np.flatnonzero(class_indices == class_index)
+        class_explainer = get_class_explainer(explainer, int(class_index))
         
-        # pH assessment
-        ph_value = feature_values[3]
-        if ph_value < 5.5:
-            ph_status = "acidic"
-        elif ph_value > 7.5:
-            ph_status = "alkaline"
+        if isinstance(class_explainer, shap.TreeExplainer):
+            # Predictions come from the model itself; skip the additivity re-check
+            values = class_explainer.shap_values(features_scaled[rows], check_additivity=False)
         else:
-            ph_status = "neutral"
+            values = class_explainer.shap_values(features_scaled[rows])
         
-        explanation_parts.append(f"- The pH level of {ph_value:.1f} indicates {ph_status} soil, which is suitable for {prediction}.")
+        if class_explainer is explainer:
+            values = _select_class(values, int(class_index))
+        shap_matrix[rows] = np.asarray(values).reshape(len(rows), -1)
+    
+    return shap_matrix
+
+
+def build_explanation_text(prediction, feature_values, shap_values_for_pred):
+    """
+    Turn the SHAP values of one prediction into a farmer-friendly explanation.
+    
+    Args:
+        prediction: Predicted crop name
+        feature_values: Raw feature values in SoilInput.to_feature_array() order
+        shap_values_for_pred: SHAP value per feature for the predicted class
+    
+    Returns:
+        str: Natural language explanation
+    """
+    feature_names = get_feature_names()
+    
+    # Get top 3 most influential features
+    feature_importance = list(zip(feature_names, feature_values, shap_values_for_pred))
+    feature_importance.sort(key=lambda x: abs(x[2]), reverse=True)
+    top_features = feature_importance[:3]
+    
+    # Build explanation
+    explanation_parts = [
+        f"The recommended crop is **{prediction}** based on your soil analysis."
+    ]
+    
+    # Feature descriptions
+    feature_descriptions = {
+        'N': ('Nitrogen level', 'mg/kg'),
+        'P': ('Phosphorus level', 'mg/kg'),
+        'K': ('Potassium level', 'mg/kg'),
+        'ph': ('pH level', ''),
+        'moisture': ('Moisture content', '%'),
+        'temperature': ('Temperature', '°C')
+    }
+    
+    # Add key factors
+    explanation_parts.append("\n\n**Key factors influencing this recommendation:**")
+    
+    for i, (feature, value, importance) in enumerate(top_features, 1):
+        desc, unit = feature_descriptions[feature]
         
-        # Moisture assessment
-        moisture_value = feature_values[4]
-        if moisture_value > 70:
-            moisture_status = "high moisture"
-        elif moisture_value > 40:
-            moisture_status = "adequate moisture"
+        # Determine if feature supports or opposes the recommendation
+        if importance > 0:
+            effect = "strongly supports"
         else:
-            moisture_status = "low moisture"
-        
-        explanation_parts.append(f"- Soil moisture at {moisture_value:.1f}% indicates {moisture_status} conditions.")
+            effect = "moderately influences"
         
-        # Temperature assessment
-        temp_value = feature_values[5]
-        explanation_parts.append(f"- Current soil temperature of {temp_value:.1f}°C is within the optimal range for {prediction}.")
-        
-        # Add recommendation confidence note
         explanation_parts.append(
-            f"\n\n**Note:** This recommendation is based on comprehensive analysis of your soil parameters "
-            f"and is optimized for {prediction} cultivation under current conditions."
+            f"\n{i}. **{desc}**: {value:.1f} {unit} - This {effect} the recommendation for {prediction}."
         )
-        
-        return ' '.join(explanation_parts)
-        
+    
+    # Add soil condition assessment
+    explanation_parts.append("\n\n**Soil Condition Summary:**")
+    
+    # NPK assessment
+    npk_avg = (feature_values[0] + feature_values[1] + feature_values[2]) / 3
+    if npk_avg > 100:
+        npk_status = "high nutrient levels"
+    elif npk_avg > 50:
+        npk_status = "moderate nutrient levels"
+    else:
+        npk_status = "low to moderate nutrient levels"
+    
+    explanation_parts.append(f"- Your soil has {npk_status} (N: {feature_values[0]:.1f}, P: {feature_values[1]:.1f}, K: {feature_values[2]:.1f}).")
+    
+    # pH assessment
+    ph_value = feature_values[3]
+    if ph_value < 5.5:
+        ph_status = "acidic"
+    elif ph_value > 7.5:
+        ph_status = "alkaline"
+    else:
+        ph_status = "neutral"
+    
+    explanation_parts.append(f"- The pH level of {ph_value:.1f} indicates {ph_status} soil, which is suitable for {prediction}.")
+    
+    # Moisture assessment
+    moisture_value = feature_values[4]
+    if moisture_value > 70:
+        moisture_status = "high moisture"
+    elif moisture_value > 40:
+        moisture_status = "adequate moisture"
+    else:
+        moisture_status = "low moisture"
+    
+    explanation_parts.append(f"- Soil moisture at {moisture_value:.1f}% indicates {moisture_status} conditions.")
+    
+    # Temperature assessment
+    temp_value = feature_values[5]
+    explanation_parts.append(f"- Current soil temperature of {temp_value:.1f}°C is within the optimal range for {prediction}.")
+    
+    # Add recommendation confidence note
+    explanation_parts.append(
+        f"\n\n**Note:** This recommendation is based on comprehensive analysis of your soil parameters "
+        f"and is optimized for {prediction} cultivation under current conditions."
+    )
+    
+    return ' '.join(explanation_parts)
+
+
+def generate_explanations_batch(model, soil_inputs, bundle=None, features_scaled=None, class_indices=None):
+    """
+    Generate explanations for many predictions at once.
+    
+    Args:
+        model: Trained ML model (the sklearn forest the explainer belongs to)
+        soil_inputs: List of SoilInput instances
+        bundle: Optional ModelBundle the model belongs to (default: active bundle)
+        features_scaled: Scaled features from the inference step (recomputed if None)
+        class_indices: Predicted class column per row from the inference step
+            (recomputed if None)
+    
+    Returns:
+        list: Natural language explanation per soil input
+    """
+    if not soil_inputs:
+        return []
+    
+    bundle = bundle or get_bundle()
+    feature_rows = [soil_input.to_feature_array() for soil_input in soil_inputs]
+    
+    # Reuse the inference step's work when it is passed in
+    if features_scaled is None:
+        features_scaled = bundle.scaler.transform(np.array(feature_rows, dtype=float))
+    if class_indices is None:
+        class_indices = np.argmax(model.predict_proba(features_scaled), axis=1)
+    features_scaled = np.asarray(features_scaled)
+    class_indices = np.asarray(class_indices)
+    
+    crop_names = get_class_names(model, bundle)[class_indices]
+    
+    try:
+        shap_matrix = compute_shap_values(get_explainer(model, bundle), features_scaled, class_indices)
     except Exception as e:
-        # Fallback explanation if SHAP fails
-        scaler = load_scaler()
-        prediction_encoded = model.predict(scaler.transform(np.array(soil_input.to_feature_array()).reshape(1, -1)))[0]
-        
-        # Decode prediction to crop name
+        print(f"SHAP explanation error: {e}")
+        shap_matrix = None
+    
+    explanations = []
+    for index, soil_input in enumerate(soil_inputs):
         try:
-            label_encoder = load_label_encoder()
-            if isinstance(prediction_encoded, (int, np.integer)):
-                prediction = label_encoder.inverse_transform([prediction_encoded])[0]
-            else:
-                prediction = prediction_encoded
-        except:
-            prediction = str(prediction_encoded)
-        
-        return (
-            f"The recommended crop is **{prediction}** based on your soil parameters. "
-            f"Your soil has Nitrogen: {soil_input.N_level:.1f} mg/kg, "
-            f"Phosphorus: {soil_input.P_level:.1f} mg/kg, "
-            f"Potassium: {soil_input.K_level:.1f} mg/kg, "
-            f"pH: {soil_input.ph:.1f}, "
-            f"Moisture: {soil_input.moisture:.1f}%, "
-            f"and Temperature: {soil_input.temperature:.1f}°C. "
-            f"These conditions are well-suited for {prediction} cultivation."
-        )
+            if shap_matrix is None:
+                raise ValueError("SHAP values unavailable")
+            explanation = build_explanation_text(crop_names[index], feature_rows[index], shap_matrix[index])
+        except Exception:
+            # Fallback explanation if SHAP fails
+            explanation = fallback_explanation(crop_names[index], soil_input)
+        explanations.append(explanation)
+    
+    return explanations
+
+
+def generate_explanation(model, soil_input, bundle=None, features_scaled=None, class_index=None):
+    """
+    Generate human-readable explanation for crop recommendation using SHAP.
+    
+    Args:
+        model: Trained ML model
+        soil_input: SoilInput instance
+        bundle: Optional ModelBundle the model belongs to (default: active bundle)
+        features_scaled: Scaled features (1 row) from the inference step
+        class_index: Predicted class column from the inference step
+    
+    Returns:
+        str: Natural language explanation
+    """
+    return generate_explanations_batch(
+        model, [soil_input], bundle,
+        features_scaled=features_scaled,
+        class_indices=None if class_index is None else [class_index]
+    )[0]
+
+
+def fallback_explanation(prediction, soil_input):
+    """Explanation used when SHAP values cannot be computed."""
+    return (
+        f"The recommended crop is **{prediction}** based on your soil parameters. "
+        f"Your soil has Nitrogen: {soil_input.N_level:.1f} mg/kg, "
+        f"Phosphorus: {soil_input.P_level:.1f} mg/kg, "
+        f"Potassium: {soil_input.K_level:.1f} mg/kg, "
+        f"pH: {soil_input.ph:.1f}, "
+        f"Moisture: {soil_input.moisture:.1f}%, "
+        f"and Temperature: {soil_input.temperature:.1f}°C. "
+        f"These conditions are well-suited for {prediction} cultivation."
+    )
 
 
 def generate_ai_farming_guide(crop_name, soil_input):
@@ -212,33 +377,34 @@ def generate_ai_farming_guide(crop_name, soil_input):
     Args:
         crop_name: Recommended crop name
         soil_input: SoilInput instance with soil parameters
-        
+    
     Returns:
         dict: Structured farming guide with sections
     """
     import os
-    import requests
     import json
+    from securecrop import http
     
     api_key = os.getenv('GEMINI_API_KEY', '')
     
     if not api_key or api_key == 'YOUR_GEMINI_API_KEY_HERE':
         return get_fallback_farming_guide(crop_name, soil_input)
     
-    # Build the prompt
-    prompt = f"""You are an expert agricultural advisor helping farmers in Malaysia and South Asia. A farmer's soil analysis shows:
-- Nitrogen: {soil_input.N_level:.1f} mg/kg
-- Phosphorus: {soil_input.P_level:.1f} mg/kg
-- Potassium: {soil_input.K_level:.1f} mg/kg
-- pH Level: {soil_input.ph:.1f}
-- Moisture: {soil_input.moisture:.1f}%
-- Temperature: {soil_input.temperature:.1f}°C
+    # Build the prompt from the soil profile bucket the guide is cached under
+    ranges = {field: f"{low:g}-{high:g}" for field, (low, high) in soil_profile_ranges(soil_input).items()}
+    prompt = f"""You are an expert agricultural advisor helping farmers in Malaysia and South Asia. A farmer's soil analysis falls in these ranges:
+- Nitrogen: {ranges['N_level']} mg/kg
+- Phosphorus: {ranges['P_level']} mg/kg
+- Potassium: {ranges['K_level']} mg/kg
+- pH Level: {ranges['ph']}
+- Moisture: {ranges['moisture']}%
+- Temperature: {ranges['temperature']}°C
 
 Our ML model recommends growing **{crop_name}**.
 
 Please provide a comprehensive farming guide in the following JSON format ONLY (no markdown, no code blocks, just pure JSON):
 {{
-    "why_recommended": "2-3 sentences explaining why this crop is ideal for their specific soil conditions",
+    "why_recommended": "2-3 sentences explaining why this crop is ideal for soil in these ranges",
     "cultivation_steps": [
         "Step 1: Land preparation details",
         "Step 2: Seed selection and sowing details",
@@ -262,7 +428,7 @@ Please provide a comprehensive farming guide in the following JSON format ONLY (
 Respond ONLY with the JSON object, no additional text."""
 
     try:
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}"
+        url = f"{os.getenv('GEMINI_API_URL', GEMINI_API_URL)}?key={api_key}"
         
         headers = {
             "Content-Type": "application/json"
@@ -280,7 +446,9 @@ Respond ONLY with the JSON object, no additional text."""
             }
         }
         
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
+        # Generation has no side effects, so timeouts and 5xx responses may be retried
+        timeout = (getattr(settings, 'HTTP_CONNECT_TIMEOUT', 3.05), getattr(settings, 'GEMINI_READ_TIMEOUT', 30))
+        response = http.post(url, headers=headers, json=payload, timeout=timeout, retries=1, retry_unsafe=True)
         
         if response.status_code == 200:
             result = response.json()
@@ -307,12 +475,86 @@ Respond ONLY with the JSON object, no additional text."""
         
         # Fallback if API fails
         return get_fallback_farming_guide(crop_name, soil_input)
-        
+    
     except Exception as e:
         print(f"Gemini API error: {e}")
         return get_fallback_farming_guide(crop_name, soil_input)
 
 
+def soil_profile_key(crop_name, soil_input):
+    """
+    Cache key for a farming guide: the crop plus the bucketed soil profile.
+    
+    Guides only depend on the crop and the broad soil conditions, so
+    nearby readings share one Gemini response.
+    """
+    return (crop_name,) + tuple(
+        int(getattr(soil_input, field) // width)
+        for field, width in SOIL_PROFILE_BUCKETS.items()
+    )
+
+
+def soil_profile_ranges(soil_input):
+    """
+    Soil profile bucket of a reading.
+    
+    Args:
+        soil_input: SoilInput instance with soil parameters
+    
+    Returns:
+        dict: SOIL_PROFILE_BUCKETS field -> (low, high) bounds of its bucket
+    """
+    ranges = {}
+    for field, width in SOIL_PROFILE_BUCKETS.items():
+        low = getattr(soil_input, field) // width * width
+        ranges[field] = (low, low + width)
+    return ranges
+
+
+def get_farming_guide(crop_name, soil_input, use_cache=True):
+    """
+    Return a farming guide, calling Gemini only on a cache miss.
+    
+    Only Gemini responses are cached; the fallback guide is cheap and a
+    later request should retry the API.
+    
+    Args:
+        crop_name: Recommended crop name
+        soil_input: SoilInput instance with soil parameters
+        use_cache: Look the guide up in the cache first
+    
+    Returns:
+        dict: Structured farming guide with sections
+    """
+    key = soil_profile_key(crop_name, soil_input)
+    
+    if use_cache:
+        farming_guide = _farming_guide_cache.get(key)
+        if farming_guide is not None:
+            return farming_guide
+    
+    farming_guide = generate_ai_farming_guide(crop_name, soil_input)
+    if farming_guide.get('source') == 'gemini_ai':
+        _farming_guide_cache.set(key, farming_guide)
+    
+    return farming_guide
+
+
+def get_cached_farming_guide(crop_name, soil_input):
+    """Return the cached farming guide for this crop and soil profile, if any."""
+    return _farming_guide_cache.get(soil_profile_key(crop_name, soil_input))
+
+
+def get_farming_guide_cache_stats():
+    """Return hit/miss statistics of the farming guide cache."""
+    return _farming_guide_cache.stats()
+
+
+def clear_farming_guide_cache():
+    """Remove every cached farming guide."""
+    _farming_guide_cache.clear()
+
+
 def get_fallback_farming_guide(crop_name, soil_input):
     """
     Provide a basic farming guide when Gemini API is unavailable.
@@ -1,3 +1,153 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import numpy as np
 from django.test import TestCase
 
-# Create your tests here.
+from ml_engine import registry
+from ml_engine.tests import TrainedModelsMixin, _SoilSample
+from . import services
+
+
+class GeminiStubServer:
+    """
+    Local HTTP server standing in for the Gemini generateContent API.
+    
+    Use as a context manager; while active, GEMINI_API_URL/GEMINI_API_KEY
+    point at the stub. Every request returns a farming guide for the crop
+    named in the prompt after an optional delay.
+    """
+    
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.requests = []
+        stub = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                stub.requests.append(body)
+                time.sleep(stub.delay)
+                guide = {
+                    'why_recommended': 'Stub guide',
+                    'cultivation_steps': ['Step 1: Prepare the land'],
+                    'watering_guide': 'Weekly',
+                    'fertilization_tips': 'Balanced NPK',
+                    'harvesting_tips': 'When mature',
+                    'common_problems': [],
+                    'expected_yield': '1 t/ha',
+                    'growth_duration': '100 days',
+                }
+                payload = json.dumps({
+                    'candidates': [{'content': {'parts': [{'text': json.dumps(guide)}]}}]
+                }).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            
+            def log_message(self, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/generate"
+    
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self._env = mock.patch.dict('os.environ', {
+            'GEMINI_API_KEY': 'test-key',
+            'GEMINI_API_URL': self.url,
+        })
+        self._env.start()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._env.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class ExplanationTest(TrainedModelsMixin, TestCase):
+    """Test cases for per-class and batched SHAP explanations."""
+    
+    def setUp(self):
+        self.bundle = registry.get_bundle()
+        self.rows = np.array([
+            [80, 45, 40, 6.5, 80, 24],
+            [75, 50, 20, 6.2, 60, 22],
+            [30, 20, 30, 7.2, 40, 30],
+        ], dtype=float)
+        self.features_scaled = self.bundle.scaler.transform(self.rows)
+        self.class_indices = np.argmax(self.bundle.rf_model.predict_proba(self.features_scaled), axis=1)
+    
+    def test_single_class_shap_matches_full_shap(self):
+        """SHAP values of the predicted class equal the full multi-class output."""
+        explainer = self.bundle.explainer
+        full = explainer.shap_values(self.features_scaled)
+        values = services.compute_shap_values(explainer, self.features_scaled, self.class_indices)
+        for row, class_index in enumerate(self.class_indices):
+            np.testing.assert_allclose(values[row], services._select_class(full, class_index)[row])
+    
+    def test_reuses_inference_results(self):
+        """Passing scaled features and classes skips a second prediction."""
+        samples = [_SoilSample(row) for row in self.rows]
+        with mock.patch.object(self.bundle.rf_model, 'predict_proba') as predict_proba, \
+                mock.patch.object(self.bundle.scaler, 'transform') as transform:
+            explanations = services.generate_explanations_batch(
+                self.bundle.rf_model, samples, self.bundle,
+                features_scaled=self.features_scaled,
+                class_indices=self.class_indices
+            )
+            predict_proba.assert_not_called()
+            transform.assert_not_called()
+        self.assertEqual(len(explanations), 3)
+        self.assertIn('**rice**', explanations[0])
+    
+    def test_batch_matches_single(self):
+        """Batched explanations equal one-at-a-time explanations."""
+        samples = [_SoilSample(row) for row in self.rows]
+        batch = services.generate_explanations_batch(self.bundle.rf_model, samples, self.bundle)
+        single = [services.generate_explanation(self.bundle.rf_model, sample, self.bundle) for sample in samples]
+        self.assertEqual(batch, single)
+
+
+class FarmingGuideCacheTest(TestCase):
+    """Test cases for the per crop and soil profile farming guide cache."""
+    
+    def setUp(self):
+        services.clear_farming_guide_cache()
+    
+    def test_similar_soil_shares_guide(self):
+        """Readings in the same soil profile bucket reuse one Gemini response."""
+        with GeminiStubServer() as gemini:
+            first = services.get_farming_guide('rice', _SoilSample([81, 45, 40, 6.6, 80, 24]))
+            second = services.get_farming_guide('rice', _SoilSample([83, 47, 42, 6.7, 82, 23]))
+            other_crop = services.get_farming_guide('maize', _SoilSample([81, 45, 40, 6.6, 80, 24]))
+        
+        self.assertEqual(first['source'], 'gemini_ai')
+        self.assertEqual(first, second)
+        self.assertEqual(other_crop['crop_name'], 'maize')
+        self.assertEqual(len(gemini.requests), 2)
+    
+    def test_prompt_uses_profile_ranges(self):
+        """The cached guide is generated from the bucket ranges, not the first reading."""
+        with GeminiStubServer() as gemini:
+            services.get_farming_guide('rice', _SoilSample([81, 45, 40, 6.6, 80, 24]))
+        
+        prompt = gemini.requests[0]['contents'][0]['parts'][0]['text']
+        for line in ['Nitrogen: 80-100 mg/kg', 'Phosphorus: 40-60 mg/kg', 'Potassium: 40-60 mg/kg',
+                     'pH Level: 6.5-7', 'Moisture: 80-90%', 'Temperature: 20-25°C']:
+            self.assertIn(line, prompt)
+        for reading in ['81.0', '45.0', '6.6', '24.0']:
+            self.assertNotIn(reading, prompt)
+    
+    def test_fallback_guide_not_cached(self):
+        """Without an API key the fallback guide is returned and not cached."""
+        with mock.patch.dict('os.environ', {'GEMINI_API_KEY': ''}):
+            guide = services.get_farming_guide('rice', _SoilSample([81, 45, 40, 6.6, 80, 24]))
+        self.assertEqual(guide['source'], 'fallback')
+        self.assertEqual(services.get_farming_guide_cache_stats()['size'], 0)
@@ -6,4 +6,22 @@ timeout = 120
 keepalive = 5
 max_requests = 1000
 max_requests_jitter = 50
+# Load the app (and all ML models, see ml_engine.registry) once in the master
+# so workers forked after a max_requests recycle start warm
 preload_app = True
+
+
+def post_worker_init(worker):
+    # Pick up weather alert emails left queued by a previous worker
+    from notifications.mailer import resume_pending
+    resume_pending()
+
+
+def worker_exit(server, worker):
+    # Write CyberLog events still buffered in this worker (see logs.writer)
+    from logs.writer import flush
+    flush()
+    
+    # Hand unsent alert emails back to the queue for the next worker
+    from notifications.mailer import stop_dispatcher
+    stop_dispatcher()
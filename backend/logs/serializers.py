@@ -3,6 +3,7 @@ Serializers for log models.
 """
 from rest_framework import serializers
 from .models import AdminLog, CyberLog
+from soil.serializers import SoilInputSerializer
 
 
 class AdminLogSerializer(serializers.ModelSerializer):
@@ -15,12 +16,28 @@ class AdminLogSerializer(serializers.ModelSerializer):
         model = AdminLog
         fields = ['id', 'admin', 'admin_username', 'admin_email', 'action', 'timestamp']
         read_only_fields = ['id', 'timestamp']
+    
+    # Columns read when serializing, including the joined admin's
+    query_fields = ('id', 'admin', 'admin__username', 'admin__email', 'action', 'timestamp')
+    
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """
+        Join the admin and load only the serialized columns.
+        
+        Args:
+            queryset: AdminLog queryset
+        
+        Returns:
+            QuerySet: Serializable without further queries per row
+        """
+        return queryset.select_related('admin').only(*cls.query_fields)
 
 
 class CyberLogSerializer(serializers.ModelSerializer):
     """Serializer for CyberLog model."""
     
-    input_id = serializers.IntegerField(source='input.id', read_only=True, allow_null=True)
+    input_id = serializers.IntegerField(read_only=True, allow_null=True)
     user_username = serializers.SerializerMethodField()
     
     class Meta:
@@ -31,6 +48,24 @@ class CyberLogSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'timestamp']
     
+    # Columns read when serializing, including the soil input's user
+    query_fields = (
+        'id', 'input', 'anomaly_detected', 'integrity_status', 'details', 'timestamp'
+    ) + tuple(f"input__{field}" for field in SoilInputSerializer.query_fields if field.startswith('user'))
+    
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """
+        Join the soil input and its user and load only the serialized columns.
+        
+        Args:
+            queryset: CyberLog queryset
+        
+        Returns:
+            QuerySet: Serializable without further queries per row
+        """
+        return queryset.select_related('input__user').only(*cls.query_fields)
+    
     def get_user_username(self, obj):
         """Get username of the user who created the input."""
         if obj.input and obj.input.user:
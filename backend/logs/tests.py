@@ -1,3 +1,119 @@
-from django.test import TestCase
+import threading
+import time
 
-# Create your tests here.
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from ml_engine.tests import TrainedModelsMixin
+from soil.models import SoilInput
+from .models import AdminLog, CyberLog
+from .writer import CyberLogWriter, log_security_event, security_events
+
+
+class SecurityEventsTest(TrainedModelsMixin, TestCase):
+    """Test cases for collecting and linking CyberLog events."""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='events@example.com',
+            username='eventsuser',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def test_events_written_once_per_request(self):
+        """Events recorded in a block are inserted together when it ends."""
+        with self.assertNumQueries(1), self.captureOnCommitCallbacks(execute=True):
+            with security_events():
+                log_security_event(False, 'OK', 'first')
+                log_security_event(True, 'ANOMALY', 'second')
+        self.assertEqual(CyberLog.objects.count(), 2)
+    
+    def test_pre_ml_event_linked_to_input(self):
+        """The pre-ML event of a submission references the saved SoilInput."""
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('soil-input-create'), {
+                'N_level': 80, 'P_level': 45, 'K_level': 40, 'ph': 6.5, 'moisture': 80, 'temperature': 24
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        
+        soil_input = SoilInput.objects.get(id=response.data['soil_input']['id'])
+        self.assertEqual(soil_input.cyber_logs.count(), 2)
+        self.assertFalse(CyberLog.objects.filter(input__isnull=True).exists())
+
+
+class LogListQueryTest(TestCase):
+    """Listing logs costs the same queries however many rows a page has."""
+    
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email='logadmin@example.com', username='logadmin', password='testpass123', role='ADMIN'
+        )
+        self.farmers = [
+            User.objects.create_user(email=f"logger{index}@example.com", username=f"logger{index}",
+                                     password='testpass123')
+            for index in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+    
+    def add_logs(self, count):
+        for index in range(count):
+            soil_input = SoilInput.objects.create(
+                user=self.farmers[index % len(self.farmers)],
+                N_level=80, P_level=45, K_level=40, ph=6.5, moisture=60, temperature=24
+            )
+            # Every third event is not linked to an input
+            CyberLog.objects.create(input=soil_input if index % 3 else None, anomaly_detected=False,
+                                    integrity_status='OK', details='test')
+            AdminLog.objects.create(admin=self.admin, action=f"action {index}")
+    
+    def test_constant_queries_per_page(self):
+        """A count and one joined page query, for a page of 3 or of 20."""
+        for count, page_size in [(3, 3), (27, 20)]:
+            self.add_logs(count)
+            with self.assertNumQueries(2):
+                cyber = self.client.get(reverse('cyber-log-list'))
+            self.assertEqual(len(cyber.data['results']), page_size)
+            with self.assertNumQueries(2):
+                admin = self.client.get(reverse('admin-log-list'))
+            self.assertEqual(len(admin.data['results']), page_size)
+        
+        linked = [row for row in cyber.data['results'] if row['input_id'] is not None]
+        self.assertTrue(linked)
+        self.assertTrue(all(row['user_username'] for row in linked))
+        self.assertTrue(all(row['user_username'] is None
+                            for row in cyber.data['results'] if row['input_id'] is None))
+        self.assertEqual(admin.data['results'][0]['admin_username'], self.admin.username)
+
+
+@override_settings(CYBER_LOG_ASYNC=True)
+class CyberLogWriterTest(TransactionTestCase):
+    """Test cases for the background CyberLog writer."""
+    
+    def test_background_flush(self):
+        """Queued events are bulk-inserted by the background thread."""
+        writer = CyberLogWriter(batch_size=50, flush_interval=0.05)
+        writer.enqueue([CyberLog(integrity_status='OK', details=f'event {i}') for i in range(120)])
+        
+        deadline = time.monotonic() + 10
+        while CyberLog.objects.count() < 120 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(CyberLog.objects.count(), 120)
+        self.assertEqual(writer.stats()['sync_writes'], 0)
+    
+    def test_backpressure_writes_synchronously(self):
+        """A full queue makes the caller write instead of dropping events."""
+        writer = CyberLogWriter(max_queue=5, batch_size=50, flush_interval=0.05)
+        # Keep the flusher away so the queue stays full
+        writer._thread = threading.main_thread()
+        writer.enqueue([CyberLog(integrity_status='OK', details=f'event {i}') for i in range(8)])
+        
+        self.assertEqual(CyberLog.objects.count(), 3)
+        self.assertEqual(writer.stats()['sync_writes'], 3)
+        
+        writer.flush(timeout=0)
+        self.assertEqual(CyberLog.objects.count(), 8)
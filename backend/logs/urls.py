@@ -2,10 +2,11 @@
 URL configuration for logs app.
 """
 from django.urls import path
-from .views import AdminLogListView, CyberLogListView, CyberLogStatsView
+from .views import AdminLogListView, CyberLogListView, CyberLogStatsView, IntegrationStatsView
 
 urlpatterns = [
     path('admin-actions/', AdminLogListView.as_view(), name='admin-log-list'),
     path('cyber/', CyberLogListView.as_view(), name='cyber-log-list'),
     path('cyber/stats/', CyberLogStatsView.as_view(), name='cyber-log-stats'),
+    path('integrations/', IntegrationStatsView.as_view(), name='integration-stats'),
 ]
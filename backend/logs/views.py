@@ -6,7 +6,9 @@ from rest_framework.response import Response
 from django.db.models import Count, Q
 from .models import AdminLog, CyberLog
 from .serializers import AdminLogSerializer, CyberLogSerializer
+from .writer import writer
 from accounts.permissions import IsAdminUser
+from securecrop.http import get_http_stats
 
 
 class AdminLogListView(generics.ListAPIView):
@@ -17,7 +19,7 @@ class AdminLogListView(generics.ListAPIView):
     """
     serializer_class = AdminLogSerializer
     permission_classes = [IsAdminUser]
-    queryset = AdminLog.objects.all()
+    queryset = AdminLogSerializer.setup_eager_loading(AdminLog.objects.all())
 
 
 class CyberLogListView(generics.ListAPIView):
@@ -31,7 +33,7 @@ class CyberLogListView(generics.ListAPIView):
     permission_classes = [IsAdminUser]
     
     def get_queryset(self):
-        queryset = CyberLog.objects.all()
+        queryset = CyberLogSerializer.setup_eager_loading(CyberLog.objects.all())
         
         # Filter by anomaly_detected
         anomaly = self.request.query_params.get('anomaly_detected', None)
@@ -68,5 +70,20 @@ class CyberLogStatsView(generics.GenericAPIView):
             'total_logs': total_logs,
             'anomalies_detected': anomalies,
             'anomaly_rate': round((anomalies / total_logs * 100), 2) if total_logs > 0 else 0,
-            'status_breakdown': list(status_counts)
+            'status_breakdown': list(status_counts),
+            'writer': writer.stats()
         })
+
+
+class IntegrationStatsView(generics.GenericAPIView):
+    """
+    Admin-only endpoint to get outbound integration statistics.
+    
+    GET /api/admin/logs/integrations/
+    Requests, failures, retries, latency and circuit state per upstream
+    host (OpenWeatherMap, Overpass, Gemini, Brevo), per worker process.
+    """
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        return Response({'hosts': get_http_stats()})
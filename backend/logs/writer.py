@@ -0,0 +1,264 @@
+"""
+Buffered writer for CyberLog security events.
+
+Security checks record events instead of inserting rows one by one:
+
+    @security_events()
+    def create(self, request, *args, **kwargs):
+        cyber_result = pre_ml_checks(soil_data, request.user)
+        soil_input = serializer.save(...)
+        cyber_result['cyber_log'].input = soil_input
+        ...
+
+Events recorded inside security_events() are collected for the request
+and handed to the writer when it ends, so the pre-ML event can still be
+linked to the SoilInput saved after it. The writer queues them and a background thread
+inserts them with bulk_create, so audit writes add no database round-trips
+to the request. Outside a security_events() block each event goes to the
+writer on its own.
+
+The queue is bounded. When it is full the caller writes its events itself
+(backpressure), so events are never dropped. Pending events are flushed
+at interpreter exit and from gunicorn's worker_exit hook. With
+CYBER_LOG_ASYNC=False (the test runner) every batch is written inline.
+"""
+
+import atexit
+import contextvars
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, transaction, IntegrityError
+
+from .models import CyberLog
+
+
+# Events collected for the current request (see security_events())
+_current_events = contextvars.ContextVar('cyber_log_events', default=None)
+
+
+class SecurityEvents:
+    """CyberLog events collected during one request."""
+    
+    def __init__(self):
+        self.events = []
+    
+    def add(self, event):
+        self.events.append(event)
+        return event
+
+
+class CyberLogWriter:
+    """
+    Bounded queue of unsaved CyberLog rows drained by a background thread.
+    
+    Attributes:
+        max_queue: Maximum queued events before callers write synchronously
+        batch_size: Maximum rows per bulk_create
+        flush_interval: Seconds the flusher waits to fill a batch
+    """
+    
+    def __init__(self, max_queue=10000, batch_size=500, flush_interval=1.0):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.sync_writes = 0
+        self.errors = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+    
+    def _ensure_started(self):
+        # Started lazily so no thread exists before gunicorn forks workers
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='cyber-log-writer', daemon=True)
+                self._thread.start()
+    
+    def enqueue(self, events):
+        """
+        Queue events for a background bulk insert.
+        
+        Falls back to writing the events in the calling thread when the
+        queue is full or asynchronous writing is disabled.
+        """
+        events = list(events)
+        if not events:
+            return
+        
+        if not getattr(settings, 'CYBER_LOG_ASYNC', True):
+            self.write(events)
+            return
+        
+        self._ensure_started()
+        for index, event in enumerate(events):
+            try:
+                self._queue.put_nowait(event)
+            except queue.Full:
+                # Backpressure: the producer pays for its own writes
+                self.sync_writes += len(events) - index
+                self.write(events[index:])
+                return
+    
+    def write(self, events):
+        """Insert events now (one bulk_create per batch_size rows)."""
+        with self._write_lock:
+            for start in range(0, len(events), self.batch_size):
+                self._write_batch(events[start:start + self.batch_size])
+    
+    def _write_batch(self, batch):
+        try:
+            CyberLog.objects.bulk_create(batch)
+            self.written += len(batch)
+            return
+        except Exception as e:
+            print(f"CyberLog bulk insert failed, retrying row by row: {e}")
+        
+        for event in batch:
+            try:
+                with transaction.atomic():
+                    event.save()
+            except IntegrityError:
+                # The linked SoilInput was rolled back; keep the event unlinked
+                event.input = None
+                try:
+                    event.save()
+                except Exception as e:
+                    self.errors += 1
+                    print(f"CyberLog write failed: {e}")
+                    continue
+            except Exception as e:
+                self.errors += 1
+                print(f"CyberLog write failed: {e}")
+                continue
+            self.written += 1
+    
+    def _drain(self, block):
+        """Take up to batch_size events from the queue."""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                if block and timeout > 0:
+                    batch.append(self._queue.get(timeout=timeout))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+    
+    def _write_and_ack(self, batch):
+        try:
+            self.write(batch)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+    
+    def _run(self):
+        while True:
+            batch = self._drain(block=True)
+            if not batch:
+                continue
+            try:
+                self._write_and_ack(batch)
+            finally:
+                connection.close()
+    
+    def flush(self, timeout=5.0):
+        """
+        Write every queued event in the calling thread.
+        
+        Also waits (up to timeout seconds) for a batch the background
+        thread has already taken, so nothing is lost at shutdown.
+        """
+        while True:
+            batch = self._drain(block=False)
+            if not batch:
+                break
+            self._write_and_ack(batch)
+        
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._queue.all_tasks_done.wait(remaining)
+    
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'max_queue': self.max_queue,
+            'written': self.written,
+            'sync_writes': self.sync_writes,
+            'errors': self.errors,
+        }
+
+
+writer = CyberLogWriter(
+    max_queue=getattr(settings, 'CYBER_LOG_QUEUE_SIZE', 10000),
+    batch_size=getattr(settings, 'CYBER_LOG_BATCH_SIZE', 500),
+    flush_interval=getattr(settings, 'CYBER_LOG_FLUSH_INTERVAL', 1.0)
+)
+
+
+def log_security_event(anomaly_detected, integrity_status, details, input=None):
+    """
+    Record a CyberLog event.
+    
+    Inside security_events() the event is collected for the request;
+    otherwise it is queued immediately.
+    
+    Returns:
+        CyberLog: The (not yet saved) event
+    """
+    event = CyberLog(
+        input=input,
+        anomaly_detected=anomaly_detected,
+        integrity_status=integrity_status,
+        details=details
+    )
+    
+    events = _current_events.get()
+    if events is not None:
+        return events.add(event)
+    
+    _enqueue_on_commit([event])
+    return event
+
+
+def _enqueue_on_commit(events):
+    # Linked inputs must be committed before another connection inserts the events
+    transaction.on_commit(lambda: writer.enqueue(events))
+
+
+@contextmanager
+def security_events():
+    """
+    Collect the CyberLog events of one request and queue them together at the end.
+    
+    Usable as a context manager or as a view method decorator.
+    """
+    events = SecurityEvents()
+    token = _current_events.set(events)
+    try:
+        yield events
+    finally:
+        _current_events.reset(token)
+        _enqueue_on_commit(events.events)
+
+
+def flush():
+    """Write all queued events now (used at shutdown and in tests)."""
+    writer.flush()
+
+
+atexit.register(flush)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import MarketSearch, FavoritePlace, PlaceVisit
+from .models import MarketSearch, FavoritePlace, PlaceVisit, MarketTile, MarketPlace
 
 
 @admin.register(MarketSearch)
@@ -23,3 +23,17 @@ class PlaceVisitAdmin(admin.ModelAdmin):
     list_filter = ['place_type', 'visited_at']
     search_fields = ['user__email', 'place_name']
     date_hierarchy = 'visited_at'
+
+
+@admin.register(MarketTile)
+class MarketTileAdmin(admin.ModelAdmin):
+    list_display = ['key', 'place_count', 'fetched_at']
+    search_fields = ['key']
+    date_hierarchy = 'fetched_at'
+
+
+@admin.register(MarketPlace)
+class MarketPlaceAdmin(admin.ModelAdmin):
+    list_display = ['name', 'place_type', 'tile', 'address', 'updated_at']
+    list_filter = ['place_type']
+    search_fields = ['name', 'address', 'osm_id', 'tile']
@@ -0,0 +1,123 @@
+"""
+Memory benchmark for market search results.
+
+Builds a synthetic Overpass response and compares:
+1. The original path: response.json() on the whole body, then one result
+   dict per named element, cached as a list (LocMem stores its pickle)
+2. The streaming path: iter_elements() over 64KB chunks, slotted
+   PlaceRecords for named elements only, then the columnar tile form
+   (coordinate and type arrays, one UTF-8 value per place) kept in the
+   in-process tile cache
+
+and reports parse time, peak memory while parsing and the memory retained
+by what is cached.
+
+Usage (from backend/):
+    python market_linkage/benchmark_places.py [--places 20000] [--unnamed 0.3]
+"""
+
+import argparse
+import json
+import os
+import pickle
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+import django
+
+# Setup Django (the places module reads its settings and models)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'securecrop.settings')
+os.environ.setdefault('ML_EAGER_LOAD', 'False')
+django.setup()
+
+from market_linkage import places
+
+
+def synthetic_response(count, unnamed, seed=42):
+    """An Overpass JSON body with count elements around Kuala Lumpur."""
+    rng = random.Random(seed)
+    shops = ['supermarket', 'convenience', 'greengrocer', 'farm', 'garden_centre', 'hardware', 'wholesale']
+    elements = []
+    for index in range(count):
+        tags = {'shop': rng.choice(shops), 'addr:street': f"Jalan {rng.randint(1, 500)}",
+                'addr:city': 'Kuala Lumpur', 'opening_hours': 'Mo-Su 08:00-22:00', 'brand': 'Example',
+                'source': 'survey', 'building': 'yes'}
+        if rng.random() >= unnamed:
+            tags['name'] = f"Kedai Runcit {index}"
+            tags['phone'] = f"+60 3-{rng.randint(1000, 9999)} {rng.randint(1000, 9999)}"
+        element = {'type': 'node', 'id': 1000000 + index, 'tags': tags,
+                   'lat': 3.139 + rng.uniform(-0.4, 0.4), 'lon': 101.687 + rng.uniform(-0.4, 0.4)}
+        elements.append(element)
+    body = {'version': 0.6, 'generator': 'Overpass API', 'osm3s': {'copyright': 'OpenStreetMap'},
+            'elements': elements}
+    return json.dumps(body).encode()
+
+
+def original_path(body):
+    """Parse the whole body, then build the cached list of result dicts."""
+    results = []
+    for element in json.loads(body)['elements']:
+        record = places.parse_element(element)
+        if record is not None:
+            results.append({
+                'id': record.osm_id, 'name': record.name, 'lat': record.latitude, 'lon': record.longitude,
+                'type': record.place_type, 'distance_km': 0.0, 'address': record.address,
+                'phone': record.phone, 'opening_hours': record.opening_hours, 'website': record.website,
+                'rating': None, 'source': 'openstreetmap'
+            })
+    return results
+
+
+def streaming_path(body, chunk_size=65536):
+    """Stream the body into PlaceRecords, then build the cached columns."""
+    chunks = (body[start:start + chunk_size].decode() for start in range(0, len(body), chunk_size))
+    records = [
+        record for record in map(places.parse_element, places.iter_elements(chunks))
+        if record is not None
+    ]
+    return places._columns(records)
+
+
+def measure(fn, body):
+    """Run fn(body) under tracemalloc; return (result, seconds, peak MB, retained MB)."""
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    result = fn(body)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, (peak - baseline) / 1e6, (current - baseline) / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark market search result memory')
+    parser.add_argument('--places', type=int, default=20000, help='elements in the Overpass response')
+    parser.add_argument('--unnamed', type=float, default=0.3, help='fraction of elements without a name')
+    args = parser.parse_args()
+    
+    body = synthetic_response(args.places, args.unnamed)
+    print("=" * 60)
+    print(f"Overpass response: {args.places} elements, {len(body) / 1e6:.1f} MB")
+    print("=" * 60)
+    
+    for name, fn in [('response.json() + dicts', original_path), ('streaming + columns', streaming_path)]:
+        fn(body)  # warm up
+        result, elapsed, peak, retained = measure(fn, body)
+        kept = len(result) if isinstance(result, list) else len(result['text'])
+        print(f"{name:25s} {elapsed * 1000:8.1f} ms  peak={peak:7.1f} MB  retained={retained:6.1f} MB  "
+              f"({kept} places)")
+        if isinstance(result, list):
+            print(f"{'':25s} pickled for the Django cache: {len(pickle.dumps(result)) / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
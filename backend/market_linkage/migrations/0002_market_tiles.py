@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-17 13:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market_linkage', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarketPlace',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('osm_id', models.CharField(max_length=50, unique=True)),
+                ('name', models.CharField(max_length=200)),
+                ('place_type', models.CharField(choices=[('market', 'Market'), ('buyer', 'Buyer'), ('agri_store', 'Agricultural Store')], max_length=20)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('tile', models.CharField(db_index=True, max_length=32)),
+                ('address', models.CharField(blank=True, max_length=500)),
+                ('phone', models.CharField(blank=True, max_length=100)),
+                ('opening_hours', models.CharField(blank=True, max_length=255)),
+                ('website', models.CharField(blank=True, max_length=500)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Market Place',
+                'verbose_name_plural': 'Market Places',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MarketTile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=32, unique=True)),
+                ('fetched_at', models.DateTimeField()),
+                ('place_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Market Tile',
+                'verbose_name_plural': 'Market Tiles',
+                'ordering': ['key'],
+            },
+        ),
+    ]
@@ -1,6 +1,7 @@
 """
 Market Linkage Models
-Store market search history and favorite places for farmers
+Store market search history and favorite places for farmers, and the
+local store of OpenStreetMap places that market searches are served from
 """
 from django.db import models
 from django.conf import settings
@@ -103,3 +104,43 @@ class PlaceVisit(models.Model):
     
     def __str__(self):
         return f"{self.user.email} visited {self.place_name}"
+
+
+class MarketTile(models.Model):
+    """A grid tile whose OpenStreetMap places are stored locally (see market_linkage.places)"""
+    key = models.CharField(max_length=32, unique=True)  # "row:col" of the tile grid
+    fetched_at = models.DateTimeField()
+    place_count = models.IntegerField(default=0)
+    
+    class Meta:
+        ordering = ['key']
+        verbose_name = 'Market Tile'
+        verbose_name_plural = 'Market Tiles'
+    
+    def __str__(self):
+        return f"Tile {self.key} ({self.place_count} places, fetched {self.fetched_at})"
+
+
+class MarketPlace(models.Model):
+    """A named market, buyer or store from OpenStreetMap, indexed by grid tile"""
+    osm_id = models.CharField(max_length=50, unique=True)  # e.g. osm_node_123
+    name = models.CharField(max_length=200)
+    place_type = models.CharField(max_length=20, choices=FavoritePlace.PLACE_TYPES)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    tile = models.CharField(max_length=32, db_index=True)
+    
+    address = models.CharField(max_length=500, blank=True)
+    phone = models.CharField(max_length=100, blank=True)
+    opening_hours = models.CharField(max_length=255, blank=True)
+    website = models.CharField(max_length=500, blank=True)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['name']
+        verbose_name = 'Market Place'
+        verbose_name_plural = 'Market Places'
+    
+    def __str__(self):
+        return f"{self.name} ({self.place_type})"
@@ -0,0 +1,761 @@
+"""
+Local spatial store of OpenStreetMap market places.
+
+Market searches are answered from MarketPlace rows instead of one
+Overpass query per (location, radius):
+1. The map is divided into a fixed grid of MARKET_TILE_SIZE degree tiles
+   (about 5.5km at the default 0.05)
+2. A radius search needs the tiles its circle touches. Tiles never
+   fetched, or fetched more than MARKET_TILE_TTL seconds ago, are loaded
+   with a single Overpass bounding-box query and their places replaced.
+   The response is parsed as it streams in (iter_elements), keeping only
+   named places as slotted PlaceRecords with their type already classified
+3. The places of the needed tiles are read with one indexed query, kept
+   per tile as NumPy coordinate columns in an in-process LRU cache, and
+   filtered to the radius with one vectorized haversine pass. Only the
+   requested page of nearest places is selected (argpartition) and sorted
+
+A farmer moving a little or widening the radius only fetches the tiles
+not covered yet, and overlapping searches of different users share the
+stored tiles. If Overpass fails, whatever is stored (even stale) is used.
+
+Searches only wait for Overpass during warm-up:
+- Concurrent searches needing the same tiles share one fetch: a tile is
+  claimed by the first thread loading it, and others wait for that load
+  instead of querying again (per tile, so overlapping circles coalesce)
+- Stale tiles are served as stored while a background thread refreshes
+  them (MARKET_REFRESH_ASYNC; inline when off, as in the test runner)
+"""
+
+import codecs
+import json
+import math
+import os
+import threading
+from datetime import timedelta
+
+import numpy as np
+import requests
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from securecrop import http
+from securecrop.cache import LRUCache
+from .models import MarketPlace, MarketTile
+
+
+# Overpass API servers, tried in order (OVERPASS_API_URLS, comma-separated, overrides them)
+OVERPASS_SERVERS = [
+    "https://overpass-api.de/api/interpreter",
+    "https://overpass.kumi.systems/api/interpreter",
+    "https://maps.mail.ru/osm/tools/overpass/api/interpreter",
+]
+
+EARTH_RADIUS_KM = 6371
+
+# (tile key, fetched_at) -> columnar places of the tile (see tile_columns)
+_tile_columns = LRUCache(maxsize=getattr(settings, 'MARKET_TILE_CACHE_SIZE', 4096))
+
+# Stored place fields, in MarketPlace column order
+PLACE_FIELDS = ('osm_id', 'name', 'place_type', 'latitude', 'longitude', 'address', 'phone', 'opening_hours', 'website')
+
+# Place types as stored in the int8 type column of cached tiles
+PLACE_TYPE_CODES = {'market': 0, 'buyer': 1, 'agri_store': 2}
+PLACE_TYPES = {code: place_type for place_type, code in PLACE_TYPE_CODES.items()}
+
+# Fields packed into one bytes value per place in cached tiles
+TEXT_FIELDS = ('osm_id', 'name', 'address', 'phone', 'opening_hours', 'website')
+TEXT_SEPARATOR = '\x1f'
+
+# Places written per INSERT
+INSERT_BATCH_SIZE = 500
+
+
+class MarketSearchUnavailable(Exception):
+    """Tiles of a search were never stored and could not be fetched from Overpass."""
+    
+    def __init__(self, missing, total):
+        super().__init__(f"{missing} of {total} tiles could not be loaded from Overpass")
+        self.missing = missing
+        self.total = total
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """Calculate distance between two points in km"""
+    lat1_rad = math.radians(float(lat1))
+    lat2_rad = math.radians(float(lat2))
+    delta_lat = math.radians(float(lat2) - float(lat1))
+    delta_lon = math.radians(float(lon2) - float(lon1))
+    
+    a = math.sin(delta_lat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon/2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+    
+    return EARTH_RADIUS_KM * c
+
+
+def classify_place(tags):
+    """Classify a place as market, buyer, or agri_store based on OSM tags"""
+    shop = tags.get('shop', '')
+    amenity = tags.get('amenity', '')
+    building = tags.get('building', '')
+    
+    # Markets
+    if shop in ['supermarket', 'convenience', 'greengrocer', 'farm', 'butcher', 'seafood']:
+        return 'market'
+    if amenity in ['marketplace', 'fast_food', 'cafe']:
+        return 'market'
+    
+    # Agricultural Stores
+    if shop in ['garden_centre', 'agrarian', 'hardware', 'doityourself', 'trade']:
+        return 'agri_store'
+    
+    # Buyers/Wholesale
+    if shop in ['wholesale']:
+        return 'buyer'
+    if building in ['warehouse', 'industrial']:
+        return 'buyer'
+    
+    # Default based on name patterns
+    name = tags.get('name', '').lower()
+    if any(w in name for w in ['pasar', 'market', 'mart', 'kedai', 'store', 'shop']):
+        return 'market'
+    if any(w in name for w in ['tani', 'agro', 'pertanian', 'baja', 'benih', 'garden']):
+        return 'agri_store'
+    if any(w in name for w in ['borong', 'wholesale', 'warehouse']):
+        return 'buyer'
+    
+    return 'market'  # Default
+
+
+def tile_of(lat, lon):
+    """
+    Grid tile containing a point.
+    
+    Returns:
+        tuple: (row, col) of the tile
+    """
+    size = _setting('MARKET_TILE_SIZE', 0.05)
+    return math.floor(float(lat) / size), math.floor(float(lon) / size)
+
+
+def tile_key(tile):
+    return f"{tile[0]}:{tile[1]}"
+
+
+def tile_bounds(tile):
+    """(south, west, north, east) of a tile."""
+    size = _setting('MARKET_TILE_SIZE', 0.05)
+    return tile[0] * size, tile[1] * size, (tile[0] + 1) * size, (tile[1] + 1) * size
+
+
+def tiles_for_radius(lat, lon, radius_m):
+    """
+    Tiles touched by a search circle.
+    
+    Args:
+        lat: Center latitude
+        lon: Center longitude
+        radius_m: Radius in meters
+    
+    Returns:
+        list: (row, col) tiles whose area comes within radius_m of the center
+    """
+    radius_km = radius_m / 1000
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    dlon = dlat / max(math.cos(math.radians(lat)), 0.01)
+    south, west = tile_of(lat - dlat, lon - dlon)
+    north, east = tile_of(lat + dlat, lon + dlon)
+    
+    tiles = []
+    for row in range(south, north + 1):
+        for col in range(west, east + 1):
+            s, w, n, e = tile_bounds((row, col))
+            # Closest point of the tile to the center
+            nearest_lat = min(max(lat, s), n)
+            nearest_lon = min(max(lon, w), e)
+            if haversine_distance(lat, lon, nearest_lat, nearest_lon) <= radius_km:
+                tiles.append((row, col))
+    return tiles
+
+
+def _overpass_query(bbox, timeout):
+    area = '({},{},{},{})'.format(*bbox)
+    return f"""
+    [out:json][timeout:{timeout}];
+    (
+        node["shop"~"supermarket|convenience|greengrocer|farm|garden_centre|hardware|wholesale"]{area};
+        node["amenity"="marketplace"]{area};
+        way["shop"~"supermarket|convenience|greengrocer|farm|garden_centre|hardware|wholesale"]{area};
+        way["amenity"="marketplace"]{area};
+    );
+    out center tags;
+    """
+
+
+class PlaceRecord:
+    """
+    One stored place, with PLACE_FIELDS as attributes.
+    
+    Slotted (no per-instance dict), so the records of a large Overpass
+    response stay small while it streams in.
+    """
+    __slots__ = PLACE_FIELDS
+    
+    def __init__(self, *values):
+        for field, value in zip(PLACE_FIELDS, values):
+            setattr(self, field, value)
+    
+    def fields(self):
+        """PLACE_FIELDS as a dict (MarketPlace keyword arguments)."""
+        return {field: getattr(self, field) for field in PLACE_FIELDS}
+
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+def iter_elements(chunks, meta=None):
+    """
+    Yield the elements of an Overpass JSON response while it downloads.
+    
+    Only the element being decoded is buffered, never the whole body.
+    
+    Args:
+        chunks: Iterable of str chunks of the response body
+        meta: Optional dict that receives the other top-level keys
+            (e.g. 'remark', where Overpass reports runtime errors)
+    
+    Raises:
+        ValueError: The body is not an Overpass JSON object or is truncated
+    """
+    chunks = iter(chunks)
+    buffer, pos = '', 0
+    
+    def fill():
+        nonlocal buffer, pos
+        chunk = next(chunks, None)
+        if chunk is None:
+            raise ValueError('Truncated Overpass response')
+        buffer, pos = buffer[pos:] + chunk, 0
+    
+    def peek():
+        """Skip whitespace and return the next character."""
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            fill()
+    
+    def expect(char):
+        nonlocal pos
+        if peek() != char:
+            raise ValueError(f"Expected {char!r} in Overpass response")
+        pos += 1
+    
+    def value():
+        nonlocal pos
+        peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                fill()  # Value not complete yet
+                continue
+            if end == len(buffer) and not isinstance(obj, (dict, list, str)):
+                fill()  # A number or literal may continue in the next chunk
+                continue
+            pos = end
+            return obj
+    
+    expect('{')
+    while peek() != '}':
+        if peek() == ',':
+            pos += 1
+        key = value()
+        expect(':')
+        if key != 'elements':
+            if meta is not None:
+                meta[key] = value()
+            else:
+                value()
+            continue
+        
+        expect('[')
+        while peek() != ']':
+            if peek() == ',':
+                pos += 1
+            yield value()
+        pos += 1
+
+
+def _iter_text(response, chunk_size=65536):
+    """Decode a streamed response body as UTF-8 text chunks."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        yield decoder.decode(chunk)
+    yield decoder.decode(b'', final=True)
+
+
+def parse_element(element):
+    """
+    Convert an Overpass element to a stored place.
+    
+    Returns:
+        PlaceRecord: The place, or None for unnamed or unlocated elements
+    """
+    tags = element.get('tags', {})
+    
+    # Get name - skip if no name
+    name = tags.get('name', tags.get('name:en', tags.get('name:ms', '')))
+    if not name:
+        return None
+    
+    # Get coordinates
+    if element['type'] == 'node':
+        elem_lat = element.get('lat')
+        elem_lon = element.get('lon')
+    elif 'center' in element:
+        elem_lat = element['center'].get('lat')
+        elem_lon = element['center'].get('lon')
+    else:
+        return None
+    
+    if not elem_lat or not elem_lon:
+        return None
+    
+    # Build address
+    address_parts = []
+    if tags.get('addr:street'):
+        if tags.get('addr:housenumber'):
+            address_parts.append(f"{tags.get('addr:housenumber')} {tags.get('addr:street')}")
+        else:
+            address_parts.append(tags.get('addr:street'))
+    if tags.get('addr:city'):
+        address_parts.append(tags.get('addr:city'))
+    if tags.get('addr:postcode'):
+        address_parts.append(tags.get('addr:postcode'))
+    
+    return PlaceRecord(
+        f"osm_{element['type']}_{element['id']}",
+        name[:200],
+        classify_place(tags),
+        elem_lat,
+        elem_lon,
+        (', '.join(address_parts) if address_parts else tags.get('addr:full', ''))[:500],
+        tags.get('phone', tags.get('contact:phone', ''))[:100],
+        tags.get('opening_hours', '')[:255],
+        tags.get('website', tags.get('contact:website', ''))[:500]
+    )
+
+
+def fetch_overpass(bbox):
+    """
+    Query Overpass for the market places inside a bounding box.
+    
+    Args:
+        bbox: (south, west, north, east)
+    
+    The response is parsed as it streams in and unnamed elements are
+    dropped straight away, so only the named places are held in memory.
+    
+    Returns:
+        list: PlaceRecords, or None if every server failed
+    """
+    span_km = max(bbox[2] - bbox[0], bbox[3] - bbox[1]) * 111
+    # Larger areas need more time; the next server is the fallback
+    api_timeout = max(20, 15 + int(span_km / 2 // 10) * 5)
+    query = _overpass_query(bbox, api_timeout)
+    servers = os.getenv('OVERPASS_API_URLS')
+    servers = servers.split(',') if servers else OVERPASS_SERVERS
+    
+    for server_url in servers:
+        try:
+            print(f"[Market Search] Trying {server_url} for bbox {bbox}, timeout={api_timeout}s")
+            
+            # No retries: the next server is the fallback
+            response = http.get(
+                server_url,
+                params={'data': query},
+                timeout=(5, api_timeout + 5),
+                retries=0,
+                stream=True,
+                headers={'User-Agent': 'SecureCropSystem/1.0'}
+            )
+            
+            print(f"[Market Search] Response status: {response.status_code}")
+            
+            if response.status_code == 200:
+                meta, elements, places = {}, 0, []
+                with response:
+                    for element in iter_elements(_iter_text(response), meta):
+                        elements += 1
+                        place = parse_element(element)
+                        if place is not None:
+                            places.append(place)
+                if meta.get('remark'):
+                    # Query ran out of time or memory; the elements are incomplete
+                    print(f"[Market Search] Incomplete result from {server_url}: {meta['remark']}")
+                    continue
+                print(f"[Market Search] Found {elements} elements from OSM, {len(places)} named")
+                return places
+            response.close()
+            if response.status_code == 429:
+                print(f"[Market Search] Rate limited by {server_url}, trying next server...")
+            elif response.status_code == 504:
+                print(f"[Market Search] Gateway timeout from {server_url}, trying next server...")
+            else:
+                print(f"[Market Search] Unexpected status {response.status_code} from {server_url}")
+        except requests.exceptions.Timeout:
+            print(f"[Market Search] Timeout from {server_url}, trying next server...")
+        except Exception as e:
+            print(f"[Market Search] Error from {server_url}: {e}")
+    
+    return None
+
+
+def fetch_tiles(tiles):
+    """
+    Load the places of tiles from Overpass into the local store.
+    
+    One query covers the bounding box of all tiles; every tile inside
+    that box gets its places replaced and is marked fetched.
+    
+    Args:
+        tiles: (row, col) tiles to load
+    
+    Returns:
+        bool: False if Overpass could not be reached
+    """
+    rows = [tile[0] for tile in tiles]
+    cols = [tile[1] for tile in tiles]
+    south, west = tile_bounds((min(rows), min(cols)))[:2]
+    north, east = tile_bounds((max(rows), max(cols)))[2:]
+    records = fetch_overpass(tuple(round(edge, 6) for edge in (south, west, north, east)))
+    if records is None:
+        return False
+    
+    covered = {
+        (row, col)
+        for row in range(min(rows), max(rows) + 1)
+        for col in range(min(cols), max(cols) + 1)
+    }
+    places = {}
+    counts = {}
+    for record in records:
+        tile = tile_of(record.latitude, record.longitude)
+        if tile in covered and record.osm_id not in places:
+            places[record.osm_id] = (tile_key(tile), record)
+            counts[tile_key(tile)] = counts.get(tile_key(tile), 0) + 1
+    places = list(places.values())
+    now = timezone.now()
+    
+    with transaction.atomic():
+        MarketPlace.objects.filter(tile__in=[tile_key(tile) for tile in covered]).delete()
+        # Model instances are built one batch at a time
+        for start in range(0, len(places), INSERT_BATCH_SIZE):
+            MarketPlace.objects.bulk_create(
+                [MarketPlace(tile=key, **record.fields()) for key, record in places[start:start + INSERT_BATCH_SIZE]],
+                update_conflicts=True,
+                unique_fields=['osm_id'],
+                update_fields=list(PLACE_FIELDS[1:]) + ['tile', 'updated_at']
+            )
+        MarketTile.objects.bulk_create(
+            [MarketTile(key=tile_key(tile), fetched_at=now, place_count=counts.get(tile_key(tile), 0))
+             for tile in covered],
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['key'],
+            update_fields=['fetched_at', 'place_count']
+        )
+    
+    print(f"[Market Search] Stored {len(places)} places in {len(covered)} tiles")
+    return True
+
+
+def fetched_times(tiles):
+    """Map the keys of the stored tiles among tiles to their fetched_at."""
+    return dict(
+        MarketTile.objects
+        .filter(key__in=[tile_key(tile) for tile in tiles])
+        .values_list('key', 'fetched_at')
+    )
+
+
+def tile_status(tiles, fetched):
+    """
+    Split tiles by how fresh their stored places are.
+    
+    Args:
+        tiles: (row, col) tiles
+        fetched: fetched_times() of the tiles
+    
+    Returns:
+        tuple: (unknown, stale) - tiles never fetched, and tiles fetched
+            more than MARKET_TILE_TTL seconds ago
+    """
+    fresh_after = timezone.now() - timedelta(seconds=_setting('MARKET_TILE_TTL', 7 * 24 * 3600))
+    unknown = [tile for tile in tiles if tile_key(tile) not in fetched]
+    stale = [tile for tile in tiles if tile_key(tile) in fetched and fetched[tile_key(tile)] < fresh_after]
+    return unknown, stale
+
+
+# Tile -> Event set when the thread loading it is done (one load per tile at a time)
+_loading = {}
+_loading_lock = threading.Lock()
+
+# Fetches made and tiles served by another thread's fetch (for monitoring and tests)
+_load_stats = {'fetches': 0, 'shared': 0}
+
+
+def load_tiles(tiles, wait=True):
+    """
+    Fetch tiles, sharing the loads other threads already started.
+    
+    Args:
+        tiles: (row, col) tiles to load
+        wait: Also wait for the tiles being loaded by other threads
+    
+    Returns:
+        bool: False if this thread's Overpass fetch failed
+    """
+    done = threading.Event()
+    with _loading_lock:
+        others = {_loading[tile] for tile in tiles if tile in _loading}
+        mine = [tile for tile in tiles if tile not in _loading]
+        for tile in mine:
+            _loading[tile] = done
+        _load_stats['shared'] += len(tiles) - len(mine)
+        if mine:
+            _load_stats['fetches'] += 1
+    
+    try:
+        ok = fetch_tiles(mine) if mine else True
+    finally:
+        with _loading_lock:
+            for tile in mine:
+                del _loading[tile]
+        done.set()
+    
+    if wait:
+        for event in others:
+            event.wait()
+    return ok
+
+
+# Background refresh threads still running
+_refreshes = []
+_refreshes_lock = threading.Lock()
+
+
+def _refresh(tiles):
+    try:
+        load_tiles(tiles, wait=False)
+    except Exception as e:
+        print(f"[Market Search] Background refresh failed: {e}")
+    finally:
+        connection.close()
+        with _refreshes_lock:
+            _refreshes.remove(threading.current_thread())
+
+
+def refresh_tiles(tiles):
+    """Reload stale tiles without making the current search wait."""
+    if not _setting('MARKET_REFRESH_ASYNC', True):
+        load_tiles(tiles, wait=False)
+        return
+    
+    with _loading_lock:
+        tiles = [tile for tile in tiles if tile not in _loading]
+    if not tiles:
+        return
+    thread = threading.Thread(target=_refresh, args=(tiles,), name='market-tile-refresh', daemon=True)
+    with _refreshes_lock:
+        _refreshes.append(thread)
+    thread.start()
+
+
+def wait_for_refreshes(timeout=None):
+    """Block until the running background refreshes finish."""
+    with _refreshes_lock:
+        threads = list(_refreshes)
+    for thread in threads:
+        thread.join(timeout)
+
+
+def get_load_stats():
+    """Return the tile load counters."""
+    with _loading_lock:
+        return dict(_load_stats)
+
+
+def _columns(records):
+    """
+    Columnar form of a tile's places.
+    
+    Coordinates are float64 arrays and types int8 PLACE_TYPE_CODES; the
+    text fields (TEXT_FIELDS) of each place are one UTF-8 bytes value,
+    decoded only for the places returned.
+    """
+    count = len(records)
+    return {
+        'lat': np.fromiter((record.latitude for record in records), dtype=np.float64, count=count),
+        'lon': np.fromiter((record.longitude for record in records), dtype=np.float64, count=count),
+        'type': np.fromiter((PLACE_TYPE_CODES.get(record.place_type, -1) for record in records),
+                            dtype=np.int8, count=count),
+        'text': tuple(
+            TEXT_SEPARATOR.join(getattr(record, field).replace(TEXT_SEPARATOR, ' ') for field in TEXT_FIELDS).encode()
+            for record in records
+        ),
+    }
+
+
+def tile_columns(fetched):
+    """
+    Columnar places of stored tiles, cached per tile and fetch.
+    
+    Cache entries are keyed by (tile, fetched_at), so a tile reloaded by
+    any process is read again from the database.
+    
+    Args:
+        fetched: tile key -> fetched_at of the tiles to read
+    
+    Returns:
+        list: Per-tile column dicts (read-only, shared between searches)
+    """
+    columns = {}
+    for key, fetched_at in fetched.items():
+        cached = _tile_columns.get((key, fetched_at))
+        if cached is not None:
+            columns[key] = cached
+    
+    missing = [key for key in fetched if key not in columns]
+    if missing:
+        records_by_tile = {key: [] for key in missing}
+        for row in MarketPlace.objects.filter(tile__in=missing).values_list('tile', *PLACE_FIELDS):
+            records_by_tile[row[0]].append(PlaceRecord(*row[1:]))
+        for key, records in records_by_tile.items():
+            columns[key] = _columns(records)
+            _tile_columns.set((key, fetched[key]), columns[key])
+    
+    return [columns[key] for key in fetched]
+
+
+def haversine_many(lat, lon, lats, lons):
+    """
+    Distances in km from one point to many, in one vectorized pass.
+    
+    Args:
+        lat, lon: Origin in degrees
+        lats, lons: Arrays of target coordinates in degrees
+    
+    Returns:
+        numpy.ndarray: Distances in km
+    """
+    origin_lat = math.radians(lat)
+    lat_rad = np.radians(lats)
+    a = (np.sin((lat_rad - origin_lat) / 2) ** 2
+         + math.cos(origin_lat) * np.cos(lat_rad) * np.sin((np.radians(lons) - math.radians(lon)) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def nearest(distances, count):
+    """
+    Indices of the count smallest distances, nearest first.
+    
+    Only the selected indices are sorted (argpartition), not the whole array.
+    """
+    if count < len(distances):
+        selected = np.argpartition(distances, count - 1)[:count]
+    else:
+        selected = np.arange(len(distances))
+    return selected[np.argsort(distances[selected], kind='stable')]
+
+
+def search_places(lat, lon, radius_m, place_type=None, limit=None, offset=0):
+    """
+    Find stored places within a radius.
+    
+    Tiles never fetched are loaded first (shared with concurrent searches);
+    stale ones are served as stored and refreshed in the background.
+    
+    Args:
+        lat: Search latitude
+        lon: Search longitude
+        radius_m: Radius in meters
+        place_type: Only return places of this type
+        limit: Return at most this many places (None for all)
+        offset: Number of nearest places to skip
+    
+    Returns:
+        tuple: (places, count)
+            - places: Place dicts (id, name, lat, lon, type, distance_km,
+              address, phone, opening_hours, website, rating, source), nearest first
+            - count: Number of places within the radius
+    
+    Raises:
+        MarketSearchUnavailable: Some tiles are still not stored after loading
+            (this thread's or a concurrent Overpass fetch failed)
+    """
+    tiles = tiles_for_radius(lat, lon, radius_m)
+    fetched = fetched_times(tiles)
+    unknown, stale = tile_status(tiles, fetched)
+    if unknown:
+        print(f"[Market Search] {len(unknown)} of {len(tiles)} tiles not stored - fetching from API")
+        load_tiles(unknown)
+    if stale:
+        print(f"[Market Search] Serving {len(stale)} stale tiles while they refresh")
+        refresh_tiles(stale)
+    if unknown or stale:
+        fetched = fetched_times(tiles)
+        # Covers both this thread's failed fetch and a failed one it waited on
+        missing = [tile for tile in unknown if tile_key(tile) not in fetched]
+        if missing:
+            raise MarketSearchUnavailable(len(missing), len(tiles))
+    else:
+        print(f"[Market Search] All {len(tiles)} tiles stored locally")
+    
+    columns = tile_columns(fetched)
+    if not columns:
+        return [], 0
+    lats = np.concatenate([c['lat'] for c in columns])
+    lons = np.concatenate([c['lon'] for c in columns])
+    types = np.concatenate([c['type'] for c in columns])
+    distances = haversine_many(lat, lon, lats, lons)
+    matches = distances <= radius_m / 1000
+    if place_type:
+        matches &= types == PLACE_TYPE_CODES.get(place_type, -1)
+    candidates = np.flatnonzero(matches)
+    
+    end = len(candidates) if limit is None else min(offset + limit, len(candidates))
+    page = candidates[nearest(distances[candidates], end)[offset:end]] if end > offset else []
+    
+    # Map positions in the concatenated arrays back to (tile, place)
+    starts = np.cumsum([0] + [len(c['text']) for c in columns])
+    results = []
+    for index in page:
+        tile = int(np.searchsorted(starts, index, side='right')) - 1
+        osm_id, name, address, phone, opening_hours, website = \
+            columns[tile]['text'][index - starts[tile]].decode().split(TEXT_SEPARATOR)
+        results.append({
+            'id': osm_id,
+            'name': name,
+            'lat': float(lats[index]),
+            'lon': float(lons[index]),
+            'type': PLACE_TYPES.get(int(types[index]), 'market'),
+            'distance_km': round(float(distances[index]), 2),
+            'address': address,
+            'phone': phone,
+            'opening_hours': opening_hours,
+            'website': website,
+            'rating': None,
+            'source': 'openstreetmap'
+        })
+    
+    return results, len(candidates)
@@ -0,0 +1,314 @@
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from securecrop import http
+from . import places
+from .models import MarketPlace, MarketTile
+
+
+# Search center (Kuala Lumpur); 0.009 degrees of latitude is about 1km
+CENTER = (3.1390, 101.6869)
+
+# (id, name, km north of CENTER, OSM tags)
+PLACES = [
+    (1, 'Pasar Chow Kit', 0.5, {'amenity': 'marketplace'}),
+    (2, 'Kedai Baja Tani', 2, {'shop': 'garden_centre'}),
+    (3, 'Pusat Borong', 4, {'shop': 'wholesale'}),
+    (4, '', 1, {'shop': 'convenience'}),
+    (5, 'Mydin Mart', 8, {'shop': 'supermarket'}),
+    (6, 'Giant Hypermarket', 15, {'shop': 'supermarket'}),
+]
+
+
+def overpass_elements():
+    """Overpass elements for PLACES; the wholesaler is a way with a center."""
+    elements = []
+    for osm_id, name, km, tags in PLACES:
+        lat, lon = CENTER[0] + km * 0.009, CENTER[1]
+        tags = dict(tags, name=name) if name else tags
+        if osm_id == 3:
+            elements.append({'type': 'way', 'id': osm_id, 'center': {'lat': lat, 'lon': lon}, 'tags': tags})
+        else:
+            elements.append({'type': 'node', 'id': osm_id, 'lat': lat, 'lon': lon, 'tags': tags})
+    return elements
+
+
+class OverpassStubServer:
+    """
+    Local HTTP server standing in for the Overpass API.
+    
+    Use as a context manager; while active, OVERPASS_API_URLS points at the
+    stub. The bounding box of every query is recorded in bboxes, and only
+    elements inside it are returned. status sets the response status,
+    delay (seconds) how long each response takes, and remark an Overpass
+    runtime error reported after the elements.
+    """
+    
+    def __init__(self, status=200, delay=0.0, remark=None):
+        self.status = status
+        self.delay = delay
+        self.remark = remark
+        self.bboxes = []
+        stub = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)['data'][0]
+                bbox = tuple(float(value) for value in re.search(r'\(([^()]+),([^()]+),([^()]+),([^()]+)\)', query).groups())
+                stub.bboxes.append(bbox)
+                time.sleep(stub.delay)
+                south, west, north, east = bbox
+                elements = [
+                    element for element in overpass_elements()
+                    if south <= element.get('lat', element.get('center', {}).get('lat')) <= north
+                    and west <= element.get('lon', element.get('center', {}).get('lon')) <= east
+                ]
+                body = {'version': 0.6, 'osm3s': {'copyright': 'OpenStreetMap contributors'}, 'elements': elements}
+                if stub.remark:
+                    body['remark'] = stub.remark
+                payload = json.dumps(body if stub.status == 200 else {}).encode()
+                self.send_response(stub.status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            
+            def log_message(self, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/api/interpreter"
+    
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self._env = mock.patch.dict('os.environ', {'OVERPASS_API_URLS': self.url})
+        self._env.start()
+        http.reset()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._env.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class MarketTileStoreTest(TestCase):
+    """Test cases for the market search tile store."""
+    
+    def setUp(self):
+        self.client = APIClient()
+    
+    def search(self, lat=CENTER[0], lon=CENTER[1], radius=5000):
+        response = self.client.get(reverse('search-all'), {'lat': lat, 'lon': lon, 'radius': radius})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+    
+    def test_search_filters_radius_and_sorts_by_distance(self):
+        """Named places within the radius are returned nearest first."""
+        with OverpassStubServer() as overpass:
+            results = self.search()
+        
+        self.assertEqual(len(overpass.bboxes), 1)
+        self.assertEqual([place['name'] for place in results], ['Pasar Chow Kit', 'Kedai Baja Tani', 'Pusat Borong'])
+        self.assertEqual([place['type'] for place in results], ['market', 'agri_store', 'buyer'])
+        self.assertEqual(results[0]['id'], 'osm_node_1')
+        self.assertEqual(results[2]['id'], 'osm_way_3')
+        self.assertAlmostEqual(results[1]['distance_km'], 2.0, delta=0.05)
+        self.assertEqual(results[0]['source'], 'openstreetmap')
+    
+    def test_nearby_and_smaller_searches_use_stored_tiles(self):
+        """Moving about 1km or shrinking the radius makes no Overpass call."""
+        with OverpassStubServer() as overpass:
+            self.search()
+            nearby = self.search(lat=CENTER[0] + 0.009)
+            smaller = self.search(radius=1000)
+        
+        self.assertEqual(len(overpass.bboxes), 1)
+        self.assertEqual(nearby[0]['name'], 'Pasar Chow Kit')
+        self.assertAlmostEqual(nearby[0]['distance_km'], 0.5, delta=0.05)
+        self.assertEqual([place['name'] for place in smaller], ['Pasar Chow Kit'])
+    
+    def test_larger_radius_fetches_uncovered_tiles(self):
+        """Widening the search loads the new tiles with one more query."""
+        with OverpassStubServer() as overpass:
+            self.search()
+            first_tiles = MarketTile.objects.count()
+            results = self.search(radius=20000)
+            self.search(radius=20000)
+        
+        self.assertEqual(len(overpass.bboxes), 2)
+        self.assertGreater(MarketTile.objects.count(), first_tiles)
+        self.assertEqual([place['name'] for place in results][-2:], ['Mydin Mart', 'Giant Hypermarket'])
+        self.assertEqual(MarketPlace.objects.count(), 5)
+    
+    def test_tiles_cover_search_circle(self):
+        """Every place within the radius lies in one of the search tiles."""
+        tiles = {places.tile_key(tile) for tile in places.tiles_for_radius(CENTER[0], CENTER[1], 5000)}
+        for _, _, km, _ in PLACES:
+            point = places.tile_of(CENTER[0] + km * 0.009, CENTER[1])
+            self.assertEqual(places.tile_key(point) in tiles, km <= 5)
+    
+    @override_settings(MARKET_TILE_TTL=0)
+    def test_stale_tiles_refetched_and_served_on_failure(self):
+        """Expired tiles are fetched again; if Overpass fails, stored places are used."""
+        with OverpassStubServer() as overpass:
+            self.search()
+            self.search()
+        self.assertEqual(len(overpass.bboxes), 2)
+        
+        with OverpassStubServer(status=503) as overpass:
+            results = self.search()
+        self.assertEqual(len(overpass.bboxes), 1)
+        self.assertEqual(len(results), 3)
+    
+    def test_typed_views_filter_one_search(self):
+        """Markets, buyers and stores are filtered from the same stored places."""
+        params = {'lat': CENTER[0], 'lon': CENTER[1], 'radius': 5000}
+        with OverpassStubServer() as overpass:
+            names = {
+                name: [place['name'] for place in self.client.get(reverse(name), params).data]
+                for name in ['search-markets', 'search-buyers', 'search-stores']
+            }
+        
+        self.assertEqual(len(overpass.bboxes), 1)
+        self.assertEqual(names, {
+            'search-markets': ['Pasar Chow Kit'],
+            'search-buyers': ['Pusat Borong'],
+            'search-stores': ['Kedai Baja Tani'],
+        })
+    
+    def test_concurrent_loads_share_tiles(self):
+        """Threads needing tiles already being loaded wait for that load."""
+        fetched = []
+        
+        def slow_fetch(tiles):
+            fetched.append(sorted(tiles))
+            time.sleep(0.3)
+            return True
+        
+        stats = places.get_load_stats()
+        with mock.patch.object(places, 'fetch_tiles', side_effect=slow_fetch):
+            threads = [threading.Thread(target=places.load_tiles, args=([(1, 1), (1, 2)],)) for _ in range(6)]
+            threads.append(threading.Thread(target=places.load_tiles, args=([(1, 2), (1, 3)],)))
+            for thread in threads:
+                thread.start()
+                time.sleep(0.01)
+            for thread in threads:
+                thread.join()
+        
+        self.assertEqual(fetched, [[(1, 1), (1, 2)], [(1, 3)]])
+        self.assertEqual(places.get_load_stats()['fetches'] - stats['fetches'], 2)
+        self.assertEqual(places.get_load_stats()['shared'] - stats['shared'], 11)
+    
+    @override_settings(MARKET_TILE_TTL=0, MARKET_REFRESH_ASYNC=True)
+    def test_stale_tiles_served_while_refreshing(self):
+        """A stale search returns stored places without waiting for Overpass."""
+        with OverpassStubServer():
+            self.search()
+        
+        with OverpassStubServer(status=503, delay=0.5) as overpass:
+            started = time.monotonic()
+            results = self.search()
+            elapsed = time.monotonic() - started
+            places.wait_for_refreshes(5)
+        
+        self.assertLess(elapsed, 0.4)
+        self.assertEqual(len(results), 3)
+        self.assertEqual(len(overpass.bboxes), 1)
+    
+    def test_limit_and_offset_page_nearest_places(self):
+        """limit/offset return a page of the nearest places with the total count."""
+        with OverpassStubServer():
+            page = self.client.get(reverse('search-all'), {
+                'lat': CENTER[0], 'lon': CENTER[1], 'radius': 20000, 'limit': 2, 'offset': 1
+            }).data
+            everything = self.search(radius=20000)
+        
+        self.assertEqual(page['count'], 5)
+        self.assertEqual([place['name'] for place in page['results']], ['Kedai Baja Tani', 'Pusat Borong'])
+        self.assertEqual(page['results'], everything[1:3])
+        
+        for params in [{'limit': 0}, {'offset': -1}, {'limit': 'ten'}]:
+            response = self.client.get(reverse('search-all'), dict(params, lat=CENTER[0], lon=CENTER[1]))
+            self.assertEqual(response.status_code, 400)
+    
+    def test_vectorized_distances_and_selection(self):
+        """haversine_many matches haversine_distance; nearest() sorts only the top k."""
+        lats = np.array([3.1, 3.2, 5.4, -1.0])
+        lons = np.array([101.6, 101.7, 100.3, 100.0])
+        distances = places.haversine_many(CENTER[0], CENTER[1], lats, lons)
+        for distance, lat, lon in zip(distances, lats, lons):
+            self.assertAlmostEqual(distance, places.haversine_distance(CENTER[0], CENTER[1], lat, lon), places=6)
+        
+        self.assertEqual(list(places.nearest(np.array([5.0, 1.0, 4.0, 2.0, 3.0]), 3)), [1, 3, 4])
+        self.assertEqual(list(places.nearest(np.array([2.0, 1.0]), 5)), [1, 0])
+    
+    def test_streaming_parser_handles_split_chunks(self):
+        """Elements are decoded across chunk boundaries, including multi-byte characters."""
+        body = json.dumps({
+            'version': 0.6,
+            'osm3s': {'timestamp_osm_base': '2026-10-17T00:00:00Z'},
+            'elements': overpass_elements() + [
+                {'type': 'node', 'id': 7, 'lat': 3.15, 'lon': 101.71, 'tags': {'name': 'Pasar Borong 吉隆坡'}}
+            ],
+            'remark': None,
+        }, ensure_ascii=False, indent=1).encode()
+        response = mock.Mock()
+        response.iter_content.return_value = [body[start:start + 7] for start in range(0, len(body), 7)]
+        
+        meta = {}
+        elements = list(places.iter_elements(places._iter_text(response), meta))
+        self.assertEqual(elements, json.loads(body)['elements'])
+        self.assertEqual(meta['version'], 0.6)
+        
+        records = [places.parse_element(element) for element in elements]
+        self.assertIsNone(records[3])
+        self.assertEqual(records[6].name, 'Pasar Borong 吉隆坡')
+        self.assertEqual(records[2].fields()['place_type'], 'buyer')
+        
+        with self.assertRaises(ValueError):
+            list(places.iter_elements([body[:len(body) // 2].decode('utf-8', 'ignore')]))
+    
+    def test_incomplete_overpass_result_not_stored(self):
+        """A runtime error remark leaves the tiles unfetched."""
+        params = {'lat': CENTER[0], 'lon': CENTER[1], 'radius': 5000}
+        with OverpassStubServer(remark='runtime error: Query timed out') as overpass:
+            response = self.client.get(reverse('search-all'), params)
+        
+        self.assertEqual(len(overpass.bboxes), 1)
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(MarketTile.objects.exists())
+    
+    def test_unloaded_tiles_return_503(self):
+        """A search whose new tiles could not be fetched is not answered with a partial 200."""
+        params = {'lat': CENTER[0], 'lon': CENTER[1], 'radius': 5000}
+        with OverpassStubServer():
+            self.search()
+        with OverpassStubServer(status=503) as overpass:
+            response = self.client.get(reverse('search-markets'), dict(params, radius=20000))
+            stored = self.search()
+        
+        self.assertEqual(len(overpass.bboxes), 1)
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('error', response.data)
+        self.assertEqual(len(stored), 3)
+    
+    @override_settings(MARKET_MAX_RADIUS=50000)
+    def test_radius_outside_limits_rejected(self):
+        """Radii above MARKET_MAX_RADIUS or below 1m are rejected before any fetch."""
+        with OverpassStubServer() as overpass:
+            for radius in [50001, 1000000, 0, -5]:
+                response = self.client.get(reverse('search-all'), {'lat': CENTER[0], 'lon': CENTER[1], 'radius': radius})
+                self.assertEqual(response.status_code, 400)
+        
+        self.assertEqual(overpass.bboxes, [])
@@ -1,7 +1,10 @@
 """Market Linkage API URL Configuration"""
 from django.urls import path
-from .views import SearchAllView
+from .views import SearchAllView, SearchMarketsView, SearchBuyersView, SearchStoresView
 
 urlpatterns = [
     path('search/all/', SearchAllView.as_view(), name='search-all'),
+    path('search/markets/', SearchMarketsView.as_view(), name='search-markets'),
+    path('search/buyers/', SearchBuyersView.as_view(), name='search-buyers'),
+    path('search/stores/', SearchStoresView.as_view(), name='search-stores'),
 ]
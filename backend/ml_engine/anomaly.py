@@ -0,0 +1,89 @@
+"""
+IsolationForest anomaly detector for soil inputs.
+
+This module provides:
+1. The detector's feature order (SoilInput.to_feature_array() order)
+2. Fitting on the blended training data (used by train_model.py)
+3. A fallback detector fitted on synthetic typical soil ranges, used only
+   when no trained detector artifact exists
+
+The detector is published with the crop models and loaded into the same
+ModelBundle, so requests never fit it. This module has no Django
+dependency so train_model.py can import it.
+"""
+
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+
+# Detector features, in SoilInput.to_feature_array() order
+DETECTOR_FEATURES = ['N_level', 'P_level', 'K_level', 'ph', 'moisture', 'temperature']
+
+# Training dataset column for each detector feature
+TRAINING_COLUMNS = {
+    'N_level': 'N',
+    'P_level': 'P',
+    'K_level': 'K',
+    'ph': 'ph',
+    'moisture': 'humidity',
+    'temperature': 'temperature',
+}
+
+# Typical soil parameter ranges for the synthetic fallback (low, high)
+SYNTHETIC_RANGES = np.array([
+    [10, 150],   # N
+    [5, 100],    # P
+    [5, 100],    # K
+    [4.5, 8.5],  # pH
+    [20, 95],    # moisture
+    [5, 45],     # temperature
+])
+
+
+def fit_anomaly_detector(X, contamination=0.1, n_estimators=100, random_state=42):
+    """
+    Fit the IsolationForest on raw (unscaled) soil readings.
+
+    Args:
+        X: 2-D array with columns in DETECTOR_FEATURES order
+
+    Returns:
+        Fitted IsolationForest
+    """
+    detector = IsolationForest(
+        contamination=contamination,
+        random_state=random_state,
+        n_estimators=n_estimators
+    )
+    detector.fit(np.asarray(X, dtype=float))
+    return detector
+
+
+def training_matrix(df):
+    """Select the detector features from the blended training DataFrame."""
+    return df[[TRAINING_COLUMNS[feature] for feature in DETECTOR_FEATURES]].to_numpy(dtype=float)
+
+
+def fit_synthetic_detector(n_samples=500):
+    """Fit a detector on uniformly sampled typical soil ranges (fallback only)."""
+    rng = np.random.RandomState(42)
+    X = rng.uniform(SYNTHETIC_RANGES[:, 0], SYNTHETIC_RANGES[:, 1], size=(n_samples, len(DETECTOR_FEATURES)))
+    return fit_anomaly_detector(X)
+
+
+def anomaly_scores(detector, X):
+    """
+    Score rows with the detector.
+
+    Args:
+        detector: Fitted IsolationForest
+        X: 2-D array with columns in DETECTOR_FEATURES order
+
+    Returns:
+        tuple: (is_anomalous, scores)
+            - is_anomalous: Boolean array (same as predict() == -1)
+            - scores: Anomaly score per row; positive means anomalous, and
+              higher is more unusual (negated decision_function)
+    """
+    scores = -detector.decision_function(np.asarray(X, dtype=float))
+    return scores > 0, scores
@@ -0,0 +1,106 @@
+"""
+Latency benchmark for crop-model inference.
+
+Compares single-row scoring through:
+1. The original sklearn path (predict + predict_proba on the sklearn forest)
+2. Fused sklearn scoring (one predict_proba pass)
+3. The compiled flat-array forest
+
+and reports p50/p99 latency per request plus batch throughput.
+
+Usage (from backend/, after training):
+    python ml_engine/benchmark_inference.py [--iterations 500] [--batch-size 500]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent
+MODELS_DIR = BASE_DIR / 'models'
+
+if str(BASE_DIR.parent) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR.parent))
+
+from ml_engine.compiled_forest import CompiledForest
+from ml_engine.registry import resolve_active_version
+
+
+def time_calls(fn, rows):
+    """Time fn on each row individually, returning latencies in milliseconds."""
+    latencies = []
+    for row in rows:
+        start = time.perf_counter()
+        fn(row)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.asarray(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark crop-model inference latency')
+    parser.add_argument('--iterations', type=int, default=500, help='single-row requests per path')
+    parser.add_argument('--batch-size', type=int, default=500, help='rows for the batch throughput test')
+    args = parser.parse_args()
+    
+    version, artifacts_dir = resolve_active_version(MODELS_DIR)
+    pipeline_path = artifacts_dir / 'rf_pipeline.joblib'
+    if not pipeline_path.exists():
+        print(f"❌ {pipeline_path} not found. Run 'python ml_engine/train_model.py' first.")
+        sys.exit(1)
+    
+    pipeline = joblib.load(pipeline_path)
+    rf_model = pipeline['model']
+    scaler = pipeline['scaler']
+    
+    compiled_path = artifacts_dir / 'rf_compiled.joblib'
+    if compiled_path.exists():
+        compiled = CompiledForest.from_arrays(joblib.load(compiled_path))
+    else:
+        compiled = CompiledForest.from_sklearn(rf_model)
+    
+    # Random rows around the training distribution, already scaled
+    rng = np.random.RandomState(42)
+    raw = rng.uniform([0, 5, 5, 10, 15, 4], [140, 145, 205, 40, 100, 9], size=(args.iterations, 6))
+    rows = [scaler.transform(r.reshape(1, -1)) for r in raw]
+    
+    def original_path(x):
+        rf_model.predict(x)
+        rf_model.predict_proba(x)
+    
+    paths = [
+        ('sklearn predict + predict_proba', original_path),
+        ('sklearn predict_proba only', rf_model.predict_proba),
+        ('compiled forest', compiled.predict_proba),
+    ]
+    
+    print("=" * 60)
+    print(f"Single-row latency ({args.iterations} requests, {compiled.n_estimators} trees, version {version})")
+    print("=" * 60)
+    for name, fn in paths:
+        fn(rows[0])  # warm up
+        latencies = time_calls(fn, rows)
+        print(f"{name:35s} p50={np.percentile(latencies, 50):8.3f} ms  "
+              f"p99={np.percentile(latencies, 99):8.3f} ms")
+    
+    batch = scaler.transform(rng.uniform(
+        [0, 5, 5, 10, 15, 4], [140, 145, 205, 40, 100, 9], size=(args.batch_size, 6)
+    ))
+    print("\n" + "=" * 60)
+    print(f"Batch throughput ({args.batch_size} rows)")
+    print("=" * 60)
+    for name, fn in paths[1:]:
+        start = time.perf_counter()
+        fn(batch)
+        elapsed = time.perf_counter() - start
+        print(f"{name:35s} {elapsed * 1000:8.1f} ms  ({args.batch_size / elapsed:,.0f} rows/s)")
+    
+    matches = np.array_equal(rf_model.predict_proba(batch), compiled.predict_proba(batch))
+    print(f"\nCompiled predictions identical to sklearn: {matches}")
+
+
+if __name__ == "__main__":
+    main()
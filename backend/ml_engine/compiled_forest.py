@@ -0,0 +1,203 @@
+"""
+Flat array-backed inference engine for trained Random Forest models.
+
+This module provides:
+1. Export of a fitted RandomForestClassifier into contiguous NumPy node arrays
+2. Vectorized traversal of every tree for a whole feature matrix at once
+3. predict / predict_proba that match scikit-learn bit-for-bit
+
+The sklearn object graph validates its input and dispatches to each tree on
+every call, which dominates latency for single-row requests. The compiled
+forest keeps all trees in a handful of arrays (feature, threshold, children,
+leaf value) and walks them level by level with NumPy fancy indexing.
+
+This module has no Django dependency so train_model.py can import it.
+"""
+
+import hashlib
+
+import numpy as np
+
+
+# Keys of the exported array dictionary (see CompiledForest.to_arrays)
+ARRAY_KEYS = (
+    'feature', 'threshold', 'children_left', 'children_right',
+    'missing_go_to_left', 'value', 'roots', 'classes', 'max_depth'
+)
+
+# Extra export key: file_digest() of the model file the forest was compiled from
+SOURCE_DIGEST_KEY = 'source_digest'
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-256 hex digest of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CompiledForest:
+    """
+    Random Forest flattened into contiguous node arrays.
+    
+    Node arrays hold the nodes of all trees back to back; children indices
+    are global offsets into those arrays and leaves point to themselves, so
+    a fixed number of traversal steps (the deepest tree's depth) lands every
+    row on its leaf without per-node branching.
+    
+    Attributes:
+        feature: Split feature per node (0 for leaves)
+        threshold: Split threshold per node (float64, as in sklearn)
+        children_left / children_right: Global child index per node
+        missing_go_to_left: Whether NaN goes left at each node
+        value: Per-node class probabilities, shape (n_nodes, n_classes)
+        roots: Global index of each tree's root node
+        classes_: Class labels, aligned with predict_proba columns
+        max_depth: Depth of the deepest tree
+    """
+    
+    def __init__(self, feature, threshold, children_left, children_right,
+                 missing_go_to_left, value, roots, classes, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.children_left = children_left
+        self.children_right = children_right
+        self.missing_go_to_left = missing_go_to_left
+        self.value = value
+        self.roots = roots
+        self.classes_ = classes
+        self.max_depth = int(max_depth)
+    
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+    
+    @property
+    def n_classes_(self):
+        return len(self.classes_)
+    
+    @classmethod
+    def from_sklearn(cls, forest):
+        """
+        Compile a fitted RandomForestClassifier.
+        
+        Args:
+            forest: Fitted single-output RandomForestClassifier
+        
+        Returns:
+            CompiledForest
+        """
+        n_classes = len(forest.classes_)
+        features, thresholds, lefts, rights, missing_left, values, roots = [], [], [], [], [], [], []
+        max_depth = 0
+        offset = 0
+        
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(offset, offset + n_nodes, dtype=np.intp)
+            is_leaf = tree.children_left == -1
+            
+            # Leaves point to themselves so extra traversal steps are no-ops
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left + offset).astype(np.intp))
+            rights.append(np.where(is_leaf, node_ids, tree.children_right + offset).astype(np.intp))
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.intp))
+            thresholds.append(tree.threshold.astype(np.float64))
+            missing_left.append(
+                np.asarray(getattr(tree, 'missing_go_to_left', np.zeros(n_nodes)), dtype=bool)
+            )
+            # tree_.value already holds per-leaf class fractions
+            values.append(np.asarray(tree.value[:, 0, :n_classes], dtype=np.float64))
+            
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n_nodes
+        
+        return cls(
+            feature=np.ascontiguousarray(np.concatenate(features)),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds)),
+            children_left=np.ascontiguousarray(np.concatenate(lefts)),
+            children_right=np.ascontiguousarray(np.concatenate(rights)),
+            missing_go_to_left=np.ascontiguousarray(np.concatenate(missing_left)),
+            value=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.intp),
+            classes=np.asarray(forest.classes_),
+            max_depth=max_depth,
+        )
+    
+    def to_arrays(self, source_digest=None):
+        """
+        Export as a dict of plain NumPy arrays (joblib/mmap friendly).
+        
+        Args:
+            source_digest: file_digest() of the saved model this forest was
+                compiled from, stored so loaders can detect a stale export
+        """
+        arrays = {
+            'feature': self.feature,
+            'threshold': self.threshold,
+            'children_left': self.children_left,
+            'children_right': self.children_right,
+            'missing_go_to_left': self.missing_go_to_left,
+            'value': self.value,
+            'roots': self.roots,
+            'classes': self.classes_,
+            'max_depth': np.asarray(self.max_depth),
+        }
+        if source_digest is not None:
+            arrays[SOURCE_DIGEST_KEY] = np.asarray(source_digest)
+        return arrays
+    
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuild from the dict produced by to_arrays()."""
+        return cls(**{key: arrays[key] for key in ARRAY_KEYS})
+    
+    def apply(self, X):
+        """
+        Return the leaf reached by every row in every tree.
+        
+        Args:
+            X: 2-D array of scaled features
+        
+        Returns:
+            np.ndarray: Global leaf indices, shape (n_estimators, n_samples)
+        """
+        # sklearn evaluates splits on float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        n_samples = X.shape[0]
+        rows = np.arange(n_samples)[np.newaxis, :]
+        nodes = np.repeat(self.roots[:, np.newaxis], n_samples, axis=1)
+        
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[nodes]]
+            go_left = x <= self.threshold[nodes]
+            go_left |= np.isnan(x) & self.missing_go_to_left[nodes]
+            nodes = np.where(go_left, self.children_left[nodes], self.children_right[nodes])
+        
+        return nodes
+    
+    def predict_proba(self, X):
+        """
+        Predict class probabilities, identical to RandomForestClassifier.
+        
+        Leaf probabilities are summed in estimator order and divided by the
+        number of trees, which is the accumulation sklearn performs with
+        n_jobs=1.
+        
+        Args:
+            X: 2-D array of scaled features
+        
+        Returns:
+            np.ndarray: Shape (n_samples, n_classes)
+        """
+        leaves = self.apply(X)
+        proba = np.add.reduce(self.value[leaves], axis=0)
+        proba /= self.n_estimators
+        return proba
+    
+    def predict(self, X):
+        """Predict class labels (argmax of predict_proba)."""
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
@@ -0,0 +1,460 @@
+"""
+Process-wide, versioned registry of loaded ML artifacts.
+
+This module provides:
+1. An immutable ModelBundle holding every inference artifact (crop models,
+   anomaly detector) and the SHAP explainer for one model version
+2. Version resolution from the CURRENT pointer written by train_model.py
+   (models/versions/<version>/), with a fingerprint for the legacy flat layout
+3. One-time loading of each artifact file (never the same file twice)
+4. Memory-mapped loading of large NumPy arrays
+5. Eager warm-up when the WSGI application starts (securecrop/wsgi.py)
+6. Hot-swap: a newly published version is loaded in a background thread
+   and swapped in atomically, without a restart
+
+Callers should fetch the bundle once per request and use it for every step
+(prediction, explanation), so a swap mid-request can never mix versions.
+
+With gunicorn's preload_app the bundle is loaded once in the master
+process before workers are forked, so recycled workers start with the
+models already in memory. Arrays are loaded with joblib's mmap_mode, so
+the compiled forest's node arrays are backed by the OS page cache and
+shared by every worker instead of being copied into each one.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import joblib
+
+from .anomaly import fit_synthetic_detector
+from .compiled_forest import SOURCE_DIGEST_KEY, CompiledForest, file_digest
+
+
+# Base directories
+BASE_DIR = Path(__file__).resolve().parent
+MODELS_DIR = BASE_DIR / 'models'
+
+# Published versions live in MODELS_DIR / VERSIONS_DIRNAME / <version>/
+# and MODELS_DIR / CURRENT_FILENAME names the active one
+VERSIONS_DIRNAME = 'versions'
+CURRENT_FILENAME = 'CURRENT'
+
+# Memory-map NumPy arrays stored in uncompressed joblib files
+MMAP_MODE = 'r'
+
+# Number of published versions kept on disk (the active one is never removed)
+KEEP_VERSIONS = 3
+
+# Seconds between checks for a newly published version (0 disables hot-swap)
+RELOAD_CHECK_INTERVAL = 30
+
+# Files that make up a legacy (unversioned) models directory
+LEGACY_ARTIFACTS = (
+    'rf_pipeline.joblib', 'best_model.joblib', 'nb_pipeline.joblib',
+    'scaler.joblib', 'label_encoder.joblib', 'rf_compiled.joblib',
+)
+
+# Detector shipped before it became part of published versions
+LEGACY_DETECTOR_PATH = BASE_DIR.parent / 'cyber_layer' / 'anomaly_detector.joblib'
+
+# Loaded bundle and the lock guarding its creation
+_bundle = None
+_bundle_lock = threading.Lock()
+
+# Detector used while no crop models are available
+_fallback_detector = None
+
+# Hot-swap state
+_last_check = 0.0
+_loading_version = None
+
+
+class ModelBundle:
+    """
+    All inference artifacts of one model version, loaded together.
+    
+    Bundles are never modified after loading; a new version gets a new
+    bundle that replaces the old one as a whole.
+    
+    Attributes:
+        version: Version identifier of the artifacts
+        rf_model: Trained RandomForest (sklearn)
+        nb_model: Trained GaussianNB, or None if not available
+        scaler: Fitted StandardScaler
+        label_encoder: Fitted LabelEncoder
+        compiled_forest: CompiledForest matching rf_model, or None
+        explainer: SHAP explainer for rf_model, or None if SHAP is unavailable
+        anomaly_detector: Fitted IsolationForest for pre-ML checks
+    """
+    
+    __slots__ = (
+        'version', 'rf_model', 'nb_model', 'scaler', 'label_encoder',
+        'compiled_forest', 'explainer', 'anomaly_detector',
+    )
+    
+    def __init__(self, version, rf_model, nb_model, scaler, label_encoder,
+                 compiled_forest, explainer, anomaly_detector):
+        self.version = version
+        self.rf_model = rf_model
+        self.nb_model = nb_model
+        self.scaler = scaler
+        self.label_encoder = label_encoder
+        self.compiled_forest = compiled_forest
+        self.explainer = explainer
+        self.anomaly_detector = anomaly_detector
+
+
+def _load(path):
+    return joblib.load(path, mmap_mode=MMAP_MODE)
+
+
+def _legacy_fingerprint(models_dir):
+    """Cheap version id for a flat models directory (names, sizes, mtimes)."""
+    digest = hashlib.sha256()
+    for name in LEGACY_ARTIFACTS:
+        path = models_dir / name
+        if path.exists():
+            stat = path.stat()
+            digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return f"legacy-{digest.hexdigest()[:12]}"
+
+
+def resolve_active_version(models_dir=None):
+    """
+    Find the active model version and the directory holding its artifacts.
+    
+    Args:
+        models_dir: Root models directory (default MODELS_DIR)
+    
+    Returns:
+        tuple: (version, artifacts_dir)
+    """
+    models_dir = Path(models_dir or MODELS_DIR)
+    current_path = models_dir / CURRENT_FILENAME
+    
+    if current_path.exists():
+        version = current_path.read_text().strip()
+        if version:
+            return version, models_dir / VERSIONS_DIRNAME / version
+    
+    return _legacy_fingerprint(models_dir), models_dir
+
+
+def create_staging_dir(models_dir=None):
+    """Create an empty directory to write a new version's artifacts into."""
+    versions_dir = Path(models_dir or MODELS_DIR) / VERSIONS_DIRNAME
+    versions_dir.mkdir(parents=True, exist_ok=True)
+    return Path(tempfile.mkdtemp(prefix='.staging-', dir=versions_dir))
+
+
+def publish_version(staging_dir, models_dir=None):
+    """
+    Publish a fully written artifact directory as the active model version.
+    
+    The version is the content hash of the artifacts. The directory is
+    renamed into versions/<version>/ and the CURRENT pointer is replaced
+    with os.replace, so readers see either the old or the new version.
+    
+    Args:
+        staging_dir: Directory from create_staging_dir() holding the artifacts
+        models_dir: Root models directory (default MODELS_DIR)
+    
+    Returns:
+        str: The published version
+    """
+    models_dir = Path(models_dir or MODELS_DIR)
+    staging_dir = Path(staging_dir)
+    versions_dir = models_dir / VERSIONS_DIRNAME
+    
+    digest = hashlib.sha256()
+    for path in sorted(staging_dir.iterdir()):
+        digest.update(path.name.encode())
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    version = digest.hexdigest()[:16]
+    
+    target_dir = versions_dir / version
+    if target_dir.exists():
+        # Identical artifacts were published before
+        shutil.rmtree(staging_dir)
+    else:
+        os.rename(staging_dir, target_dir)
+    
+    pointer_tmp = models_dir / f".{CURRENT_FILENAME}.tmp"
+    pointer_tmp.write_text(version)
+    os.replace(pointer_tmp, models_dir / CURRENT_FILENAME)
+    
+    # Prune old versions (running servers keep mmapped files readable)
+    published = sorted(
+        (d for d in versions_dir.iterdir() if d.is_dir() and not d.name.startswith('.')),
+        key=lambda d: d.stat().st_mtime,
+        reverse=True
+    )
+    for old_dir in published[KEEP_VERSIONS:]:
+        if old_dir.name != version:
+            shutil.rmtree(old_dir, ignore_errors=True)
+    
+    return version
+
+
+def load_anomaly_detector(models_dir):
+    """
+    Load the anomaly detector published with a version.
+    
+    Falls back to the detector shipped in cyber_layer/ and, if that is
+    missing too, fits one on synthetic soil ranges. Either way this happens
+    while the bundle loads (at warm-up), never inside a request.
+    """
+    for path in (Path(models_dir) / 'anomaly_detector.joblib', LEGACY_DETECTOR_PATH):
+        if path.exists():
+            return _load(path)
+    
+    print("⚠️ No trained anomaly detector found; fitting one on synthetic soil ranges")
+    return fit_synthetic_detector()
+
+
+def _build_explainer(rf_model):
+    """Create the SHAP explainer for the Random Forest (None if SHAP fails)."""
+    try:
+        import shap
+        return shap.TreeExplainer(rf_model)
+    except Exception as e:
+        print(f"⚠️ SHAP explainer not created: {e}")
+        return None
+
+
+def load_bundle(models_dir=None, version=None):
+    """
+    Load every artifact of one version from disk, reading each file at most once.
+    
+    Args:
+        models_dir: Directory holding the joblib artifacts (default: the
+            active version's directory under MODELS_DIR)
+        version: Version identifier to record on the bundle
+    
+    Returns:
+        ModelBundle
+    
+    Raises:
+        FileNotFoundError: If the Random Forest, scaler or label encoder is missing
+    """
+    if models_dir is None:
+        version, models_dir = resolve_active_version()
+    models_dir = Path(models_dir)
+    
+    # The RF pipeline also carries the scaler and encoder; load it only once
+    rf_pipeline = None
+    rf_pipeline_path = models_dir / 'rf_pipeline.joblib'
+    if rf_pipeline_path.exists():
+        rf_pipeline = _load(rf_pipeline_path)
+    
+    # Random Forest
+    if rf_pipeline is not None:
+        rf_model = rf_pipeline['model']
+        model_path = rf_pipeline_path
+    else:
+        model_path = models_dir / 'best_model.joblib'
+        if not model_path.exists():
+            raise FileNotFoundError(
+                f"Trained model not found at {model_path}. "
+                "Please run 'python ml_engine/train_model.py' first."
+            )
+        rf_model = _load(model_path)
+    
+    # Scaler
+    scaler_path = models_dir / 'scaler.joblib'
+    if scaler_path.exists():
+        scaler = _load(scaler_path)
+    elif rf_pipeline is not None:
+        scaler = rf_pipeline['scaler']
+    else:
+        raise FileNotFoundError(
+            f"Scaler not found at {scaler_path}. "
+            "Please run 'python ml_engine/train_model.py' first."
+        )
+    
+    # Label encoder
+    encoder_path = models_dir / 'label_encoder.joblib'
+    if encoder_path.exists():
+        label_encoder = _load(encoder_path)
+    elif rf_pipeline is not None:
+        label_encoder = rf_pipeline['label_encoder']
+    else:
+        raise FileNotFoundError(
+            f"Label encoder not found at {encoder_path}. "
+            "Please run 'python ml_engine/train_model.py' first."
+        )
+    
+    # Naive Bayes (optional for single-model prediction)
+    nb_model = None
+    nb_pipeline_path = models_dir / 'nb_pipeline.joblib'
+    if nb_pipeline_path.exists():
+        nb_model = _load(nb_pipeline_path)['model']
+    
+    # Compiled forest (only trusted if it was compiled from this model file;
+    # otherwise rebuilt in memory from the loaded forest)
+    compiled_forest = None
+    compiled_path = models_dir / 'rf_compiled.joblib'
+    if compiled_path.exists():
+        arrays = _load(compiled_path)
+        if SOURCE_DIGEST_KEY in arrays and str(arrays[SOURCE_DIGEST_KEY]) == file_digest(model_path):
+            compiled_forest = CompiledForest.from_arrays(arrays)
+        elif hasattr(rf_model, 'estimators_'):
+            print(f"Rebuilding stale compiled forest at {compiled_path}")
+            compiled_forest = CompiledForest.from_sklearn(rf_model)
+        else:
+            print(f"Ignoring stale compiled forest at {compiled_path}")
+    
+    return ModelBundle(
+        version=version or _legacy_fingerprint(models_dir),
+        rf_model=rf_model,
+        nb_model=nb_model,
+        scaler=scaler,
+        label_encoder=label_encoder,
+        compiled_forest=compiled_forest,
+        explainer=_build_explainer(rf_model),
+        anomaly_detector=load_anomaly_detector(models_dir),
+    )
+
+
+def _load_in_background(version, models_dir):
+    """Load a new version off the request path and swap it in when ready."""
+    global _bundle, _loading_version
+    
+    try:
+        bundle = load_bundle(models_dir, version)
+    except Exception as e:
+        print(f"❌ Failed to load model version {version}: {e}")
+    else:
+        # A single reference assignment: readers see the old or the new bundle, never a mix
+        _bundle = bundle
+        print(f"✅ Swapped in model version {version}")
+    finally:
+        with _bundle_lock:
+            _loading_version = None
+
+
+def _check_for_new_version(bundle):
+    """Start a background load if a different version has been published."""
+    global _last_check, _loading_version
+    
+    now = time.monotonic()
+    if not RELOAD_CHECK_INTERVAL or now - _last_check < RELOAD_CHECK_INTERVAL:
+        return
+    _last_check = now
+    
+    version, models_dir = resolve_active_version()
+    if version == bundle.version:
+        return
+    
+    with _bundle_lock:
+        if _loading_version is not None:
+            return
+        _loading_version = version
+    
+    threading.Thread(
+        target=_load_in_background,
+        args=(version, models_dir),
+        daemon=True
+    ).start()
+
+
+def get_bundle():
+    """
+    Return the active ModelBundle, loading it on first use.
+    
+    Once loaded, the bundle keeps being served while a newly published
+    version loads in the background, so a retrain never blocks requests.
+    
+    Raises:
+        FileNotFoundError: If required artifacts are missing
+    """
+    global _bundle, _last_check
+    
+    bundle = _bundle
+    if bundle is not None:
+        _check_for_new_version(bundle)
+        return bundle
+    
+    with _bundle_lock:
+        if _bundle is None:
+            _bundle = load_bundle()
+            _last_check = time.monotonic()
+        return _bundle
+
+
+def get_active_version():
+    """Return the version of the loaded bundle (loading it if needed)."""
+    return get_bundle().version
+
+
+def get_anomaly_detector():
+    """
+    Return the active anomaly detector.
+    
+    Pre-ML checks run before any prediction, so they keep working with a
+    standalone detector while the crop models have not been trained yet.
+    """
+    global _fallback_detector
+    
+    try:
+        return get_bundle().anomaly_detector
+    except FileNotFoundError:
+        with _bundle_lock:
+            if _fallback_detector is None:
+                _fallback_detector = load_anomaly_detector(MODELS_DIR)
+            return _fallback_detector
+
+
+def reload():
+    """
+    Load the active version now and swap it in (blocking).
+    
+    Returns:
+        ModelBundle: The newly active bundle
+    """
+    global _bundle, _last_check
+    
+    version, models_dir = resolve_active_version()
+    bundle = load_bundle(models_dir, version)
+    _bundle = bundle
+    _last_check = time.monotonic()
+    return bundle
+
+
+def warm_up():
+    """
+    Eagerly load all artifacts (called from securecrop/wsgi.py).
+    
+    Missing artifacts are reported but never raised, so the server still
+    starts before the models have been trained.
+    
+    Returns:
+        ModelBundle, or None if the models are not available yet
+    """
+    try:
+        bundle = get_bundle()
+    except FileNotFoundError as e:
+        print(f"⚠️ ML models not preloaded: {e}")
+        get_anomaly_detector()
+        return None
+    
+    print(f"✅ ML models preloaded (version {bundle.version})")
+    return bundle
+
+
+def reset():
+    """Drop the loaded bundle so the next access reloads from disk."""
+    global _bundle, _last_check, _fallback_detector
+    
+    with _bundle_lock:
+        _bundle = None
+        _fallback_detector = None
+        _last_check = 0.0
@@ -2,203 +2,249 @@
 ML model inference services for crop prediction.
 
 This module provides:
-1. Model loading with caching (both RF and NB models)
+1. Model access through the shared model registry (both RF and NB models)
 2. Dual-model crop prediction from soil input
-3. Probability/confidence scoring
-4. Model agreement detection
+3. Batch crop prediction over whole feature matrices
+4. Probability/confidence scoring
+5. Model agreement detection
 """
 
-import os
 import numpy as np
-import joblib
-from pathlib import Path
+from . import registry
 
 
-# Cache for loaded models and components
-_rf_model_cache = None
-_nb_model_cache = None
-_scaler_cache = None
-_label_encoder_cache = None
-
-# Base directories
-BASE_DIR = Path(__file__).resolve().parent
-MODELS_DIR = BASE_DIR / 'models'
-
 # Feature names (must match training)
 FEATURE_NAMES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph']
 
 
 def load_model():
     """
-    Load the primary ML model (Random Forest) from disk with caching.
+    Return the primary ML model (Random Forest) from the model registry.
     
     Returns:
         Trained scikit-learn RandomForest model
     """
-    global _rf_model_cache
-    
-    if _rf_model_cache is not None:
-        return _rf_model_cache
-    
-    # Try loading the RF pipeline first
-    rf_pipeline_path = MODELS_DIR / 'rf_pipeline.joblib'
-    
-    if rf_pipeline_path.exists():
-        pipeline = joblib.load(rf_pipeline_path)
-        _rf_model_cache = pipeline['model']
-        return _rf_model_cache
-    
-    # Fallback to best_model.joblib
-    model_path = MODELS_DIR / 'best_model.joblib'
+    return registry.get_bundle().rf_model
+
+
+def load_compiled_model():
+    """
+    Return the flat array-backed Random Forest exported by train_model.py.
     
-    if not model_path.exists():
-        raise FileNotFoundError(
-            f"Trained model not found at {model_path}. "
-            "Please run 'python ml_engine/train_model.py' first."
-        )
+    Returns:
+        CompiledForest, or None if no compiled export exists (a stale
+        export is rebuilt from the loaded Random Forest)
+    """
+    return registry.get_bundle().compiled_forest
+
+
+def load_inference_model():
+    """
+    Return the fastest available Random Forest for scoring.
     
-    _rf_model_cache = joblib.load(model_path)
-    return _rf_model_cache
+    Prefers the compiled forest and falls back to the sklearn model.
+    Both expose classes_, predict and predict_proba with identical results.
+    """
+    bundle = registry.get_bundle()
+    return bundle.compiled_forest or bundle.rf_model
 
 
 def load_nb_model():
     """
-    Load the Naive Bayes model from disk with caching.
+    Return the Naive Bayes model from the model registry.
     
     Returns:
         Trained scikit-learn GaussianNB model
     """
-    global _nb_model_cache
-    
-    if _nb_model_cache is not None:
-        return _nb_model_cache
+    nb_model = registry.get_bundle().nb_model
     
-    nb_pipeline_path = MODELS_DIR / 'nb_pipeline.joblib'
-    
-    if not nb_pipeline_path.exists():
+    if nb_model is None:
         raise FileNotFoundError(
-            f"Naive Bayes model not found at {nb_pipeline_path}. "
+            f"Naive Bayes model not found at {registry.MODELS_DIR / 'nb_pipeline.joblib'}. "
             "Please run 'python ml_engine/train_model.py' first."
         )
     
-    pipeline = joblib.load(nb_pipeline_path)
-    _nb_model_cache = pipeline['model']
-    return _nb_model_cache
+    return nb_model
 
 
 def load_scaler():
     """
-    Load the feature scaler from disk with caching.
+    Return the feature scaler from the model registry.
     
     Returns:
         Fitted StandardScaler
     """
-    global _scaler_cache
-    
-    if _scaler_cache is not None:
-        return _scaler_cache
-    
-    # Try loading from scaler.joblib
-    scaler_path = MODELS_DIR / 'scaler.joblib'
-    
-    if scaler_path.exists():
-        _scaler_cache = joblib.load(scaler_path)
-        return _scaler_cache
-    
-    # Fallback: load from RF pipeline
-    rf_pipeline_path = MODELS_DIR / 'rf_pipeline.joblib'
-    
-    if rf_pipeline_path.exists():
-        pipeline = joblib.load(rf_pipeline_path)
-        _scaler_cache = pipeline['scaler']
-        return _scaler_cache
-    
-    raise FileNotFoundError(
-        f"Scaler not found at {scaler_path}. "
-        "Please run 'python ml_engine/train_model.py' first."
-    )
+    return registry.get_bundle().scaler
 
 
 def load_label_encoder():
     """
-    Load the label encoder from disk with caching.
+    Return the label encoder from the model registry.
     
     Returns:
         Fitted LabelEncoder
     """
-    global _label_encoder_cache
+    return registry.get_bundle().label_encoder
+
+
+def get_feature_names():
+    """Return the feature names used for training."""
+    return FEATURE_NAMES
+
+
+def get_active_model_version():
+    """Return the version identifier of the active model bundle."""
+    return registry.get_active_version()
+
+
+def get_class_names(model, bundle=None):
+    """
+    Return the crop name for each column of model.predict_proba.
     
-    if _label_encoder_cache is not None:
-        return _label_encoder_cache
+    Models are trained on encoded labels, so the label encoder's classes_
+    array is already the index -> name lookup; decoding is a plain NumPy
+    index instead of a LabelEncoder.inverse_transform call.
     
-    # Try loading from label_encoder.joblib
-    encoder_path = MODELS_DIR / 'label_encoder.joblib'
+    Args:
+        model: Trained classifier with a classes_ attribute
+        bundle: Optional ModelBundle (if None, the active bundle is used)
     
-    if encoder_path.exists():
-        _label_encoder_cache = joblib.load(encoder_path)
-        return _label_encoder_cache
+    Returns:
+        np.ndarray: Crop names aligned with model.classes_
+    """
+    bundle = bundle or registry.get_bundle()
+    return bundle.label_encoder.classes_[model.classes_]
+
+
+def score_features(model, features_scaled, bundle=None):
+    """
+    Score already-scaled features with a single predict_proba pass.
     
-    # Fallback: load from RF pipeline
-    rf_pipeline_path = MODELS_DIR / 'rf_pipeline.joblib'
+    The predicted class is the argmax of the probability vector, which is
+    exactly what model.predict computes internally, so callers no longer
+    need a separate predict call (and a second walk of every tree).
     
-    if rf_pipeline_path.exists():
-        pipeline = joblib.load(rf_pipeline_path)
-        _label_encoder_cache = pipeline['label_encoder']
-        return _label_encoder_cache
+    Args:
+        model: Trained classifier with predict_proba
+        features_scaled: 2-D array of scaled features
+        bundle: Optional ModelBundle used to decode labels
     
-    raise FileNotFoundError(
-        f"Label encoder not found at {encoder_path}. "
-        "Please run 'python ml_engine/train_model.py' first."
-    )
-
-
-def get_feature_names():
-    """Return the feature names used for training."""
-    return FEATURE_NAMES
+    Returns:
+        tuple: (class_indices, crop_names, probabilities, proba)
+            - class_indices: Column index of the predicted class per row
+            - crop_names: Predicted crop names (np.ndarray of str)
+            - probabilities: Confidence of the predicted class per row
+            - proba: Full (n_samples, n_classes) probability matrix
+    """
+    proba = model.predict_proba(features_scaled)
+    class_indices = np.argmax(proba, axis=1)
+    crop_names = get_class_names(model, bundle)[class_indices]
+    probabilities = proba[np.arange(proba.shape[0]), class_indices]
+    return class_indices, crop_names, probabilities, proba
 
 
-def predict_crop(soil_input, model=None):
+def predict_crop(soil_input, model=None, bundle=None):
     """
     Predict crop recommendation from soil input using Random Forest.
     
     Args:
         soil_input: SoilInput model instance with to_feature_array() method
-        model: Optional pre-loaded model (if None, will load from cache)
-        
+        model: Optional pre-loaded model (if None, will load from the registry)
+        bundle: Optional ModelBundle to predict with (default: active bundle)
+    
     Returns:
         tuple: (crop_name, probability)
             - crop_name: Predicted crop as string
             - probability: Confidence score (0-1)
     """
-    # Load model and scaler if not provided
-    if model is None:
-        model = load_model()
+    crop_names, probabilities = predict_crops_batch(
+        [soil_input.to_feature_array()], model=model, bundle=bundle
+    )
+    return crop_names[0], probabilities[0]
+
+
+def score_inputs(feature_rows, bundle=None, model=None):
+    """
+    Scale and score soil samples with the bundle's inference model.
     
-    scaler = load_scaler()
-    label_encoder = load_label_encoder()
+    Returns the intermediate results as well, so later steps (SHAP
+    explanations) can reuse the scaled features and predicted classes
+    instead of recomputing them.
     
-    # Extract features from soil input
-    features = soil_input.to_feature_array()
-    features_array = np.array(features).reshape(1, -1)
+    Args:
+        feature_rows: Sequence of feature arrays in SoilInput.to_feature_array()
+            order, or a 2-D NumPy array of shape (n_samples, 6)
+        bundle: Optional ModelBundle to predict with (default: active bundle)
+        model: Optional model with predict_proba (default: the compiled
+            forest when available, else the sklearn model)
+    
+    Returns:
+        dict: {
+            'features_scaled': np.ndarray (n_samples, 6),
+            'class_indices': np.ndarray of predicted class columns,
+            'crop_names': list of str,
+            'probabilities': list of float
+        }
+    """
+    features_array = np.asarray(feature_rows, dtype=float).reshape(-1, len(FEATURE_NAMES))
+    
+    # Use one bundle for every step so a hot-swap cannot mix versions
+    bundle = bundle or registry.get_bundle()
+    if model is None:
+        model = bundle.compiled_forest or bundle.rf_model
     
     # Standardize features
-    features_scaled = scaler.transform(features_array)
+    features_scaled = bundle.scaler.transform(features_array)
     
-    # Predict
-    prediction_encoded = model.predict(features_scaled)[0]
-    crop_name = label_encoder.inverse_transform([prediction_encoded])[0]
+    # Predict class and confidence from one probability pass
+    class_indices, crop_names, probabilities, _ = score_features(model, features_scaled, bundle)
     
-    # Get probability
-    if hasattr(model, 'predict_proba'):
-        proba = model.predict_proba(features_scaled)[0]
-        probability = float(np.max(proba))
-    else:
-        probability = 0.85  # Default for models without predict_proba
+    return {
+        'features_scaled': features_scaled,
+        'class_indices': class_indices,
+        'crop_names': crop_names.tolist(),
+        'probabilities': probabilities.astype(float).tolist(),
+    }
+
+
+def predict_crops_batch(feature_rows, model=None, bundle=None):
+    """
+    Predict crop recommendations for many soil samples in one pass.
+    
+    The whole matrix is scaled and scored with a single call to each of
+    scaler.transform and model.predict_proba, so the per-call overhead of
+    sklearn is paid once per batch instead of once per row.
     
-    return crop_name, probability
+    Args:
+        feature_rows: Sequence of feature arrays in SoilInput.to_feature_array()
+            order, or a 2-D NumPy array of shape (n_samples, 6)
+        model: Optional pre-loaded model (if None, the compiled forest is
+            used when available, else the sklearn model)
+        bundle: Optional ModelBundle to predict with (default: active bundle)
+    
+    Returns:
+        tuple: (crop_names, probabilities)
+            - crop_names: List of predicted crops as strings
+            - probabilities: List of confidence scores (0-1)
+    """
+    features_array = np.asarray(feature_rows, dtype=float).reshape(-1, len(FEATURE_NAMES))
+    
+    if features_array.shape[0] == 0:
+        return [], []
+    
+    # Use one bundle for every step so a hot-swap cannot mix versions
+    bundle = bundle or registry.get_bundle()
+    
+    if model is not None and not hasattr(model, 'predict_proba'):
+        predictions_encoded = model.predict(bundle.scaler.transform(features_array))
+        crop_names = bundle.label_encoder.inverse_transform(predictions_encoded).tolist()
+        return crop_names, [0.85] * len(crop_names)  # Default for models without predict_proba
+    
+    scores = score_inputs(features_array, bundle=bundle, model=model)
+    return scores['crop_names'], scores['probabilities']
 
 
-def predict_crop_dual(soil_input):
+def predict_crop_dual(soil_input, bundle=None):
     """
     Predict crop recommendation using BOTH Random Forest and Naive Bayes models.
     
@@ -206,9 +252,14 @@ def predict_crop_dual(soil_input):
     - Higher confidence when models agree
     - Alternative suggestions when models disagree
     
+    Each model is scored with one predict_proba call; the full probability
+    vectors are returned so XAI and post-ML checks can reuse them without
+    re-running the models.
+    
     Args:
         soil_input: SoilInput model instance
-        
+        bundle: Optional ModelBundle to predict with (default: active bundle)
+    
     Returns:
         dict: {
             'rf_prediction': str,
@@ -217,29 +268,36 @@ def predict_crop_dual(soil_input):
             'nb_probability': float,
             'models_agree': bool,
             'primary_recommendation': str,
-            'confidence': float
+            'confidence': float,
+            'rf_class_index': int,
+            'nb_class_index': int,
+            'rf_proba': np.ndarray (per-class probabilities, RF),
+            'nb_proba': np.ndarray (per-class probabilities, NB),
+            'class_names': np.ndarray (crop name per probability column),
+            'features_scaled': np.ndarray (1 x 6 scaled features),
+            'model_version': str
         }
     """
-    # Load all components
-    rf_model = load_model()
-    nb_model = load_nb_model()
-    scaler = load_scaler()
-    label_encoder = load_label_encoder()
+    # Load all components from one bundle
+    bundle = bundle or registry.get_bundle()
+    rf_model = bundle.compiled_forest or bundle.rf_model
+    nb_model = bundle.nb_model
+    if nb_model is None:
+        nb_model = load_nb_model()  # raises FileNotFoundError
     
     # Extract and scale features
     features = soil_input.to_feature_array()
-    features_array = np.array(features).reshape(1, -1)
-    features_scaled = scaler.transform(features_array)
+    features_array = np.array(features, dtype=float).reshape(1, -1)
+    features_scaled = bundle.scaler.transform(features_array)
     
-    # Random Forest prediction
-    rf_pred_encoded = rf_model.predict(features_scaled)[0]
-    rf_crop = label_encoder.inverse_transform([rf_pred_encoded])[0]
-    rf_proba = float(np.max(rf_model.predict_proba(features_scaled)[0]))
+    # Fused scoring: one probability pass per model
+    rf_idx, rf_names, rf_probs, rf_proba = score_features(rf_model, features_scaled, bundle)
+    nb_idx, nb_names, nb_probs, nb_proba = score_features(nb_model, features_scaled, bundle)
     
-    # Naive Bayes prediction
-    nb_pred_encoded = nb_model.predict(features_scaled)[0]
-    nb_crop = label_encoder.inverse_transform([nb_pred_encoded])[0]
-    nb_proba = float(np.max(nb_model.predict_proba(features_scaled)[0]))
+    rf_crop = str(rf_names[0])
+    rf_proba_max = float(rf_probs[0])
+    nb_crop = str(nb_names[0])
+    nb_proba_max = float(nb_probs[0])
     
     # Determine if models agree
     models_agree = rf_crop == nb_crop
@@ -247,22 +305,29 @@ def predict_crop_dual(soil_input):
     # Primary recommendation (use RF if agree, or the one with higher confidence)
     if models_agree:
         primary = rf_crop
-        confidence = max(rf_proba, nb_proba)
+        confidence = max(rf_proba_max, nb_proba_max)
     else:
         # Use the model with higher probability
-        if rf_proba >= nb_proba:
+        if rf_proba_max >= nb_proba_max:
             primary = rf_crop
-            confidence = rf_proba
+            confidence = rf_proba_max
         else:
             primary = nb_crop
-            confidence = nb_proba
+            confidence = nb_proba_max
     
     return {
         'rf_prediction': rf_crop,
-        'rf_probability': rf_proba,
+        'rf_probability': rf_proba_max,
         'nb_prediction': nb_crop,
-        'nb_probability': nb_proba,
+        'nb_probability': nb_proba_max,
         'models_agree': models_agree,
         'primary_recommendation': primary,
-        'confidence': confidence
+        'confidence': confidence,
+        'rf_class_index': int(rf_idx[0]),
+        'nb_class_index': int(nb_idx[0]),
+        'rf_proba': rf_proba[0],
+        'nb_proba': nb_proba[0],
+        'class_names': get_class_names(rf_model, bundle),
+        'features_scaled': features_scaled,
+        'model_version': bundle.version
     }
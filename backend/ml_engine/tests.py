@@ -1,3 +1,273 @@
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
 from django.test import TestCase
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.naive_bayes import GaussianNB
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from . import registry, services
+from .anomaly import fit_anomaly_detector
+from .compiled_forest import CompiledForest, file_digest
+
+
+def build_test_artifacts(models_dir, seed=0):
+    """Fit small RF/NB models on synthetic soil data and save them like train_model.py does."""
+    rng = np.random.RandomState(seed)
+    centers = {
+        'rice': [80, 45, 40, 6.5, 80, 24],
+        'maize': [75, 50, 20, 6.2, 60, 22],
+        'jute': [30, 20, 30, 7.2, 40, 30],
+    }
+    X = []
+    y = []
+    for crop, center in centers.items():
+        X.append(rng.normal(center, [5, 5, 5, 0.2, 5, 1], size=(60, 6)))
+        y.extend([crop] * 60)
+    X = np.vstack(X)
+    
+    label_encoder = LabelEncoder()
+    y_encoded = label_encoder.fit_transform(y)
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X)
+    
+    rf_model = RandomForestClassifier(n_estimators=15, random_state=42).fit(X_scaled, y_encoded)
+    nb_model = GaussianNB().fit(X_scaled, y_encoded)
+    
+    models_dir = Path(models_dir)
+    models_dir.mkdir(parents=True, exist_ok=True)
+    joblib.dump({'model': rf_model, 'scaler': scaler, 'label_encoder': label_encoder},
+                models_dir / 'rf_pipeline.joblib')
+    joblib.dump({'model': nb_model, 'scaler': scaler, 'label_encoder': label_encoder},
+                models_dir / 'nb_pipeline.joblib')
+    joblib.dump(scaler, models_dir / 'scaler.joblib')
+    joblib.dump(label_encoder, models_dir / 'label_encoder.joblib')
+    joblib.dump(CompiledForest.from_sklearn(rf_model).to_arrays(file_digest(models_dir / 'rf_pipeline.joblib')),
+                models_dir / 'rf_compiled.joblib')
+    joblib.dump(fit_anomaly_detector(X, n_estimators=20), models_dir / 'anomaly_detector.joblib')
+    return rf_model, nb_model, scaler, label_encoder
+
+
+def reset_model_caches():
+    """Drop loaded models so the next call reloads from MODELS_DIR."""
+    registry.reset()
+
+
+class TrainedModelsMixin:
+    """Point the model registry at freshly trained test artifacts."""
+    
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._models_tmpdir = tempfile.mkdtemp()
+        cls._original_models_dir = registry.MODELS_DIR
+        registry.MODELS_DIR = Path(cls._models_tmpdir)
+        cls.rf_model, cls.nb_model, cls.scaler, cls.label_encoder = build_test_artifacts(cls._models_tmpdir)
+        reset_model_caches()
+    
+    @classmethod
+    def tearDownClass(cls):
+        registry.MODELS_DIR = cls._original_models_dir
+        reset_model_caches()
+        shutil.rmtree(cls._models_tmpdir, ignore_errors=True)
+        super().tearDownClass()
+
+
+class _SoilSample:
+    def __init__(self, features):
+        self.features = features
+        self.integrity_hash = None
+        self.N_level, self.P_level, self.K_level, self.ph, self.moisture, self.temperature = features
+    
+    def to_feature_array(self):
+        return list(self.features)
+
+
+class BatchPredictionTest(TrainedModelsMixin, TestCase):
+    """Test cases for vectorized batch inference."""
+    
+    def setUp(self):
+        self.rows = [
+            [80, 45, 40, 6.5, 80, 24],
+            [75, 50, 20, 6.2, 60, 22],
+            [30, 20, 30, 7.2, 40, 30],
+            [60, 35, 30, 6.8, 55, 26],
+        ]
+    
+    def test_batch_matches_single_predictions(self):
+        """Batch predictions match predict_crop row by row."""
+        crop_names, probabilities = services.predict_crops_batch(self.rows)
+        self.assertEqual(len(crop_names), len(self.rows))
+        for row, crop_name, probability in zip(self.rows, crop_names, probabilities):
+            single_crop, single_probability = services.predict_crop(_SoilSample(row))
+            self.assertEqual(crop_name, single_crop)
+            self.assertAlmostEqual(probability, single_probability)
+    
+    def test_batch_predicts_expected_crops(self):
+        """Rows at the class centers are predicted as that class."""
+        crop_names, _ = services.predict_crops_batch(self.rows[:3])
+        self.assertEqual(crop_names, ['rice', 'maize', 'jute'])
+    
+    def test_empty_batch(self):
+        """An empty batch returns empty results."""
+        self.assertEqual(services.predict_crops_batch([]), ([], []))
+
+
+class FusedScoringTest(TrainedModelsMixin, TestCase):
+    """Test cases for single-pass predict_proba scoring."""
+    
+    def test_score_features_matches_predict(self):
+        """Argmax of predict_proba decodes to the same crops as model.predict."""
+        X = self.scaler.transform(np.random.RandomState(1).normal(50, 30, size=(40, 6)))
+        for model in (self.rf_model, self.nb_model):
+            _, crop_names, probabilities, proba = services.score_features(model, X)
+            expected = self.label_encoder.inverse_transform(model.predict(X))
+            np.testing.assert_array_equal(crop_names, expected)
+            np.testing.assert_array_equal(probabilities, proba.max(axis=1))
+    
+    def test_predict_crop_dual_returns_probability_vectors(self):
+        """Dual prediction exposes full per-class probability vectors."""
+        result = services.predict_crop_dual(_SoilSample([80, 45, 40, 6.5, 80, 24]))
+        self.assertEqual(result['rf_prediction'], 'rice')
+        self.assertEqual(len(result['rf_proba']), len(result['class_names']))
+        self.assertEqual(len(result['nb_proba']), len(result['class_names']))
+        self.assertAlmostEqual(result['rf_probability'], float(result['rf_proba'].max()))
+        self.assertEqual(result['class_names'][result['rf_class_index']], result['rf_prediction'])
+
+
+class CompiledForestTest(TrainedModelsMixin, TestCase):
+    """Test cases for the flat array-backed Random Forest."""
+    
+    def test_predict_proba_matches_sklearn_exactly(self):
+        """Compiled probabilities are bit-for-bit identical to sklearn."""
+        compiled = CompiledForest.from_sklearn(self.rf_model)
+        X = self.scaler.transform(np.random.RandomState(2).normal(50, 30, size=(200, 6)))
+        np.testing.assert_array_equal(compiled.predict_proba(X), self.rf_model.predict_proba(X))
+        np.testing.assert_array_equal(compiled.predict(X), self.rf_model.predict(X))
+    
+    def test_round_trip_through_arrays(self):
+        """Exported arrays rebuild an equivalent forest."""
+        compiled = CompiledForest.from_sklearn(self.rf_model)
+        rebuilt = CompiledForest.from_arrays(compiled.to_arrays())
+        X = self.scaler.transform(np.random.RandomState(3).normal(50, 30, size=(20, 6)))
+        np.testing.assert_array_equal(rebuilt.predict_proba(X), compiled.predict_proba(X))
+    
+    def test_services_use_compiled_forest(self):
+        """The inference path loads the compiled export when present."""
+        self.assertIsInstance(services.load_inference_model(), CompiledForest)
+
+
+class ModelRegistryTest(TrainedModelsMixin, TestCase):
+    """Test cases for the shared model registry."""
+    
+    def test_bundle_loaded_once(self):
+        """Every accessor returns artifacts from the same bundle."""
+        bundle = registry.get_bundle()
+        self.assertIs(registry.get_bundle(), bundle)
+        self.assertIs(services.load_model(), bundle.rf_model)
+        self.assertIs(services.load_nb_model(), bundle.nb_model)
+        self.assertIs(services.load_scaler(), bundle.scaler)
+        self.assertIs(services.load_label_encoder(), bundle.label_encoder)
+    
+    def test_compiled_forest_is_memory_mapped(self):
+        """Compiled forest node arrays are backed by the file on disk."""
+        compiled = registry.get_bundle().compiled_forest
+        self.assertIsInstance(compiled.value, np.memmap)
+    
+    def test_stale_compiled_forest_rebuilt(self):
+        """A compiled export from another model file is rebuilt, even with matching shape and classes."""
+        with tempfile.TemporaryDirectory() as models_dir, tempfile.TemporaryDirectory() as retrained_dir:
+            build_test_artifacts(models_dir)
+            retrained = build_test_artifacts(retrained_dir, seed=1)[0]
+            shutil.copy(Path(retrained_dir) / 'rf_pipeline.joblib', Path(models_dir) / 'rf_pipeline.joblib')
+            bundle = registry.load_bundle(models_dir, 'retrained')
+        
+        X = self.scaler.transform(np.random.RandomState(4).normal(50, 30, size=(50, 6)))
+        self.assertNotIsInstance(bundle.compiled_forest.value, np.memmap)
+        np.testing.assert_array_equal(bundle.compiled_forest.predict_proba(X), retrained.predict_proba(X))
+    
+    def test_warm_up_without_models(self):
+        """Warm-up reports missing artifacts instead of raising."""
+        registry.MODELS_DIR = Path(self._models_tmpdir) / 'missing'
+        try:
+            registry.reset()
+            self.assertIsNone(registry.warm_up())
+        finally:
+            registry.MODELS_DIR = Path(self._models_tmpdir)
+            reset_model_caches()
+
 
-# Create your tests here.
+class ModelVersioningTest(TrainedModelsMixin, TestCase):
+    """Test cases for versioned artifacts and hot-swapping."""
+    
+    def setUp(self):
+        self._original_interval = registry.RELOAD_CHECK_INTERVAL
+        self.versioned_dir = Path(tempfile.mkdtemp())
+        registry.MODELS_DIR = self.versioned_dir
+        reset_model_caches()
+    
+    def tearDown(self):
+        registry.RELOAD_CHECK_INTERVAL = self._original_interval
+        registry.MODELS_DIR = Path(self._models_tmpdir)
+        reset_model_caches()
+        shutil.rmtree(self.versioned_dir, ignore_errors=True)
+    
+    def publish(self, seed):
+        staging_dir = registry.create_staging_dir(self.versioned_dir)
+        build_test_artifacts(staging_dir, seed=seed)
+        return registry.publish_version(staging_dir, self.versioned_dir)
+    
+    def test_publish_switches_current_pointer(self):
+        """Publishing writes versions/<version>/ and points CURRENT at it."""
+        version = self.publish(seed=1)
+        active_version, artifacts_dir = registry.resolve_active_version(self.versioned_dir)
+        self.assertEqual(active_version, version)
+        self.assertTrue((artifacts_dir / 'rf_pipeline.joblib').exists())
+        self.assertEqual(registry.get_active_version(), version)
+        
+        # Identical artifacts publish to the same version
+        self.assertEqual(self.publish(seed=1), version)
+    
+    def test_old_versions_pruned(self):
+        """Only the most recent versions are kept on disk."""
+        versions = [self.publish(seed=seed) for seed in range(registry.KEEP_VERSIONS + 2)]
+        kept = sorted(p.name for p in (self.versioned_dir / registry.VERSIONS_DIRNAME).iterdir())
+        self.assertEqual(len(kept), registry.KEEP_VERSIONS)
+        self.assertIn(versions[-1], kept)
+    
+    def test_reload_swaps_bundle(self):
+        """reload() makes a newly published version active."""
+        first = self.publish(seed=1)
+        self.assertEqual(registry.get_bundle().version, first)
+        
+        second = self.publish(seed=2)
+        self.assertNotEqual(first, second)
+        self.assertEqual(registry.reload().version, second)
+        self.assertEqual(services.get_active_model_version(), second)
+    
+    def test_background_hot_swap(self):
+        """A published version is picked up without blocking requests."""
+        first = self.publish(seed=1)
+        old_bundle = registry.get_bundle()
+        second = self.publish(seed=2)
+        
+        registry.RELOAD_CHECK_INTERVAL = 0.001
+        time.sleep(0.01)
+        # The old bundle keeps serving while the new one loads
+        self.assertIs(registry.get_bundle(), old_bundle)
+        
+        deadline = time.monotonic() + 10
+        while registry.get_bundle().version != second and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(registry.get_bundle().version, second)
+        self.assertEqual(old_bundle.version, first)
+    
+    def test_prediction_reports_model_version(self):
+        """Dual prediction records the version that produced it."""
+        version = self.publish(seed=1)
+        result = services.predict_crop_dual(_SoilSample([80, 45, 40, 6.5, 80, 24]))
+        self.assertEqual(result['model_version'], version)
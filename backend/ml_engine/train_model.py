@@ -6,6 +6,9 @@ This script:
 2. Trains 9 models for comparison (including RandomForest and NaiveBayes)
 3. Performs GridSearchCV hyperparameter tuning for the top 2 models
 4. Saves the optimized models, scaler, and label encoder for production use
+5. Compiles the tuned Random Forest into flat NumPy arrays for fast inference
+6. Fits the IsolationForest anomaly detector (pre-ML checks) on the blended data
+7. Publishes everything as a new model version that running servers hot-swap to
 
 Based on the user's notebook: "Decision tree for getting optimal crop based on soil nutrition parameters"
 """
@@ -42,6 +45,14 @@ BASE_DIR = Path(__file__).resolve().parent
 DATA_DIR = BASE_DIR / 'data'
 MODELS_DIR = BASE_DIR / 'models'
 
+# Allow "python ml_engine/train_model.py" to import sibling ml_engine modules
+if str(BASE_DIR.parent) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR.parent))
+
+from ml_engine.anomaly import fit_anomaly_detector, training_matrix, DETECTOR_FEATURES
+from ml_engine.compiled_forest import CompiledForest, file_digest
+from ml_engine.registry import create_staging_dir, publish_version
+
 # Ensure models directory exists
 MODELS_DIR.mkdir(exist_ok=True)
 
@@ -290,13 +301,38 @@ def tune_naive_bayes(X_train, y_train):
     return grid_search.best_estimator_
 
 
-def save_models(rf_model, nb_model, scaler, label_encoder):
-    """Save trained models and components."""
+def train_anomaly_detector(df):
+    """Fit the IsolationForest used by the pre-ML security checks."""
+    
+    print("\n" + "=" * 60)
+    print("STEP 5b: Training Anomaly Detector")
+    print("=" * 60)
+    
+    X = training_matrix(df)
+    detector = fit_anomaly_detector(X)
+    flagged = (detector.predict(X) == -1).mean()
+    
+    print(f"✅ IsolationForest fitted on {X.shape[0]} samples ({', '.join(DETECTOR_FEATURES)})")
+    print(f"✅ Flagged {flagged:.1%} of training samples as anomalous")
+    
+    return detector
+
+
+def save_models(rf_model, nb_model, scaler, label_encoder, anomaly_detector=None):
+    """
+    Save trained models and components as a new model version.
+    
+    Artifacts are written to a staging directory first and then published
+    atomically (see ml_engine.registry.publish_version), so running servers
+    never observe a half-written version and hot-swap to it on their own.
+    """
     
     print("\n" + "=" * 60)
     print("STEP 6: Saving Models")
     print("=" * 60)
     
+    staging_dir = create_staging_dir(MODELS_DIR)
+    
     # Save Random Forest pipeline
     rf_pipeline = {
         'model': rf_model,
@@ -304,7 +340,7 @@ def save_models(rf_model, nb_model, scaler, label_encoder):
         'label_encoder': label_encoder,
         'features': TRAINING_FEATURES
     }
-    rf_path = MODELS_DIR / 'rf_pipeline.joblib'
+    rf_path = staging_dir / 'rf_pipeline.joblib'
     joblib.dump(rf_pipeline, rf_path)
     print(f"✅ Saved Random Forest: {rf_path}")
     
@@ -315,29 +351,47 @@ def save_models(rf_model, nb_model, scaler, label_encoder):
         'label_encoder': label_encoder,
         'features': TRAINING_FEATURES
     }
-    nb_path = MODELS_DIR / 'nb_pipeline.joblib'
+    nb_path = staging_dir / 'nb_pipeline.joblib'
     joblib.dump(nb_pipeline, nb_path)
     print(f"✅ Saved Naive Bayes: {nb_path}")
     
     # Save best model (Random Forest) for backward compatibility
-    best_model_path = MODELS_DIR / 'best_model.joblib'
+    best_model_path = staging_dir / 'best_model.joblib'
     joblib.dump(rf_model, best_model_path)
     print(f"✅ Saved Best Model: {best_model_path}")
     
     # Save scaler separately
-    scaler_path = MODELS_DIR / 'scaler.joblib'
+    scaler_path = staging_dir / 'scaler.joblib'
     joblib.dump(scaler, scaler_path)
     print(f"✅ Saved Scaler: {scaler_path}")
     
     # Save label encoder
-    encoder_path = MODELS_DIR / 'label_encoder.joblib'
+    encoder_path = staging_dir / 'label_encoder.joblib'
     joblib.dump(label_encoder, encoder_path)
     print(f"✅ Saved Label Encoder: {encoder_path}")
     
     # Save feature list
-    features_path = MODELS_DIR / 'input_features.joblib'
+    features_path = staging_dir / 'input_features.joblib'
     joblib.dump(TRAINING_FEATURES, features_path)
     print(f"✅ Saved Feature List: {features_path}")
+    
+    # Save compiled Random Forest (flat node arrays for fast inference)
+    compiled = CompiledForest.from_sklearn(rf_model)
+    compiled_path = staging_dir / 'rf_compiled.joblib'
+    joblib.dump(compiled.to_arrays(source_digest=file_digest(rf_path)), compiled_path)
+    print(f"✅ Saved Compiled Forest: {compiled_path} ({len(compiled.feature)} nodes)")
+    
+    # Save anomaly detector (pre-ML checks)
+    if anomaly_detector is not None:
+        detector_path = staging_dir / 'anomaly_detector.joblib'
+        joblib.dump(anomaly_detector, detector_path)
+        print(f"✅ Saved Anomaly Detector: {detector_path}")
+    
+    # Publish the version (atomic pointer switch)
+    version = publish_version(staging_dir, MODELS_DIR)
+    print(f"✅ Published model version {version}")
+    
+    return version
 
 
 def test_predictions(rf_model, nb_model, scaler, label_encoder):
@@ -396,17 +450,20 @@ def main():
         # Step 5: Tune Naive Bayes
         best_nb = tune_naive_bayes(X_train, y_train)
         
+        # Step 5b: Train anomaly detector on the blended data
+        anomaly_detector = train_anomaly_detector(df)
+        
         # Step 6: Save models
-        save_models(best_rf, best_nb, scaler, label_encoder)
+        save_models(best_rf, best_nb, scaler, label_encoder, anomaly_detector)
         
         # Step 7: Test predictions
         test_predictions(best_rf, best_nb, scaler, label_encoder)
         
         print("\n" + "=" * 60)
         print("  TRAINING COMPLETE!")
-        print("  Models saved to:", MODELS_DIR)
+        print("  Models saved to:", MODELS_DIR / 'versions')
         print("=" * 60 + "\n")
-        
+    
     except Exception as e:
         print(f"\n❌ Error during training: {e}")
         import traceback
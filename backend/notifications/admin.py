@@ -1,14 +1,14 @@
 from django.contrib import admin
-from .models import WeatherAlertNotification, EmailLog
+from .models import WeatherAlertNotification, EmailLog, CellAlertState
 
 
 @admin.register(WeatherAlertNotification)
 class WeatherAlertNotificationAdmin(admin.ModelAdmin):
-    list_display = ['title', 'alert_type', 'severity', 'created_by', 'emails_sent_count', 'created_at', 'is_active']
+    list_display = ['title', 'alert_type', 'severity', 'created_by', 'emails_sent_count', 'emails_failed_count', 'created_at', 'is_active']
     list_filter = ['alert_type', 'severity', 'is_active', 'created_at']
     search_fields = ['title', 'message', 'created_by__username']
     date_hierarchy = 'created_at'
-    readonly_fields = ['emails_sent_count', 'created_at']
+    readonly_fields = ['emails_sent_count', 'emails_failed_count', 'completed_at', 'created_at']
     
     fieldsets = (
         ('Alert Content', {
@@ -18,7 +18,7 @@ class WeatherAlertNotificationAdmin(admin.ModelAdmin):
             'fields': ('target_all_users', 'target_users')
         }),
         ('Status', {
-            'fields': ('is_active', 'expires_at', 'emails_sent_count', 'created_at', 'created_by')
+            'fields': ('is_active', 'expires_at', 'emails_sent_count', 'emails_failed_count', 'completed_at', 'created_at', 'created_by')
         }),
     )
     filter_horizontal = ('target_users',)
@@ -30,4 +30,11 @@ class EmailLogAdmin(admin.ModelAdmin):
     list_filter = ['status', 'created_at']
     search_fields = ['recipient_email', 'alert__title']
     date_hierarchy = 'created_at'
-    readonly_fields = ['alert', 'recipient', 'recipient_email', 'status', 'error_message', 'sent_at', 'created_at']
+    readonly_fields = ['alert', 'recipient', 'recipient_email', 'status', 'error_message', 'sent_at', 'created_at', 'attempts', 'lease_expires_at']
+
+
+@admin.register(CellAlertState)
+class CellAlertStateAdmin(admin.ModelAdmin):
+    list_display = ['cell_lat', 'cell_lon', 'signature', 'checked_at', 'changed_at', 'last_notification']
+    list_filter = ['changed_at']
+    readonly_fields = ['cell_lat', 'cell_lon', 'signature', 'alerts', 'last_notification', 'checked_at', 'changed_at']
@@ -0,0 +1,142 @@
+"""
+Scheduled, edge-triggered weather alert digest.
+
+Instead of an admin broadcasting to every farmer, run_alert_digest()
+(the run_alert_digest management command, scheduled e.g. every 30
+minutes) does:
+1. Reduce the alert recipients to their populated weather cells
+2. Fetch current weather once per cell through the shared weather cache
+3. Evaluate the alert rules for all cells in one weather.rules call
+4. Compare each cell's alert set with its stored CellAlertState and
+   queue emails only for the farmers of cells whose alert set changed
+   to a non-empty one (edge-triggered: a persisting alert is sent once)
+
+Upstream calls per run are bounded by the number of cells, and emails by
+the number of state changes. Cells whose weather could not be fetched
+keep their previous state. Run one scheduler at a time, so a change is
+not sent twice.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+
+from weather import rules
+from weather.client import cell_key, get_current_weather_many
+from .models import CellAlertState, WeatherAlertNotification
+from .services import alert_recipients, queue_weather_alert
+
+
+# Notification severity for the most severe rule engine alert of a digest
+SEVERITY_BY_LEVEL = {'low': 'info', 'medium': 'warning', 'high': 'danger', 'critical': 'critical'}
+LEVEL_ORDER = ['low', 'medium', 'high', 'critical']
+
+# Recipient ids per query when queuing emails
+QUEUE_CHUNK_SIZE = 500
+
+
+def populated_cells():
+    """
+    Group alert recipients by weather cell.
+    
+    Returns:
+        dict: cell_key -> list of user ids
+    """
+    cells = {}
+    recipients = alert_recipients().values_list('id', 'location_lat', 'location_lon')
+    for user_id, lat, lon in recipients.iterator():
+        cells.setdefault(cell_key(lat, lon), []).append(user_id)
+    return cells
+
+
+def alert_signature(alerts):
+    """Order-independent key of an alert set (types and severities)."""
+    return sorted({f"{alert['type']}:{alert['severity']}" for alert in alerts})
+
+
+def _queue_changed_cells(changed, user_ids_by_cell):
+    """Create one notification for the changed cells and queue their farmers."""
+    levels = [alert['severity'] for alerts in changed.values() for alert in alerts]
+    worst = max(levels, key=LEVEL_ORDER.index)
+    types = sorted({alert['title'] for alerts in changed.values() for alert in alerts})
+    
+    notification = WeatherAlertNotification.objects.create(
+        title='Scheduled Weather Alert',
+        message=f"Alert conditions changed in {len(changed)} area(s): {', '.join(types)}",
+        alert_type='general',
+        severity=SEVERITY_BY_LEVEL[worst],
+        created_by=None,
+        target_all_users=False
+    )
+    
+    user_ids = [user_id for cell in changed for user_id in user_ids_by_cell[cell]]
+    queued = 0
+    for start in range(0, len(user_ids), QUEUE_CHUNK_SIZE):
+        users = alert_recipients().filter(id__in=user_ids[start:start + QUEUE_CHUNK_SIZE]).only('id', 'email')
+        queued += queue_weather_alert(notification, users)
+    return notification, queued
+
+
+def run_alert_digest():
+    """
+    Evaluate alerts for every populated cell and notify the changed ones.
+    
+    Returns:
+        dict: cells, unavailable (weather not fetched), changed, notified
+            (cells emailed), queued (emails) and alert_id (or None)
+    """
+    user_ids_by_cell = populated_cells()
+    cells = list(user_ids_by_cell)
+    summary = {'cells': len(cells), 'unavailable': 0, 'changed': 0, 'notified': 0, 'queued': 0, 'alert_id': None}
+    if not cells:
+        return summary
+    
+    payloads = get_current_weather_many(cells)
+    alerts_by_cell = rules.alerts(rules.from_payloads([payloads.get(cell) for cell in cells]))
+    
+    now = timezone.now()
+    states = {(state.cell_lat, state.cell_lon): state for state in CellAlertState.objects.all()}
+    new_states, checked_states, to_notify = [], [], {}
+    for cell, alerts in zip(cells, alerts_by_cell):
+        if payloads.get(cell) is None:
+            summary['unavailable'] += 1
+            continue
+        
+        signature = alert_signature(alerts)
+        state = states.get(cell)
+        if state is None:
+            state = CellAlertState(cell_lat=cell[0], cell_lon=cell[1], changed_at=now)
+            new_states.append(state)
+        elif state.signature != signature:
+            state.changed_at = now
+            checked_states.append(state)
+        else:
+            state.checked_at = now
+            checked_states.append(state)
+            continue
+        
+        summary['changed'] += 1
+        state.signature = signature
+        state.alerts = alerts
+        state.checked_at = now
+        if alerts:
+            to_notify[cell] = alerts
+    
+    with transaction.atomic():
+        if to_notify:
+            notification, summary['queued'] = _queue_changed_cells(to_notify, user_ids_by_cell)
+            summary['notified'] = len(to_notify)
+            summary['alert_id'] = notification.id
+            for state in new_states + checked_states:
+                if (state.cell_lat, state.cell_lon) in to_notify:
+                    state.last_notification = notification
+        
+        CellAlertState.objects.bulk_create(new_states, batch_size=500)
+        CellAlertState.objects.bulk_update(
+            checked_states,
+            ['signature', 'alerts', 'checked_at', 'changed_at', 'last_notification'],
+            batch_size=500
+        )
+    
+    print(f"🛰️ Alert digest: {summary['cells']} cells, {summary['changed']} changed, "
+          f"{summary['queued']} emails queued")
+    return summary
@@ -0,0 +1,385 @@
+"""
+Durable, parallel dispatcher for bulk weather alert emails.
+
+Queued alerts are stored as pending EmailLog rows (see
+services.queue_weather_alert), so no work is lost when a gunicorn worker
+is recycled. The dispatcher:
+
+1. Claims a batch of pending rows (SELECT ... FOR UPDATE SKIP LOCKED
+   where supported) and marks them 'sending' with a lease and a claim
+   token. The UPDATE re-checks that each row is still claimable, and only
+   rows carrying this dispatcher's token are sent, so two dispatchers
+   never send the same email (SQLite ignores SKIP LOCKED). Rows whose
+   lease expired, because the process sending them died, are claimed
+   again.
+2. Fetches weather once per location cell of the batch (concurrently,
+   through the shared weather cache) and renders the email once per
+   distinct content (location cell and alert set), with the username
+   left as a Brevo template parameter.
+3. Sends each content group through Brevo's messageVersions API, up to
+   ALERT_MAIL_CHUNK_SIZE recipients per call, on a bounded thread pool
+   throttled by a process-wide rate limiter (calls per second). If Brevo
+   rejects a chunk (e.g. one invalid address) its recipients are retried
+   one by one. Pool threads only make HTTP calls; all database writes
+   happen on the dispatcher thread.
+4. Stores the batch's outcomes with one bulk_update and adds them to the
+   alert's emails_sent_count/emails_failed_count with F() expressions,
+   so progress is visible while a broadcast is running.
+
+Failed sends are retried up to ALERT_MAIL_MAX_ATTEMPTS times before the
+row is marked 'failed'.
+
+The dispatcher runs on a background thread of the web worker (started
+after the queuing transaction commits and again when a worker boots, see
+gunicorn.conf.py). `manage.py send_pending_alerts` drains the queue from
+the command line. With ALERT_MAIL_ASYNC=False (the test runner) queued
+alerts are sent inline.
+"""
+
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import EmailLog, WeatherAlertNotification
+from .services import (
+    BrevoAPIError,
+    get_weather_alerts_for_locations,
+    get_weather_for_users,
+    render_weather_email_template,
+    send_weather_email_batch,
+    weather_email_subject
+)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class RateLimiter:
+    """
+    Token bucket shared by all sending threads of the process.
+    
+    Attributes:
+        rate: Tokens added per second (Brevo calls per second)
+        burst: Maximum tokens that can accumulate
+    """
+    
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def _get_rate_limiter():
+    global _rate_limiter
+    
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter(_setting('ALERT_MAIL_RATE', 10))
+        return _rate_limiter
+
+
+def _claimable(now):
+    return Q(status='pending') | Q(status='sending', lease_expires_at__lt=now)
+
+
+def _claimable_ids(now, batch_size, alert_id=None):
+    queryset = EmailLog.objects.select_for_update(skip_locked=True).filter(_claimable(now))
+    if alert_id is not None:
+        queryset = queryset.filter(alert_id=alert_id)
+    return list(queryset.order_by('id').values_list('id', flat=True)[:batch_size])
+
+
+def claim_batch(batch_size, alert_id=None):
+    """
+    Claim up to batch_size queued emails for this process.
+    
+    Args:
+        batch_size: Maximum rows to claim
+        alert_id: Only claim emails of this alert
+    
+    Returns:
+        list: Claimed EmailLog rows (status 'sending'), with recipients
+    """
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    with transaction.atomic():
+        ids = _claimable_ids(now, batch_size, alert_id)
+        if not ids:
+            return []
+        # Rows another dispatcher claimed since they were read are no longer claimable
+        EmailLog.objects.filter(_claimable(now), id__in=ids).update(
+            status='sending',
+            lease_expires_at=now + timedelta(seconds=_setting('ALERT_MAIL_LEASE', 300)),
+            attempts=F('attempts') + 1,
+            claim_token=token
+        )
+    return list(EmailLog.objects.filter(id__in=ids, claim_token=token).select_related('recipient'))
+
+
+# Marker for emails not attempted because the dispatcher is stopping
+_STOPPED = object()
+
+# Brevo statuses for a rejected recipient or payload; other errors (e.g. 401/403
+# for a bad API key) would fail every recipient alike, so the chunk is not split
+SPLIT_STATUSES = {400, 422}
+
+
+def _group_by_content(logs, weather_by_user, templates):
+    """
+    Group a batch by email content (one rendering per location cell and alert set).
+    
+    Alerts for the whole batch are evaluated in one rule engine call.
+    
+    Args:
+        logs: Claimed EmailLog rows
+        weather_by_user: user id -> weather data
+        templates: Rendered (subject, html) per content key, reused across batches
+    
+    Returns:
+        tuple: (groups, errors)
+            - groups: list of (subject, html_template, logs)
+            - errors: log id -> error for emails that cannot be sent
+    """
+    groups = {}
+    errors = {}
+    located = []
+    for log in logs:
+        user = log.recipient
+        if user.location_lat is None or user.location_lon is None:
+            errors[log.id] = 'Recipient has no location set'
+        else:
+            located.append(log)
+    
+    weather_list = [weather_by_user.get(log.recipient.id) for log in located]
+    for log, weather_data, alerts in zip(located, weather_list, get_weather_alerts_for_locations(weather_list)):
+        key = json.dumps([weather_data, alerts], sort_keys=True)
+        if key not in templates:
+            templates[key] = (weather_email_subject(weather_data), render_weather_email_template(weather_data, alerts))
+        groups.setdefault(key, []).append(log)
+    
+    return [templates[key] + (group,) for key, group in groups.items()], errors
+
+
+def _send_chunk(subject, html_template, chunk, stop_event):
+    """
+    Send one Brevo batch request from a pool thread.
+    
+    Returns:
+        list: Error message (or None, or _STOPPED) per log in chunk
+    """
+    if stop_event is not None and stop_event.is_set():
+        return [_STOPPED] * len(chunk)
+    
+    _get_rate_limiter().acquire()
+    try:
+        send_weather_email_batch([log.recipient for log in chunk], subject, html_template)
+        return [None] * len(chunk)
+    except BrevoAPIError as e:
+        if len(chunk) == 1 or e.status_code not in SPLIT_STATUSES:
+            return [str(e)] * len(chunk)
+        # One invalid address rejects the whole request; find it by sending individually
+        return [error for log in chunk for error in _send_chunk(subject, html_template, [log], stop_event)]
+    except Exception as e:
+        return [str(e) or e.__class__.__name__] * len(chunk)
+
+
+def _record_results(logs, errors):
+    """Store the outcomes of a batch and update the alerts' counters."""
+    now = timezone.now()
+    max_attempts = _setting('ALERT_MAIL_MAX_ATTEMPTS', 3)
+    counts = {}
+    
+    for log, error in zip(logs, errors):
+        sent, failed = counts.get(log.alert_id, (0, 0))
+        log.lease_expires_at = None
+        if error is None:
+            log.status = 'sent'
+            log.sent_at = now
+            log.error_message = ''
+            sent += 1
+        elif error is _STOPPED:
+            # Not attempted; hand the email back to the queue
+            log.status = 'pending'
+            log.attempts -= 1
+        elif log.attempts < max_attempts:
+            print(f"⚠️ Weather alert to {log.recipient_email} failed (attempt {log.attempts}), will retry: {error}")
+            log.status = 'pending'
+            log.error_message = error
+        else:
+            print(f"❌ Error sending weather alert to {log.recipient_email}: {error}")
+            log.status = 'failed'
+            log.error_message = error
+            failed += 1
+        counts[log.alert_id] = (sent, failed)
+    
+    with transaction.atomic():
+        EmailLog.objects.bulk_update(logs, ['status', 'sent_at', 'error_message', 'attempts', 'lease_expires_at'])
+        for alert_id, (sent, failed) in counts.items():
+            if sent or failed:
+                WeatherAlertNotification.objects.filter(id=alert_id).update(
+                    emails_sent_count=F('emails_sent_count') + sent,
+                    emails_failed_count=F('emails_failed_count') + failed
+                )
+    
+    # Mark alerts with nothing left to send as completed
+    done = [
+        alert_id for alert_id in counts
+        if not EmailLog.objects.filter(alert_id=alert_id, status__in=['pending', 'sending']).exists()
+    ]
+    WeatherAlertNotification.objects.filter(id__in=done, completed_at__isnull=True).update(completed_at=now)
+    
+    return counts
+
+
+def process_pending(alert_id=None, stop_event=None):
+    """
+    Send queued alert emails until the queue is empty.
+    
+    Args:
+        alert_id: Only send emails of this alert
+        stop_event: threading.Event; when set, no further emails are
+            started and unsent claimed emails are returned to the queue
+    
+    Returns:
+        dict: Number of emails 'sent' and 'failed' (retries not counted)
+    """
+    totals = {'sent': 0, 'failed': 0}
+    batch_size = _setting('ALERT_MAIL_BATCH_SIZE', 1000)
+    chunk_size = _setting('ALERT_MAIL_CHUNK_SIZE', 500)
+    templates = {}
+    
+    with ThreadPoolExecutor(max_workers=_setting('ALERT_MAIL_WORKERS', 4),
+                            thread_name_prefix='alert-mail') as executor:
+        while stop_event is None or not stop_event.is_set():
+            logs = claim_batch(batch_size, alert_id=alert_id)
+            if not logs:
+                break
+            
+            # One weather lookup per location cell of the batch
+            located = [log.recipient for log in logs if log.recipient.location_lat is not None
+                       and log.recipient.location_lon is not None]
+            weather_by_user = get_weather_for_users(located)
+            groups, errors = _group_by_content(logs, weather_by_user, templates)
+            
+            chunks = [
+                (subject, html_template, group[start:start + chunk_size])
+                for subject, html_template, group in groups
+                for start in range(0, len(group), chunk_size)
+            ]
+            results = executor.map(lambda chunk: _send_chunk(*chunk, stop_event), chunks)
+            for (_, _, chunk), chunk_errors in zip(chunks, results):
+                errors.update((log.id, error) for log, error in zip(chunk, chunk_errors))
+            
+            for sent, failed in _record_results(logs, [errors[log.id] for log in logs]).values():
+                totals['sent'] += sent
+                totals['failed'] += failed
+            print(f"📧 Weather alert batch done: {totals['sent']} sent, {totals['failed']} failed so far")
+    
+    return totals
+
+
+def has_pending():
+    """Return True if any queued email can be claimed now."""
+    return EmailLog.objects.filter(_claimable(timezone.now())).exists()
+
+
+# Background dispatcher state (one dispatcher thread per process)
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+_work_available = threading.Event()
+_stop = threading.Event()
+
+
+def _run_dispatcher():
+    global _dispatcher
+    
+    try:
+        while True:
+            _work_available.clear()
+            try:
+                process_pending(stop_event=_stop)
+            except Exception as e:
+                print(f"❌ Weather alert dispatcher error: {e}")
+            with _dispatcher_lock:
+                # Work queued while we were finishing is picked up before exiting
+                if _stop.is_set() or not _work_available.is_set():
+                    _dispatcher = None
+                    return
+    finally:
+        connection.close()
+
+
+def start_dispatcher():
+    """
+    Make sure queued emails are being sent.
+    
+    Starts the background dispatcher thread if it is not running, or
+    drains the queue inline when ALERT_MAIL_ASYNC is off.
+    """
+    global _dispatcher
+    
+    if not _setting('ALERT_MAIL_ASYNC', True):
+        process_pending()
+        return
+    
+    with _dispatcher_lock:
+        _work_available.set()
+        if _dispatcher is None:
+            _stop.clear()
+            _dispatcher = threading.Thread(target=_run_dispatcher, name='alert-mail-dispatcher', daemon=True)
+            _dispatcher.start()
+
+
+def resume_pending():
+    """Restart the dispatcher if emails were left queued (e.g. by a recycled worker)."""
+    try:
+        if has_pending():
+            print("📧 Resuming queued weather alert emails")
+            start_dispatcher()
+    except Exception as e:
+        print(f"Could not check queued weather alert emails: {e}")
+
+
+def wait_for_dispatcher(timeout=None):
+    """Block until the dispatcher has drained the queue (e.g. before a command exits)."""
+    thread = _dispatcher
+    if thread is not None:
+        thread.join(timeout)
+
+
+def stop_dispatcher(timeout=10.0):
+    """Stop starting new emails and wait for in-flight ones (worker shutdown)."""
+    _stop.set()
+    thread = _dispatcher
+    if thread is not None:
+        thread.join(timeout)
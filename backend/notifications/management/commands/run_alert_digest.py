@@ -0,0 +1,46 @@
+"""
+Management command to run the scheduled weather alert digest.
+Usage: python manage.py run_alert_digest [--loop] [--interval SECONDS]
+
+Evaluates alerts once per populated weather cell and emails only the
+farmers of cells whose alert set changed since the previous run. Run it
+from cron, or keep it running with --loop (every ALERT_DIGEST_INTERVAL
+seconds). Run a single scheduler at a time.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from notifications.digest import run_alert_digest
+from notifications.mailer import wait_for_dispatcher
+
+
+class Command(BaseCommand):
+    help = 'Email farmers in weather cells whose alerts changed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running on a fixed interval')
+        parser.add_argument('--interval', type=int, help='Seconds between runs with --loop')
+
+    def handle(self, *args, **options):
+        interval = options.get('interval') or getattr(settings, 'ALERT_DIGEST_INTERVAL', 1800)
+        while True:
+            close_old_connections()
+            started = time.monotonic()
+            try:
+                summary = run_alert_digest()
+                self.stdout.write(self.style.SUCCESS(
+                    f"Alert digest: {summary['cells']} cells, {summary['changed']} changed, "
+                    f"{summary['notified']} notified, {summary['queued']} emails queued"
+                ))
+            except Exception as e:
+                if not options['loop']:
+                    raise
+                self.stderr.write(f"Alert digest failed: {e}")
+
+            if not options['loop']:
+                # Emails are sent by the dispatcher thread; let it finish
+                wait_for_dispatcher()
+                return
+            time.sleep(max(0, interval - (time.monotonic() - started)))
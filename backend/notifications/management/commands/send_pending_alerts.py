@@ -0,0 +1,22 @@
+"""
+Management command to send queued weather alert emails.
+Usage: python manage.py send_pending_alerts [--alert ID]
+
+Resumes broadcasts interrupted by a restart; safe to run while the web
+worker's dispatcher is also sending (rows are claimed with a lease).
+"""
+from django.core.management.base import BaseCommand
+from notifications.mailer import process_pending
+
+
+class Command(BaseCommand):
+    help = 'Send queued weather alert emails until the queue is empty'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alert', type=int, help='Only send emails of this alert')
+
+    def handle(self, *args, **options):
+        totals = process_pending(alert_id=options.get('alert'))
+        self.stdout.write(self.style.SUCCESS(
+            f"Weather alert emails: {totals['sent']} sent, {totals['failed']} failed"
+        ))
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:53
+
+from django.db import migrations, models
+
+
+def prepare_existing_logs(apps, schema_editor):
+    EmailLog = apps.get_model('notifications', 'EmailLog')
+    
+    # Rows left 'pending' by the old inline sender must not be picked up by the queue
+    EmailLog.objects.filter(status='pending').update(
+        status='failed',
+        error_message='Not sent before the email queue was introduced'
+    )
+    
+    # The old sender could log a recipient twice per alert; keep one row (a sent one if any)
+    duplicates = (
+        EmailLog.objects.values('alert_id', 'recipient_id')
+        .annotate(rows=models.Count('id')).filter(rows__gt=1)
+    )
+    for group in duplicates.iterator():
+        rows = EmailLog.objects.filter(alert_id=group['alert_id'], recipient_id=group['recipient_id'])
+        keep = rows.filter(status='sent').order_by('-id').first() or rows.order_by('-id').first()
+        rows.exclude(id=keep.id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0001_initial'),
+    ]
+    
+    operations = [
+        migrations.AddField(
+            model_name='emaillog',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='emaillog',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='weatheralertnotification',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='weatheralertnotification',
+            name='emails_failed_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='emaillog',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+        migrations.RunPython(prepare_existing_logs, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='emaillog',
+            index=models.Index(fields=['status', 'lease_expires_at'], name='emaillog_queue_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='emaillog',
+            constraint=models.UniqueConstraint(fields=('alert', 'recipient'), name='unique_email_per_alert_recipient'),
+        ),
+    ]
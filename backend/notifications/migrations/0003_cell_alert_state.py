@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-17 13:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_email_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CellAlertState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cell_lat', models.FloatField()),
+                ('cell_lon', models.FloatField()),
+                ('signature', models.JSONField(default=list)),
+                ('alerts', models.JSONField(default=list)),
+                ('checked_at', models.DateTimeField()),
+                ('changed_at', models.DateTimeField()),
+                ('last_notification', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cell_states', to='notifications.weatheralertnotification')),
+            ],
+            options={
+                'verbose_name': 'Cell Alert State',
+                'verbose_name_plural': 'Cell Alert States',
+                'ordering': ['cell_lat', 'cell_lon'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cellalertstate',
+            constraint=models.UniqueConstraint(fields=('cell_lat', 'cell_lon'), name='unique_alert_state_per_cell'),
+        ),
+    ]
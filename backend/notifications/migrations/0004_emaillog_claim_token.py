@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_cell_alert_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emaillog',
+            name='claim_token',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
@@ -56,6 +56,8 @@ class WeatherAlertNotification(models.Model):
     # Status
     is_active = models.BooleanField(default=True)
     emails_sent_count = models.IntegerField(default=0)
+    emails_failed_count = models.IntegerField(default=0)
+    completed_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         ordering = ['-created_at']
@@ -69,9 +71,14 @@ class WeatherAlertNotification(models.Model):
 class EmailLog(models.Model):
     """
     Log of all emails sent for weather alerts.
+    
+    Pending rows double as the durable send queue (see notifications.mailer):
+    a dispatcher claims a batch by marking it 'sending' with a lease, and
+    rows whose lease expired (the worker died) are claimed again.
     """
     STATUS_CHOICES = [
         ('pending', 'Pending'),
+        ('sending', 'Sending'),
         ('sent', 'Sent'),
         ('failed', 'Failed'),
     ]
@@ -95,10 +102,59 @@ class EmailLog(models.Model):
     sent_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    # Queue bookkeeping
+    attempts = models.PositiveSmallIntegerField(default=0)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    claim_token = models.CharField(max_length=32, blank=True)
+    
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Email Log'
         verbose_name_plural = 'Email Logs'
+        constraints = [
+            # One email per farmer per alert
+            models.UniqueConstraint(fields=['alert', 'recipient'], name='unique_email_per_alert_recipient'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'lease_expires_at'], name='emaillog_queue_idx'),
+        ]
     
     def __str__(self):
         return f"Email to {self.recipient_email} - {self.status}"
+
+
+class CellAlertState(models.Model):
+    """
+    Last evaluated alert set of one populated weather cell.
+    
+    Written by the scheduled alert digest (see notifications.digest),
+    which emails a cell's farmers only when this set changes.
+    """
+    cell_lat = models.FloatField()
+    cell_lon = models.FloatField()
+    
+    # Sorted "type:severity" keys of the current alerts, and the alerts themselves
+    signature = models.JSONField(default=list)
+    alerts = models.JSONField(default=list)
+    
+    last_notification = models.ForeignKey(
+        WeatherAlertNotification,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='cell_states'
+    )
+    
+    checked_at = models.DateTimeField()
+    changed_at = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['cell_lat', 'cell_lon']
+        verbose_name = 'Cell Alert State'
+        verbose_name_plural = 'Cell Alert States'
+        constraints = [
+            models.UniqueConstraint(fields=['cell_lat', 'cell_lon'], name='unique_alert_state_per_cell'),
+        ]
+    
+    def __str__(self):
+        return f"{self.cell_lat}, {self.cell_lon}: {', '.join(self.signature) or 'no alerts'}"
@@ -2,18 +2,37 @@
 Automated Weather Alert Service
 Fetches real-time weather data for each user's location and sends personalized alerts.
 """
-import requests
 import os
-import threading
+from django.db import transaction
 from django.utils import timezone
 from dotenv import load_dotenv
 from accounts.models import User
+from securecrop import http
+from weather import rules
+from weather.client import cell_key, get_current_weather, get_current_weather_many
 from .models import WeatherAlertNotification, EmailLog
 
 # Load environment variables
 load_dotenv()
 
-OPENWEATHER_API_KEY = os.getenv('OPENWEATHER_API_KEY', '')
+# Brevo transactional email endpoint (BREVO_API_URL overrides it, e.g. for a local stub)
+BREVO_API_URL = 'https://api.brevo.com/v3/smtp/email'
+
+BREVO_SENDER = {
+    'name': 'SecureCrop',
+    'email': 'mdparvej.ahmedrafi@student.aiu.edu.my'
+}
+
+# Brevo template parameter filled in per recipient (messageVersions params)
+USERNAME_PARAM = '{{ params.username }}'
+
+
+class BrevoAPIError(Exception):
+    """Brevo did not accept an email request."""
+    
+    def __init__(self, status_code, text):
+        super().__init__(f"Brevo API returned status {status_code}: {text}")
+        self.status_code = status_code
 
 
 def get_weather_for_location(lat, lon):
@@ -23,128 +42,128 @@ def get_weather_for_location(lat, lon):
     Args:
         lat: Latitude
         lon: Longitude
-        
+    
     Returns:
         dict: Weather data or None if failed
     """
     try:
-        url = f"https://api.openweathermap.org/data/2.5/weather"
-        params = {
-            'lat': lat,
-            'lon': lon,
-            'appid': OPENWEATHER_API_KEY,
-            'units': 'metric'
-        }
-        response = requests.get(url, params=params, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            return {
-                'temperature': round(data['main']['temp'], 1),
-                'feels_like': round(data['main']['feels_like'], 1),
-                'humidity': data['main']['humidity'],
-                'pressure': data['main']['pressure'],
-                'wind_speed': round(data['wind']['speed'] * 3.6, 1),  # Convert m/s to km/h
-                'description': data['weather'][0]['description'].title(),
-                'icon': data['weather'][0]['icon'],
-                'city': data.get('name', 'Your Location'),
-                'country': data.get('sys', {}).get('country', ''),
-            }
+        # Shared cache with the weather views (one upstream call per ~1km cell)
+        data = get_current_weather(lat, lon)
+        if data:
+            return _format_weather(data)
     except Exception as e:
         print(f"Error fetching weather for {lat}, {lon}: {e}")
     
     return None
 
 
+def get_weather_for_users(users):
+    """
+    Fetch current weather for many users at once.
+    
+    Users in the same ~1km cell share one lookup, and uncached cells are
+    fetched concurrently.
+    
+    Args:
+        users: Users with location_lat and location_lon set
+    
+    Returns:
+        dict: user id -> weather data (same format as get_weather_for_location) or None
+    """
+    users = list(users)
+    by_cell = get_current_weather_many((user.location_lat, user.location_lon) for user in users)
+    
+    weather = {}
+    for user in users:
+        data = by_cell.get(cell_key(user.location_lat, user.location_lon))
+        try:
+            weather[user.id] = _format_weather(data) if data else None
+        except (KeyError, IndexError, TypeError) as e:
+            print(f"Unexpected weather payload for {user.location_lat}, {user.location_lon}: {e}")
+            weather[user.id] = None
+    return weather
+
+
+def _format_weather(data):
+    """Convert an OpenWeatherMap /weather payload to the alert format."""
+    return {
+        'temperature': round(data['main']['temp'], 1),
+        'feels_like': round(data['main']['feels_like'], 1),
+        'humidity': data['main']['humidity'],
+        'pressure': data['main']['pressure'],
+        'wind_speed': round(data['wind']['speed'] * 3.6, 1),  # Convert m/s to km/h
+        'wind_speed_ms': data['wind']['speed'],  # Rule engine unit
+        'condition': data['weather'][0]['main'],
+        'description': data['weather'][0]['description'].title(),
+        'icon': data['weather'][0]['icon'],
+        'city': data.get('name', 'Your Location'),
+        'country': data.get('sys', {}).get('country', ''),
+    }
+
+
+def get_weather_alerts_for_locations(weather_list):
+    """
+    Generate weather alerts for many locations in one rule engine call.
+    
+    Args:
+        weather_list: dicts from get_weather_for_location (None if unavailable)
+    
+    Returns:
+        list: Alerts (see weather.rules.alerts) per entry of weather_list
+    """
+    if not weather_list:
+        return []
+    
+    def field(name):
+        return [weather[name] if weather else None for weather in weather_list]
+    
+    observations = rules.observations(
+        temperature=field('temperature'),
+        humidity=field('humidity'),
+        wind_speed=field('wind_speed_ms'),
+        condition=[weather.get('condition', '') if weather else '' for weather in weather_list],
+        description=field('description')
+    )
+    return rules.alerts(observations)
+
+
 def get_weather_alerts_for_location(weather_data):
     """
     Generate weather alerts based on current conditions.
     
     Args:
         weather_data: dict with weather information
-        
+    
     Returns:
-        list: List of alert messages
+        list: List of alerts (type, severity, title, message...)
     """
-    alerts = []
-    
-    if not weather_data:
-        return alerts
-    
-    temp = weather_data['temperature']
-    humidity = weather_data['humidity']
-    wind_speed = weather_data['wind_speed']
-    
-    # Temperature alerts
-    if temp >= 35:
-        alerts.append({
-            'type': 'heat_wave',
-            'severity': 'danger',
-            'message': f"🔥 HEAT WARNING: Temperature is {temp}°C. Protect your crops from heat stress. Water plants early morning or late evening."
-        })
-    elif temp >= 32:
-        alerts.append({
-            'type': 'heat_wave',
-            'severity': 'warning',
-            'message': f"☀️ High Temperature Alert: {temp}°C. Consider shade covers for sensitive crops."
-        })
-    elif temp <= 5:
-        alerts.append({
-            'type': 'cold_wave',
-            'severity': 'danger',
-            'message': f"❄️ FROST WARNING: Temperature is {temp}°C. Protect crops from cold damage. Cover sensitive plants."
-        })
-    elif temp <= 10:
-        alerts.append({
-            'type': 'cold_wave',
-            'severity': 'warning',
-            'message': f"🌡️ Cold Alert: Temperature dropped to {temp}°C. Monitor cold-sensitive crops."
-        })
-    
-    # Humidity alerts
-    if humidity >= 90:
-        alerts.append({
-            'type': 'humidity',
-            'severity': 'warning',
-            'message': f"💧 High Humidity Alert: {humidity}%. Watch for fungal diseases. Ensure good ventilation."
-        })
-    elif humidity <= 30:
-        alerts.append({
-            'type': 'drought',
-            'severity': 'warning',
-            'message': f"🏜️ Low Humidity Alert: {humidity}%. Increase watering frequency for crops."
-        })
-    
-    # Wind alerts
-    if wind_speed >= 50:
-        alerts.append({
-            'type': 'storm',
-            'severity': 'critical',
-            'message': f"🌪️ STORM WARNING: Wind speed {wind_speed} km/h. Secure equipment and protect crops!"
-        })
-    elif wind_speed >= 30:
-        alerts.append({
-            'type': 'wind',
-            'severity': 'warning',
-            'message': f"💨 Strong Wind Alert: {wind_speed} km/h. Consider wind barriers for tall crops."
-        })
-    
-    # Rain check from description
-    desc_lower = weather_data['description'].lower()
-    if 'rain' in desc_lower or 'shower' in desc_lower:
-        alerts.append({
-            'type': 'heavy_rain',
-            'severity': 'info',
-            'message': f"🌧️ Rain Expected: {weather_data['description']}. Good time to pause irrigation."
-        })
-    
-    return alerts
+    return get_weather_alerts_for_locations([weather_data])[0]
 
 
 def generate_weather_email_html(user, weather_data, alerts):
     """
     Generate personalized weather alert email HTML.
     """
+    return render_weather_email_template(weather_data, alerts, username=user.username)
+
+
+def render_weather_email_template(weather_data, alerts, username=USERNAME_PARAM):
+    """
+    Render the weather alert email HTML.
+    
+    Only the greeting differs between recipients with the same weather, so
+    by default the username is left as a Brevo template parameter and one
+    rendering serves every recipient of a location cell (see
+    send_weather_email_batch).
+    
+    Args:
+        weather_data: dict from get_weather_for_location (None if unavailable)
+        alerts: Alerts for weather_data
+        username: Name in the greeting (default: the Brevo placeholder)
+    
+    Returns:
+        str: Email HTML
+    """
     city = weather_data.get('city', 'Your Location') if weather_data else 'Your Location'
     
     # Generate alerts HTML
@@ -152,9 +171,9 @@ def generate_weather_email_html(user, weather_data, alerts):
     if alerts:
         for alert in alerts:
             severity_colors = {
-                'info': '#17a2b8',
-                'warning': '#ffc107',
-                'danger': '#dc3545',
+                'low': '#17a2b8',
+                'medium': '#ffc107',
+                'high': '#dc3545',
                 'critical': '#721c24',
             }
             color = severity_colors.get(alert['severity'], '#17a2b8')
@@ -209,7 +228,7 @@ def generate_weather_email_html(user, weather_data, alerts):
         </div>
         
         <div style="background: white; padding: 25px;">
-            <p style="font-size: 16px; color: #333;">Hello <strong>{user.username}</strong>,</p>
+            <p style="font-size: 16px; color: #333;">Hello <strong>{username}</strong>,</p>
             <p style="color: #666;">Here's your personalized weather update based on your farm location:</p>
             
             {weather_html}
@@ -246,15 +265,99 @@ def generate_weather_email_html(user, weather_data, alerts):
     return html
 
 
+def send_weather_email(user, weather_data, alerts=None):
+    """
+    Render and send the weather alert email for one user via the Brevo API.
+    
+    Args:
+        user: Recipient
+        weather_data: dict from get_weather_for_location (None if unavailable)
+        alerts: Alerts for weather_data (computed if not given)
+    
+    Raises:
+        Exception: Brevo is not configured or did not accept the email
+    """
+    if alerts is None:
+        alerts = get_weather_alerts_for_location(weather_data)
+    
+    _post_to_brevo({
+        'sender': BREVO_SENDER,
+        'to': [{'email': user.email, 'name': user.username}],
+        'subject': weather_email_subject(weather_data),
+        'htmlContent': generate_weather_email_html(user, weather_data, alerts)
+    })
+
+
+def send_weather_email_batch(users, subject, html_template):
+    """
+    Send one rendered weather email to many users in a single Brevo call.
+    
+    Uses Brevo's messageVersions: the template is sent once and each
+    recipient gets their own version with the username parameter filled in.
+    
+    Args:
+        users: Recipients (Brevo accepts up to 1000 versions per call)
+        subject: Email subject
+        html_template: HTML from render_weather_email_template()
+    
+    Raises:
+        BrevoAPIError: Brevo rejected the request (no email was sent)
+        Exception: Brevo is not configured or could not be reached
+    """
+    _post_to_brevo({
+        'sender': BREVO_SENDER,
+        'subject': subject,
+        'htmlContent': html_template,
+        'messageVersions': [
+            {
+                'to': [{'email': user.email, 'name': user.username}],
+                'params': {'username': user.username}
+            }
+            for user in users
+        ]
+    })
+
+
+def weather_email_subject(weather_data):
+    """Subject line of the weather alert email."""
+    city = weather_data.get('city', 'Your Location') if weather_data else 'Your Location'
+    return f"🌾 Weather Alert for {city} - SecureCrop"
+
+
+def _post_to_brevo(payload):
+    """POST a transactional email request to the Brevo HTTP API."""
+    # Get Brevo API key
+    brevo_api_key = os.getenv('BREVO_API_KEY')
+    
+    if not brevo_api_key:
+        raise ValueError("BREVO_API_KEY not configured")
+    
+    response = http.post(
+        os.getenv('BREVO_API_URL', BREVO_API_URL),
+        headers={
+            'accept': 'application/json',
+            'api-key': brevo_api_key,
+            'content-type': 'application/json'
+        },
+        json=payload,
+        timeout=10
+    )
+    
+    if response.status_code not in [200, 201]:
+        raise BrevoAPIError(response.status_code, response.text)
+
+
 def send_automated_weather_alert(user, alert_notification=None):
     """
     Send personalized weather alert email to a user based on their location.
     Uses Brevo API for reliable email delivery.
     
+    Bulk sends go through the queue instead (see queue_weather_alert).
+    
     Args:
         user: User instance with location_lat and location_lon
         alert_notification: Optional WeatherAlertNotification for logging
-        
+    
     Returns:
         EmailLog instance
     """
@@ -265,12 +368,6 @@ def send_automated_weather_alert(user, alert_notification=None):
     # Fetch weather for user's location
     weather_data = get_weather_for_location(user.location_lat, user.location_lon)
     
-    # Generate weather-based alerts
-    alerts = get_weather_alerts_for_location(weather_data)
-    
-    # Generate email content
-    html_content = generate_weather_email_html(user, weather_data, alerts)
-    
     # Create email log if alert notification provided
     email_log = None
     if alert_notification:
@@ -282,49 +379,17 @@ def send_automated_weather_alert(user, alert_notification=None):
         )
     
     try:
-        # Create and send email using Brevo API
-        city = weather_data.get('city', 'Your Location') if weather_data else 'Your Location'
-        subject = f"🌾 Weather Alert for {city} - SecureCrop"
-        
-        # Get Brevo API key
-        brevo_api_key = os.getenv('BREVO_API_KEY')
-        
-        if not brevo_api_key:
-            raise ValueError("BREVO_API_KEY not configured")
-        
-        # Send via Brevo HTTP API
-        response = requests.post(
-            'https://api.brevo.com/v3/smtp/email',
-            headers={
-                'accept': 'application/json',
-                'api-key': brevo_api_key,
-                'content-type': 'application/json'
-            },
-            json={
-                'sender': {
-                    'name': 'SecureCrop',
-                    'email': 'mdparvej.ahmedrafi@student.aiu.edu.my'
-                },
-                'to': [{'email': user.email, 'name': user.username}],
-                'subject': subject,
-                'htmlContent': html_content
-            },
-            timeout=10
-        )
-        
-        if response.status_code in [200, 201]:
-            print(f"✅ Weather alert email sent via Brevo API to {user.email}")
-            if email_log:
-                email_log.status = 'sent'
-                email_log.sent_at = timezone.now()
-                email_log.save()
-                return email_log
-            else:
-                # Return a simple success indicator when no email_log is needed
-                return True
+        send_weather_email(user, weather_data)
+        print(f"✅ Weather alert email sent via Brevo API to {user.email}")
+        if email_log:
+            email_log.status = 'sent'
+            email_log.sent_at = timezone.now()
+            email_log.save()
+            return email_log
         else:
-            raise Exception(f"Brevo API returned status {response.status_code}: {response.text}")
-        
+            # Return a simple success indicator when no email_log is needed
+            return True
+    
     except Exception as e:
         print(f"❌ Error sending weather alert to {user.email}: {str(e)}")
         if email_log:
@@ -335,48 +400,58 @@ def send_automated_weather_alert(user, alert_notification=None):
         return email_log
 
 
-def _send_emails_in_background(users, alert):
-    """
-    Background task to send emails to avoid worker timeout.
+def alert_recipients():
+    """Users who receive weather alert emails (alerts enabled, location and email set)."""
+    return User.objects.filter(
+        is_active=True,
+        receive_email_alerts=True,
+        location_lat__isnull=False,
+        location_lon__isnull=False
+    ).exclude(email='')
+
+
+def queue_weather_alert(alert, users):
     """
-    sent_count = 0
-    failed_count = 0
+    Queue one pending EmailLog per user and start the mail dispatcher.
     
-    for user in users:
-        try:
-            result = send_automated_weather_alert(user, alert)
-            if result and result.status == 'sent':
-                sent_count += 1
-            else:
-                failed_count += 1
-        except Exception as e:
-            print(f"Error sending to {user.email}: {e}")
-            failed_count += 1
+    The pending rows are the durable job queue: they survive worker
+    restarts and are picked up again by the dispatcher or by
+    `manage.py send_pending_alerts`.
+    
+    Args:
+        alert: WeatherAlertNotification being sent
+        users: Recipients (duplicates and users already queued for the
+            alert are ignored)
     
-    # Update alert with counts
-    alert.emails_sent_count = sent_count
-    alert.save()
-    print(f"Email sending completed: {sent_count} sent, {failed_count} failed")
+    Returns:
+        int: Number of emails newly queued
+    """
+    from .mailer import start_dispatcher
+    
+    logs = [
+        EmailLog(alert=alert, recipient_id=user.id, recipient_email=user.email, status='pending')
+        for user in users
+    ]
+    # ignore_conflicts does not report which rows were skipped, so count them
+    queued_before = EmailLog.objects.filter(alert=alert).count()
+    EmailLog.objects.bulk_create(logs, batch_size=1000, ignore_conflicts=True)
+    transaction.on_commit(start_dispatcher)
+    return EmailLog.objects.filter(alert=alert).count() - queued_before
 
 
 def send_weather_alerts_to_all_users(admin_user):
     """
     Send automated weather alerts to all users with email alerts enabled and location set.
-    Uses background threading to avoid worker timeout.
+    Emails are queued and sent by the background mail dispatcher.
     
     Args:
         admin_user: Admin user who triggered the send
-        
+    
     Returns:
         dict: Summary of email sending initiation
     """
     # Get users with email alerts enabled and location set
-    users = User.objects.filter(
-        is_active=True,
-        receive_email_alerts=True,
-        location_lat__isnull=False,
-        location_lon__isnull=False
-    ).exclude(email='')
+    users = alert_recipients().only('id', 'email')
     
     if not users.exists():
         return {
@@ -397,66 +472,30 @@ def send_weather_alerts_to_all_users(admin_user):
         target_all_users=True
     )
     
-    # Start background thread to send emails
-    thread = threading.Thread(
-        target=_send_emails_in_background,
-        args=(list(users), alert),
-        daemon=True
-    )
-    thread.start()
+    total = queue_weather_alert(alert, users)
     
     return {
         'success': True,
-        'message': f'Weather alerts are being sent to {users.count()} farmers in the background',
+        'message': f'Weather alerts are being sent to {total} farmers in the background',
         'alert_id': alert.id,
-        'total': users.count(),
+        'total': total,
         'status': 'processing'
     }
 
 
-def _send_emails_to_specific_users_in_background(users, alert):
-    """
-    Background task to send emails to specific users.
-    """
-    sent_count = 0
-    failed_count = 0
-    
-    for user in users:
-        try:
-            result = send_automated_weather_alert(user, alert)
-            if result and result.status == 'sent':
-                sent_count += 1
-            else:
-                failed_count += 1
-        except Exception as e:
-            print(f"Error sending to {user.email}: {e}")
-            failed_count += 1
-    
-    # Update alert with counts
-    alert.emails_sent_count = sent_count
-    alert.save()
-    print(f"Targeted email sending completed: {sent_count} sent, {failed_count} failed")
-
-
 def send_weather_alerts_to_specific_users(admin_user, user_ids):
     """
     Send automated weather alerts to specific users.
-    Uses background threading to avoid worker timeout.
+    Emails are queued and sent by the background mail dispatcher.
     
     Args:
         admin_user: Admin user who triggered the send
         user_ids: List of user IDs
-        
+    
     Returns:
         dict: Summary of email sending initiation
     """
-    users = User.objects.filter(
-        id__in=user_ids,
-        is_active=True,
-        receive_email_alerts=True,
-        location_lat__isnull=False,
-        location_lon__isnull=False
-    ).exclude(email='')
+    users = alert_recipients().filter(id__in=user_ids).only('id', 'email')
     
     if not users.exists():
         return {
@@ -467,10 +506,12 @@ def send_weather_alerts_to_specific_users(admin_user, user_ids):
             'failed': 0
         }
     
+    users = list(users)
+    
     # Create alert notification record
     alert = WeatherAlertNotification.objects.create(
         title='Targeted Weather Alert',
-        message=f'Personalized weather data sent to {users.count()} selected farmers',
+        message=f'Personalized weather data sent to {len(users)} selected farmers',
         alert_type='general',
         severity='info',
         created_by=admin_user,
@@ -479,20 +520,13 @@ def send_weather_alerts_to_specific_users(admin_user, user_ids):
     
     # Set target users
     alert.target_users.set(users)
-    alert.save()
     
-    # Start background thread to send emails
-    thread = threading.Thread(
-        target=_send_emails_to_specific_users_in_background,
-        args=(list(users), alert),
-        daemon=True
-    )
-    thread.start()
+    total = queue_weather_alert(alert, users)
     
     return {
         'success': True,
-        'message': f'Weather alerts are being sent to {users.count()} farmers in the background',
+        'message': f'Weather alerts are being sent to {total} farmers in the background',
         'alert_id': alert.id,
-        'total': users.count(),
+        'total': total,
         'status': 'processing'
     }
@@ -0,0 +1,336 @@
+import json
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from weather.tests import OpenWeatherStubServer, current_weather_payload
+from . import mailer, services
+from .digest import run_alert_digest
+from .models import CellAlertState, EmailLog, WeatherAlertNotification
+
+
+class BrevoStubServer:
+    """
+    Local HTTP server standing in for the Brevo transactional email API.
+    
+    Use as a context manager; while active, BREVO_API_URL/BREVO_API_KEY
+    point at the stub. Every request body is recorded in requests, and
+    every delivered recipient (single or messageVersions) in emails. A
+    request naming an address in reject fails with 400, like Brevo.
+    """
+    
+    def __init__(self, status=201, reject=()):
+        self.status = status
+        self.reject = set(reject)
+        self.requests = []
+        self.emails = []
+        stub = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                stub.requests.append(body)
+                versions = body.get('messageVersions') or [{'to': body['to']}]
+                recipients = [to for version in versions for to in version['to']]
+                status = stub.status
+                if any(to['email'] in stub.reject for to in recipients):
+                    status = 400
+                if status in (200, 201):
+                    stub.emails.extend(recipients)
+                payload = json.dumps({'messageIds': [f'<{i}@stub>' for i in range(len(recipients))]}).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            
+            def log_message(self, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v3/smtp/email"
+    
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self._env = mock.patch.dict('os.environ', {
+            'BREVO_API_KEY': 'test-key',
+            'BREVO_API_URL': self.url,
+        })
+        self._env.start()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._env.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class EligibleUsersTest(TestCase):
+    """Test cases for the eligible-users admin page."""
+    
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            email='admin@example.com',
+            username='admin',
+            password='adminpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+    
+    def test_cells_fetched_once_and_concurrently(self):
+        """Farmers sharing a cell share a lookup; distinct cells are fetched in parallel."""
+        # Pairs of neighbours in 6 distinct cells
+        create_farmers([(3.1 + i, 101.6) for i in range(6)] + [(3.1001 + i, 101.6001) for i in range(6)])
+        
+        with OpenWeatherStubServer(delay=0.3) as owm:
+            start = time.monotonic()
+            response = self.client.get(reverse('eligible-users'))
+            elapsed = time.monotonic() - start
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(owm.requests), 6)
+        self.assertLess(elapsed, 6 * owm.delay)
+        users = response.data['eligible_users']['users']
+        self.assertEqual(len(users), 12)
+        self.assertTrue(all(user['weather_preview'] is not None for user in users))
+    
+    def test_paginated(self):
+        """Only the requested page is listed (and previewed)."""
+        create_farmers([(2.0 + i, 101.0) for i in range(5)])
+        
+        with OpenWeatherStubServer() as owm:
+            response = self.client.get(reverse('eligible-users'), {'page_size': 2, 'page': 2})
+        
+        eligible = response.data['eligible_users']
+        self.assertEqual(eligible['count'], 5)
+        self.assertEqual([user['username'] for user in eligible['users']], ['farmer02', 'farmer03'])
+        self.assertIsNotNone(eligible['next'])
+        self.assertIsNotNone(eligible['previous'])
+        self.assertEqual(len(owm.requests), 2)
+
+
+def create_farmers(locations, prefix='farmer'):
+    return [
+        User.objects.create_user(
+            email=f'{prefix}{index}@example.com',
+            username=f'{prefix}{index:02d}',
+            password='testpass123',
+            receive_email_alerts=True,
+            location_lat=lat,
+            location_lon=lon
+        )
+        for index, (lat, lon) in enumerate(locations)
+    ]
+
+
+@override_settings(ALERT_MAIL_RATE=0)
+class AlertMailerTest(TestCase):
+    """Test cases for the queued bulk weather alert mailer."""
+    
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            email='admin@example.com',
+            username='admin',
+            password='adminpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+    
+    def test_broadcast(self):
+        """Every farmer gets one email; weather and content are built once per cell."""
+        create_farmers([(3.139, 101.687)] * 3 + [(5.414, 100.329)] * 3)
+        
+        with OpenWeatherStubServer() as owm, BrevoStubServer() as brevo, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('send-alerts'), {'send_to_all': True}, format='json')
+        
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(brevo.emails), 6)
+        self.assertEqual(len(owm.requests), 2)
+        # One messageVersions call per cell, personalised through params
+        self.assertEqual(len(brevo.requests), 2)
+        for body in brevo.requests:
+            self.assertIn('{{ params.username }}', body['htmlContent'])
+            self.assertEqual(len(body['messageVersions']), 3)
+            version = body['messageVersions'][0]
+            self.assertEqual(version['params']['username'], version['to'][0]['name'])
+        alert = WeatherAlertNotification.objects.get(id=response.data['alert_id'])
+        self.assertEqual(alert.emails_sent_count, 6)
+        self.assertIsNotNone(alert.completed_at)
+        self.assertEqual(alert.email_logs.filter(status='sent').count(), 6)
+    
+    def test_queued_count_skips_duplicates(self):
+        """Recipients already queued for the alert are not counted again."""
+        farmers = create_farmers([(3.139, 101.687)] * 3)
+        alert = WeatherAlertNotification.objects.create(title='Queued', message='Queued', created_by=self.admin)
+        
+        self.assertEqual(services.queue_weather_alert(alert, farmers[:2] + farmers[:1]), 2)
+        self.assertEqual(services.queue_weather_alert(alert, farmers), 1)
+        self.assertEqual(alert.email_logs.count(), 3)
+    
+    def test_resume_after_restart(self):
+        """Pending emails and emails whose lease expired are sent again; live leases are left alone."""
+        farmers = create_farmers([(3.139, 101.687)] * 3)
+        alert = WeatherAlertNotification.objects.create(title='Queued', message='Queued', created_by=self.admin)
+        now = timezone.now()
+        EmailLog.objects.bulk_create([
+            EmailLog(alert=alert, recipient=farmers[0], recipient_email=farmers[0].email),
+            EmailLog(alert=alert, recipient=farmers[1], recipient_email=farmers[1].email,
+                     status='sending', attempts=1, lease_expires_at=now - timedelta(minutes=1)),
+            EmailLog(alert=alert, recipient=farmers[2], recipient_email=farmers[2].email,
+                     status='sending', attempts=1, lease_expires_at=now + timedelta(minutes=5)),
+        ])
+        
+        with OpenWeatherStubServer(), BrevoStubServer() as brevo:
+            totals = mailer.process_pending()
+        
+        self.assertEqual(totals, {'sent': 2, 'failed': 0})
+        self.assertEqual(sorted(email['email'] for email in brevo.emails),
+                         [farmers[0].email, farmers[1].email])
+        self.assertEqual(EmailLog.objects.get(recipient=farmers[2]).status, 'sending')
+        alert.refresh_from_db()
+        self.assertEqual(alert.emails_sent_count, 2)
+        self.assertIsNone(alert.completed_at)
+    
+    def test_rows_are_claimed_once(self):
+        """A dispatcher that read the same ids as another claims only what is still pending."""
+        farmers = create_farmers([(3.139, 101.687)] * 3)
+        alert = WeatherAlertNotification.objects.create(title='Queued', message='Queued', created_by=self.admin)
+        EmailLog.objects.bulk_create([
+            EmailLog(alert=alert, recipient=farmer, recipient_email=farmer.email) for farmer in farmers
+        ])
+        ids = list(EmailLog.objects.order_by('id').values_list('id', flat=True))
+        
+        first = mailer.claim_batch(2)
+        # The second dispatcher read every id before the first one's UPDATE (no SKIP LOCKED on SQLite)
+        with mock.patch.object(mailer, '_claimable_ids', return_value=ids):
+            second = mailer.claim_batch(3)
+        
+        self.assertEqual(sorted(log.id for log in first), ids[:2])
+        self.assertEqual(sorted(log.id for log in second), ids[2:])
+        self.assertEqual(list(EmailLog.objects.order_by('id').values_list('attempts', flat=True)), [1, 1, 1])
+    
+    @override_settings(ALERT_MAIL_MAX_ATTEMPTS=2)
+    def test_failures_retried_then_recorded(self):
+        """A rejected email is retried, then marked failed and counted."""
+        farmers = create_farmers([(3.139, 101.687)])
+        
+        with OpenWeatherStubServer(), BrevoStubServer(status=400), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('send-alerts'), {'send_to_all': False, 'user_ids': [farmers[0].id]}, format='json')
+        
+        log = EmailLog.objects.get()
+        self.assertEqual((log.status, log.attempts), ('failed', 2))
+        self.assertIn('400', log.error_message)
+        self.assertEqual(log.alert.emails_failed_count, 1)
+    
+    @override_settings(ALERT_MAIL_CHUNK_SIZE=2)
+    def test_chunks_and_rejected_address(self):
+        """Recipients are sent in chunks; a rejected address only fails its own email."""
+        farmers = create_farmers([(3.139, 101.687)] * 4)
+        alert = WeatherAlertNotification.objects.create(title='Queued', message='Queued', created_by=self.admin)
+        EmailLog.objects.bulk_create([
+            EmailLog(alert=alert, recipient=farmer, recipient_email=farmer.email) for farmer in farmers
+        ])
+        
+        with override_settings(ALERT_MAIL_MAX_ATTEMPTS=1), OpenWeatherStubServer(), \
+                BrevoStubServer(reject=[farmers[1].email]) as brevo:
+            totals = mailer.process_pending()
+        
+        self.assertEqual(totals, {'sent': 3, 'failed': 1})
+        # Two chunks of two; the rejected chunk is resent one by one
+        self.assertEqual([len(body.get('messageVersions', [])) for body in brevo.requests].count(2), 2)
+        self.assertEqual(len(brevo.requests), 4)
+        self.assertEqual(EmailLog.objects.get(recipient=farmers[1]).status, 'failed')
+    
+    def test_auth_error_fails_whole_chunk(self):
+        """A rejected API key fails the chunk without resending to each recipient."""
+        farmers = create_farmers([(3.139, 101.687)] * 2)
+        alert = WeatherAlertNotification.objects.create(title='Queued', message='Queued', created_by=self.admin)
+        EmailLog.objects.bulk_create([
+            EmailLog(alert=alert, recipient=farmer, recipient_email=farmer.email) for farmer in farmers
+        ])
+        
+        with override_settings(ALERT_MAIL_MAX_ATTEMPTS=1), OpenWeatherStubServer(), \
+                BrevoStubServer(status=401) as brevo:
+            totals = mailer.process_pending()
+        
+        self.assertEqual(totals, {'sent': 0, 'failed': 2})
+        self.assertEqual(len(brevo.requests), 1)
+    
+    def test_rate_limiter(self):
+        """Sends are spaced out to the configured rate."""
+        limiter = mailer.RateLimiter(rate=20, burst=1)
+        start = time.monotonic()
+        for _ in range(5):
+            limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.18)
+
+
+@override_settings(ALERT_MAIL_RATE=0)
+class AlertDigestTest(TestCase):
+    """Test cases for the scheduled, edge-triggered alert digest."""
+    
+    def run_digest(self, hot_latitudes):
+        """Run one digest with a heat wave over the cells at the given whole latitudes."""
+        def weather(lat, lon):
+            data = current_weather_payload(lat, lon)
+            if round(lat) in hot_latitudes:
+                data['main'] = dict(data['main'], temp=36.0)
+            return data
+        
+        with OpenWeatherStubServer(weather=weather) as owm, BrevoStubServer() as brevo, \
+                self.captureOnCommitCallbacks(execute=True):
+            summary = run_alert_digest()
+        return summary, owm, brevo
+    
+    def test_only_changed_cells_are_notified(self):
+        """Emails go out when a cell's alert set changes, once per change."""
+        create_farmers([(3.139, 101.687)] * 3 + [(5.414, 100.329)] * 2)
+        
+        # First run: a heat wave in Kuala Lumpur
+        summary, owm, brevo = self.run_digest({3})
+        self.assertEqual(len(owm.requests), 2)
+        self.assertEqual((summary['cells'], summary['changed'], summary['notified'], summary['queued']), (2, 2, 1, 3))
+        self.assertEqual(sorted(email['email'] for email in brevo.emails),
+                         ['farmer0@example.com', 'farmer1@example.com', 'farmer2@example.com'])
+        alert = WeatherAlertNotification.objects.get(id=summary['alert_id'])
+        self.assertEqual((alert.severity, alert.emails_sent_count), ('danger', 3))
+        
+        # Nothing changed: the persisting alert is not sent again
+        summary, owm, brevo = self.run_digest({3})
+        self.assertEqual(len(owm.requests), 2)
+        self.assertEqual((summary['changed'], summary['queued'], summary['alert_id']), (0, 0, None))
+        self.assertEqual(brevo.requests, [])
+        
+        # The heat spreads to George Town: only its farmers are emailed
+        summary, owm, brevo = self.run_digest({3, 5})
+        self.assertEqual((summary['changed'], summary['notified']), (1, 1))
+        self.assertEqual(sorted(email['email'] for email in brevo.emails),
+                         ['farmer3@example.com', 'farmer4@example.com'])
+        
+        # Kuala Lumpur cools down: the state is updated without an email
+        summary, owm, brevo = self.run_digest({5})
+        self.assertEqual((summary['changed'], summary['notified']), (1, 0))
+        self.assertEqual(brevo.requests, [])
+        self.assertEqual(CellAlertState.objects.get(cell_lat=3.14).signature, [])
+        self.assertEqual(CellAlertState.objects.get(cell_lat=5.41).signature, ['heat_warning:high'])
+    
+    def test_unavailable_cells_keep_their_state(self):
+        """A failed weather fetch is not treated as an all-clear."""
+        create_farmers([(3.139, 101.687)])
+        self.run_digest({3})
+        
+        with OpenWeatherStubServer(status=500), self.settings(HTTP_RETRIES=0, HTTP_BACKOFF_BASE=0):
+            summary = run_alert_digest()
+        
+        self.assertEqual((summary['unavailable'], summary['changed']), (1, 0))
+        self.assertEqual(CellAlertState.objects.get().signature, ['heat_warning:high'])
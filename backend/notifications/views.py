@@ -5,38 +5,48 @@ Admin-only endpoints for sending automated weather alerts to farmers.
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
 from accounts.permissions import IsAdminUser
 from accounts.models import User
 from .models import WeatherAlertNotification, EmailLog
 from .services import (
+    alert_recipients,
     send_weather_alerts_to_all_users,
     send_weather_alerts_to_specific_users,
-    get_weather_for_location
+    get_weather_for_users
 )
 
 
+class EligibleUsersPagination(PageNumberPagination):
+    """Pages of eligible users (?page=N&page_size=M)."""
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
 class AlertEligibleUsersView(APIView):
     """
-    GET: List all users eligible for weather alerts.
+    GET: List users eligible for weather alerts, one page at a time.
     (Users with email alerts enabled AND location set)
     Admin only.
+    
+    The weather preview of a page is fetched once per location cell,
+    concurrently and through the shared weather cache.
     """
     permission_classes = [IsAdminUser]
     
     def get(self, request):
         # Users with email alerts and location
-        users = User.objects.filter(
-            is_active=True,
-            receive_email_alerts=True,
-            location_lat__isnull=False,
-            location_lon__isnull=False
-        ).exclude(email='').order_by('username')
+        users = alert_recipients().order_by('username', 'id')
+        
+        paginator = EligibleUsersPagination()
+        page = paginator.paginate_queryset(users, request, view=self)
+        weather_by_user = get_weather_for_users(page)
         
         user_list = []
-        for user in users:
-            # Optionally fetch weather preview
-            weather = get_weather_for_location(user.location_lat, user.location_lon)
+        for user in page:
+            weather = weather_by_user.get(user.id)
             user_list.append({
                 'id': user.id,
                 'username': user.username,
@@ -65,7 +75,9 @@ class AlertEligibleUsersView(APIView):
         
         return Response({
             'eligible_users': {
-                'count': len(user_list),
+                'count': paginator.page.paginator.count,
+                'next': paginator.get_next_link(),
+                'previous': paginator.get_previous_link(),
                 'users': user_list
             },
             'users_without_location': {
@@ -130,6 +142,8 @@ class AlertHistoryView(APIView):
             'created_by': alert.created_by.username if alert.created_by else 'System',
             'created_at': alert.created_at.isoformat(),
             'emails_sent_count': alert.emails_sent_count,
+            'emails_failed_count': alert.emails_failed_count,
+            'completed_at': alert.completed_at.isoformat() if alert.completed_at else None,
             'target_all_users': alert.target_all_users
         } for alert in alerts]
         
@@ -166,6 +180,9 @@ class AlertDetailView(APIView):
                 'created_by': alert.created_by.username if alert.created_by else 'System',
                 'created_at': alert.created_at.isoformat(),
                 'emails_sent_count': alert.emails_sent_count,
+                'emails_failed_count': alert.emails_failed_count,
+                'emails_pending_count': alert.email_logs.filter(status__in=['pending', 'sending']).count(),
+                'completed_at': alert.completed_at.isoformat() if alert.completed_at else None,
                 'target_all_users': alert.target_all_users
             },
             'email_logs': [{
@@ -0,0 +1,99 @@
+"""
+Cache of recommendation results for repeated soil inputs.
+
+Identical soil readings (same integrity hash) scored by the same model
+version always produce the same crop, confidence and explanation, so
+these are computed once and reused. Entries are keyed by
+(model_version, integrity_hash), so results of an older model version are
+never served. Results are shared by the worker processes through the
+shared cache tier (see securecrop.cache); after a model swap, older
+entries there are left to expire (TTL) or be evicted, so workers that
+pick up the new version later keep the entries already written for it.
+"""
+
+import threading
+
+from django.conf import settings
+
+from securecrop.cache import TieredCache
+
+
+_prediction_cache = TieredCache(
+    'predictions',
+    maxsize=getattr(settings, 'PREDICTION_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'PREDICTION_CACHE_TTL', 3600)
+)
+
+# Model version the cached entries belong to
+_cached_version = None
+_version_lock = threading.Lock()
+
+
+def _check_version(model_version):
+    """Drop this process's entries when the active model version changes."""
+    global _cached_version
+    
+    if model_version == _cached_version:
+        return
+    
+    with _version_lock:
+        if model_version != _cached_version:
+            # The shared tier is kept: other workers may already cache the new version there
+            _prediction_cache.local.clear()
+            _cached_version = model_version
+
+
+def get_cached_prediction(model_version, integrity_hash):
+    """
+    Look up a cached recommendation result.
+    
+    Args:
+        model_version: Version of the model bundle serving the request
+        integrity_hash: SoilInput.integrity_hash of the input
+    
+    Returns:
+        dict or None: {'crop_name', 'probability', 'explanation'}
+    """
+    if not integrity_hash or not getattr(settings, 'PREDICTION_CACHE_ENABLED', True):
+        return None
+    
+    _check_version(model_version)
+    return _prediction_cache.get((model_version, integrity_hash))
+
+
+def cache_prediction(model_version, integrity_hash, crop_name, probability, explanation):
+    """
+    Store a recommendation result for later identical inputs.
+    
+    Args:
+        model_version: Version of the model bundle that produced the result
+        integrity_hash: SoilInput.integrity_hash of the input
+        crop_name: Predicted crop
+        probability: Prediction confidence (0-1)
+        explanation: XAI explanation text
+    """
+    if not integrity_hash or not getattr(settings, 'PREDICTION_CACHE_ENABLED', True):
+        return
+    
+    _check_version(model_version)
+    _prediction_cache.set((model_version, integrity_hash), {
+        'crop_name': crop_name,
+        'probability': probability,
+        'explanation': explanation,
+    })
+
+
+def get_prediction_cache_stats():
+    """Return hit/miss statistics of the prediction cache."""
+    stats = _prediction_cache.stats()
+    stats['model_version'] = _cached_version
+    return stats
+
+
+def clear_prediction_cache():
+    """Remove every cached result."""
+    global _cached_version
+    
+    with _version_lock:
+        _prediction_cache.clear()
+        _cached_version = None
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recommendation',
+            name='model_version',
+            field=models.CharField(blank=True, default='', help_text='Model bundle version that produced this recommendation', max_length=64),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0002_recommendation_model_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recommendation',
+            name='farming_guide',
+            field=models.JSONField(blank=True, help_text='AI-generated farming guide', null=True),
+        ),
+        migrations.AddField(
+            model_name='recommendation',
+            name='farming_guide_status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('READY', 'Ready'), ('FAILED', 'Failed')], default='PENDING', max_length=10),
+        ),
+    ]
@@ -13,9 +13,18 @@ class Recommendation(models.Model):
     - input: Related soil input data
     - crop_name: Recommended crop
     - explanation: XAI-generated explanation
+    - model_version: Version of the model bundle that produced it
+    - farming_guide: AI farming guide (generated in the background)
+    - farming_guide_status: PENDING until the guide is stored
     - created_at: Timestamp of recommendation
     """
     
+    GUIDE_STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('READY', 'Ready'),
+        ('FAILED', 'Failed'),
+    ]
+    
     input = models.ForeignKey(
         SoilInput,
         on_delete=models.CASCADE,
@@ -23,6 +32,18 @@ class Recommendation(models.Model):
     )
     crop_name = models.CharField(max_length=100, help_text='Recommended crop name')
     explanation = models.TextField(help_text='XAI explanation for the recommendation')
+    model_version = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        help_text='Model bundle version that produced this recommendation'
+    )
+    farming_guide = models.JSONField(null=True, blank=True, help_text='AI-generated farming guide')
+    farming_guide_status = models.CharField(
+        max_length=10,
+        choices=GUIDE_STATUS_CHOICES,
+        default='PENDING'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
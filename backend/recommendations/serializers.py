@@ -14,5 +14,38 @@ class RecommendationSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Recommendation
-        fields = ['id', 'input', 'soil_input', 'user_email', 'crop_name', 'explanation', 'created_at']
-        read_only_fields = ['id', 'created_at']
+        fields = [
+            'id', 'input', 'soil_input', 'user_email', 'crop_name', 'explanation', 'model_version',
+            'farming_guide', 'farming_guide_status', 'created_at'
+        ]
+        read_only_fields = ['id', 'model_version', 'farming_guide', 'farming_guide_status', 'created_at']
+    
+    # Columns read when serializing, including the nested soil input's
+    query_fields = (
+        'id', 'input', 'crop_name', 'explanation', 'model_version',
+        'farming_guide', 'farming_guide_status', 'created_at'
+    ) + tuple(f"input__{field}" for field in SoilInputSerializer.query_fields)
+    
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """
+        Join the soil input and its user and load only the serialized columns.
+        
+        Args:
+            queryset: Recommendation queryset
+        
+        Returns:
+            QuerySet: Serializable without further queries per row
+        """
+        return queryset.select_related('input__user').only(*cls.query_fields)
+
+
+class FarmingGuideSerializer(serializers.ModelSerializer):
+    """Serializer for polling a recommendation's farming guide."""
+    
+    recommendation_id = serializers.IntegerField(source='id', read_only=True)
+    
+    class Meta:
+        model = Recommendation
+        fields = ['recommendation_id', 'crop_name', 'farming_guide_status', 'farming_guide']
+        read_only_fields = fields
@@ -2,8 +2,10 @@
 Service functions for creating and managing recommendations.
 """
 from .models import Recommendation
-from ml_engine.services import load_model, predict_crop
-from explainable_ai.services import generate_explanation
+from .cache import get_cached_prediction, cache_prediction
+from ml_engine.registry import get_bundle
+from ml_engine.services import score_inputs
+from explainable_ai.services import generate_explanations_batch
 from cyber_layer.services import post_ml_checks
 
 
@@ -12,11 +14,11 @@ def create_recommendation_for_input(soil_input):
     Create a crop recommendation for the given soil input.
     
     Steps:
-    1. Load ML model
-    2. Predict crop and confidence
-    3. Generate XAI explanation
-    4. Run post-ML security checks
-    5. Save and return recommendation
+    1. Load the active model bundle (one version for the whole pipeline)
+    2. Reuse the cached result for an identical input, or
+       predict crop and confidence and generate the XAI explanation
+    3. Run post-ML security checks
+    4. Save and return recommendation
     
     Args:
         soil_input: SoilInput instance
@@ -24,14 +26,28 @@ def create_recommendation_for_input(soil_input):
     Returns:
         Recommendation instance
     """
-    # Load the trained model
-    model = load_model()
+    # Load the active model bundle
+    bundle = get_bundle()
     
-    # Predict crop
-    crop_name, probability = predict_crop(soil_input, model)
-    
-    # Generate XAI explanation
-    explanation = generate_explanation(model, soil_input)
+    cached = get_cached_prediction(bundle.version, soil_input.integrity_hash)
+    if cached is not None:
+        crop_name = cached['crop_name']
+        probability = cached['probability']
+        explanation = cached['explanation']
+    else:
+        # Predict crop (uses the compiled forest when available)
+        scores = score_inputs([soil_input.to_feature_array()], bundle=bundle)
+        crop_name = scores['crop_names'][0]
+        probability = scores['probabilities'][0]
+        
+        # Generate XAI explanation from the same scaled features and class
+        explanation = generate_explanations_batch(
+            bundle.rf_model, [soil_input], bundle,
+            features_scaled=scores['features_scaled'],
+            class_indices=scores['class_indices']
+        )[0]
+        
+        cache_prediction(bundle.version, soil_input.integrity_hash, crop_name, probability, explanation)
     
     # Run post-ML security checks
     post_ml_checks(crop_name, probability, soil_input)
@@ -40,7 +56,77 @@ def create_recommendation_for_input(soil_input):
     recommendation = Recommendation.objects.create(
         input=soil_input,
         crop_name=crop_name,
-        explanation=explanation
+        explanation=explanation,
+        model_version=bundle.version
     )
     
     return recommendation
+
+
+def create_recommendations_for_inputs(soil_inputs):
+    """
+    Create crop recommendations for many saved soil inputs at once.
+    
+    Inputs with a cached result are served from the cache; predictions for
+    the rest are computed in a single vectorized pass. The Recommendation
+    rows are inserted with one bulk_create.
+    
+    Args:
+        soil_inputs: List of saved SoilInput instances
+        
+    Returns:
+        list: (Recommendation, probability) tuples in the same order as soil_inputs
+    """
+    if not soil_inputs:
+        return []
+    
+    # Load the active model bundle
+    bundle = get_bundle()
+    
+    # Split inputs into cache hits and inputs that need a prediction
+    results = [
+        get_cached_prediction(bundle.version, soil_input.integrity_hash)
+        for soil_input in soil_inputs
+    ]
+    missing = [index for index, cached in enumerate(results) if cached is None]
+    
+    # Predict crops for the uncached inputs in one pass
+    if missing:
+        missing_inputs = [soil_inputs[index] for index in missing]
+        scores = score_inputs(
+            [soil_input.to_feature_array() for soil_input in missing_inputs],
+            bundle=bundle
+        )
+        
+        # Generate XAI explanations for the whole batch
+        explanations = generate_explanations_batch(
+            bundle.rf_model, missing_inputs, bundle,
+            features_scaled=scores['features_scaled'],
+            class_indices=scores['class_indices']
+        )
+        
+        for index, soil_input, crop_name, probability, explanation in zip(
+            missing, missing_inputs, scores['crop_names'], scores['probabilities'], explanations
+        ):
+            cache_prediction(bundle.version, soil_input.integrity_hash, crop_name, probability, explanation)
+            results[index] = {
+                'crop_name': crop_name,
+                'probability': probability,
+                'explanation': explanation,
+            }
+    
+    recommendations = []
+    for soil_input, result in zip(soil_inputs, results):
+        # Run post-ML security checks
+        post_ml_checks(result['crop_name'], result['probability'], soil_input)
+        
+        recommendations.append(Recommendation(
+            input=soil_input,
+            crop_name=result['crop_name'],
+            explanation=result['explanation'],
+            model_version=bundle.version
+        ))
+    
+    recommendations = Recommendation.objects.bulk_create(recommendations)
+    
+    return list(zip(recommendations, [result['probability'] for result in results]))
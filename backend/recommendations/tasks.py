@@ -0,0 +1,128 @@
+"""
+Background generation of AI farming guides.
+
+Gemini calls can take up to their 30s timeout, so they run on a small
+thread pool instead of in the request. The recommendation is returned
+immediately with farming_guide_status='PENDING' and the client polls
+GET /api/recommendations/<id>/farming-guide/ until the guide is READY.
+
+Jobs are submitted after the surrounding transaction commits so the
+worker thread can read the recommendation. With FARMING_GUIDE_ASYNC=False
+(tests, management commands) guides are generated inline.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import Recommendation
+from explainable_ai.services import get_farming_guide, get_cached_farming_guide
+
+
+# Created on first use so no threads exist before gunicorn forks workers
+_executor = None
+_executor_lock = threading.Lock()
+
+# Recommendation ids with a job queued or running
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'FARMING_GUIDE_WORKERS', 2),
+                thread_name_prefix='farming-guide'
+            )
+        return _executor
+
+
+def _store_guide(recommendation_id, farming_guide, status):
+    Recommendation.objects.filter(id=recommendation_id).update(
+        farming_guide=farming_guide,
+        farming_guide_status=status
+    )
+
+
+def generate_farming_guide(recommendation_id):
+    """
+    Generate and store the farming guide of one recommendation.
+    
+    Args:
+        recommendation_id: Primary key of the Recommendation
+    
+    Returns:
+        dict or None: The stored guide (None if the recommendation is gone
+            or generation failed)
+    """
+    try:
+        recommendation = Recommendation.objects.select_related('input').get(id=recommendation_id)
+        farming_guide = get_farming_guide(recommendation.crop_name, recommendation.input)
+        _store_guide(recommendation_id, farming_guide, 'READY')
+        return farming_guide
+    except Recommendation.DoesNotExist:
+        return None
+    except Exception as e:
+        print(f"AI farming guide error: {e}")
+        _store_guide(recommendation_id, None, 'FAILED')
+        return None
+    finally:
+        with _in_flight_lock:
+            _in_flight.discard(recommendation_id)
+
+
+def _run_in_background(recommendation_id):
+    try:
+        return generate_farming_guide(recommendation_id)
+    finally:
+        # Worker threads get their own DB connection; do not leak it
+        connection.close()
+
+
+def submit_farming_guide(recommendation_id):
+    """
+    Queue guide generation for a recommendation (at most one job per id).
+    
+    Returns:
+        Future or None: None if a job for this id is already queued
+    """
+    with _in_flight_lock:
+        if recommendation_id in _in_flight:
+            return None
+        _in_flight.add(recommendation_id)
+    
+    return _get_executor().submit(_run_in_background, recommendation_id)
+
+
+def schedule_farming_guide(recommendation):
+    """
+    Make sure a recommendation gets its farming guide.
+    
+    A guide cached for the same crop and soil profile is stored right away;
+    otherwise generation is queued (or run inline when FARMING_GUIDE_ASYNC
+    is off).
+    
+    Args:
+        recommendation: Saved Recommendation instance
+    
+    Returns:
+        dict or None: The guide if it is already available, else None
+    """
+    farming_guide = get_cached_farming_guide(recommendation.crop_name, recommendation.input)
+    if farming_guide is not None:
+        _store_guide(recommendation.id, farming_guide, 'READY')
+    elif not getattr(settings, 'FARMING_GUIDE_ASYNC', True):
+        farming_guide = generate_farming_guide(recommendation.id)
+    else:
+        recommendation_id = recommendation.id
+        transaction.on_commit(lambda: submit_farming_guide(recommendation_id))
+        return None
+    
+    recommendation.farming_guide = farming_guide
+    recommendation.farming_guide_status = 'READY' if farming_guide is not None else 'FAILED'
+    return farming_guide
@@ -1,3 +1,367 @@
-from django.test import TestCase
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache as django_cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from explainable_ai.services import clear_farming_guide_cache
+from explainable_ai.tests import GeminiStubServer
+from ml_engine.tests import TrainedModelsMixin
+from securecrop.cache import LRUCache, SharedStore, TieredCache
+from soil.models import SoilInput
+from . import cache, services, tasks
+from .models import Recommendation
+
+
+class LRUCacheTest(TestCase):
+    """Test cases for the bounded LRU/TTL cache."""
+    
+    def test_evicts_least_recently_used(self):
+        """The oldest untouched entry is evicted first."""
+        lru = LRUCache(maxsize=2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.stats()['evictions'], 1)
+    
+    def test_entries_expire(self):
+        """Entries older than the TTL are misses."""
+        lru = LRUCache(maxsize=2, ttl=0.01)
+        lru.set('a', 1)
+        time.sleep(0.02)
+        self.assertIsNone(lru.get('a'))
+        self.assertEqual(lru.stats()['misses'], 1)
+    
+    def test_evicts_by_size(self):
+        """Entries are evicted once their sizes exceed maxbytes."""
+        lru = LRUCache(maxsize=10, maxbytes=100)
+        lru.set('a', 1, size=60)
+        lru.set('b', 2, size=30)
+        lru.set('c', 3, size=30)
+        self.assertIsNone(lru.get('a'))
+        self.assertEqual(lru.stats()['bytes'], 60)
+
+
+def _read_shared(path, key, reads, results):
+    """Read key repeatedly from a worker process's own SharedStore."""
+    store = SharedStore(path)
+    start = time.monotonic()
+    hits = sum(store.get(key) is not None for _ in range(reads))
+    results.put((hits, time.monotonic() - start))
+
+
+class TieredCacheTest(TestCase):
+    """Test cases for the in-process + shared cache tiers."""
+    
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache.sqlite3')
+        self.store = SharedStore(self.path, max_bytes=10000)
+    
+    def test_workers_share_entries(self):
+        """A value cached by one process is read from the shared tier by another."""
+        TieredCache('weather', store=self.store).set(('cell', 3.14), {'temp': 31})
+        
+        # A recycled worker: new local tier and store connection on the same file
+        other = TieredCache('weather', store=SharedStore(self.path))
+        self.assertEqual(other.get(('cell', 3.14)), {'temp': 31})
+        self.assertEqual(other.get(('cell', 3.14)), {'temp': 31})
+        stats = other.stats()
+        self.assertEqual((stats['hits'], stats['shared_hits'], stats['local_hits']), (2, 1, 1))
+    
+    def test_namespaces_are_separate(self):
+        """Equal keys in two namespaces do not collide, and clear() is per namespace."""
+        predictions = TieredCache('predictions', store=self.store)
+        guides = TieredCache('farming_guides', store=self.store)
+        predictions.set('key', 'rice')
+        guides.set('key', 'guide')
+        
+        predictions.clear()
+        self.assertIsNone(TieredCache('predictions', store=self.store).get('key'))
+        self.assertEqual(TieredCache('farming_guides', store=self.store).get('key'), 'guide')
+        self.assertEqual(list(self.store.stats()['namespaces']), ['farming_guides'])
+    
+    def test_shared_tier_evicts_least_recently_read(self):
+        """Writes past max_bytes evict expired, then least recently read entries."""
+        cache = TieredCache('blobs', store=self.store)
+        for index in range(3):
+            cache.set(index, b'x' * 3000)
+            time.sleep(0.01)
+        cache.local.clear()
+        cache.get(0)  # Recently read, so kept
+        cache.set(3, b'x' * 3000)
+        
+        stats = self.store.stats()
+        self.assertLessEqual(stats['bytes'], 10000)
+        self.assertGreater(stats['evictions'], 0)
+        cache.local.clear()
+        self.assertIsNotNone(cache.get(0))
+        self.assertIsNone(cache.get(1))
+    
+    def test_hits_do_not_take_the_write_lock(self):
+        """Two processes read a hot key while another connection holds the write lock."""
+        self.store.set('weather:hot', b'31')
+        accessed_at = sqlite3.connect(self.path).execute('SELECT accessed_at FROM cache_entries').fetchone()
+        
+        writer = sqlite3.connect(self.path, isolation_level=None)
+        writer.execute('BEGIN IMMEDIATE')
+        try:
+            context = multiprocessing.get_context('fork')
+            results = context.Queue()
+            readers = [
+                context.Process(target=_read_shared, args=(self.path, 'weather:hot', 50, results))
+                for _ in range(2)
+            ]
+            for reader in readers:
+                reader.start()
+            outcomes = [results.get(timeout=10) for _ in readers]
+            for reader in readers:
+                reader.join()
+        finally:
+            writer.execute('ROLLBACK')
+            writer.close()
+        
+        # A read that needed the write lock would wait out the 5s busy timeout and miss
+        for hits, elapsed in outcomes:
+            self.assertEqual(hits, 50)
+            self.assertLess(elapsed, 2)
+        self.assertEqual(
+            sqlite3.connect(self.path).execute('SELECT accessed_at FROM cache_entries').fetchone(),
+            accessed_at
+        )
+    
+    def test_store_file_is_private(self):
+        """The store is created user-only and refuses a file others can write."""
+        self.store.set('weather:cell', b'31')
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+        
+        os.chmod(self.path, 0o666)
+        planted = SharedStore(self.path)
+        self.assertIsNone(planted.get('weather:cell'))
+        planted.set('weather:cell', b'pickle')
+        os.chmod(self.path, 0o600)
+        self.assertEqual(SharedStore(self.path).get('weather:cell')[0], b'31')
+    
+    def test_expiry_applies_to_both_tiers(self):
+        """Expired shared entries are misses in every process."""
+        TieredCache('weather', ttl=0.05, store=self.store).set('cell', 1)
+        time.sleep(0.1)
+        self.assertIsNone(TieredCache('weather', store=self.store).get('cell'))
+    
+    def test_django_cache_backend(self):
+        """CACHES uses the tiered backend."""
+        django_cache.clear()
+        self.assertTrue(django_cache.add('answer', 42, timeout=60))
+        self.assertFalse(django_cache.add('answer', 43))
+        self.assertEqual(django_cache.get('answer'), 42)
+        django_cache.set('gone', 1, timeout=0)
+        self.assertIsNone(django_cache.get('gone'))
+        self.assertTrue(django_cache.delete('answer'))
+        self.assertIsNone(django_cache.get('answer'))
+
+
+class RecommendationListQueryTest(TestCase):
+    """Listing recommendations costs the same queries however many rows a page has."""
+    
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email='listadmin@example.com', username='listadmin', password='testpass123', role='ADMIN'
+        )
+        self.farmers = [
+            User.objects.create_user(email=f"farmer{index}@example.com", username=f"farmer{index}",
+                                     password='testpass123')
+            for index in range(3)
+        ]
+        self.client = APIClient()
+    
+    def add_recommendations(self, count):
+        for index in range(count):
+            soil_input = SoilInput.objects.create(
+                user=self.farmers[index % len(self.farmers)],
+                N_level=80, P_level=45, K_level=40, ph=6.5, moisture=60, temperature=24
+            )
+            Recommendation.objects.create(input=soil_input, crop_name='rice', explanation='test')
+    
+    def test_constant_queries_per_page(self):
+        """A count and one joined page query, for a page of 2 or of 20."""
+        self.client.force_authenticate(self.admin)
+        for count, page_size in [(2, 2), (28, 20)]:
+            self.add_recommendations(count)
+            with self.assertNumQueries(2):
+                response = self.client.get(reverse('recommendation-list'))
+            self.assertEqual(len(response.data['results']), page_size)
+        
+        first = response.data['results'][0]
+        self.assertEqual(first['user_email'], first['soil_input']['user_email'])
+        self.assertIn(first['soil_input']['user_username'], [farmer.username for farmer in self.farmers])
+    
+    def test_farmer_list_and_detail(self):
+        """A farmer's own listing and a detail view do not query per row either."""
+        self.add_recommendations(12)
+        self.client.force_authenticate(self.farmers[0])
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('recommendation-list'))
+        self.assertEqual(response.data['count'], 4)
+        
+        with self.assertNumQueries(1):
+            detail = self.client.get(reverse('recommendation-detail', args=[response.data['results'][0]['id']]))
+        self.assertEqual(detail.data['user_email'], self.farmers[0].email)
+
+
+class PredictionCacheTest(TrainedModelsMixin, TestCase):
+    """Test cases for reusing results of repeated soil inputs."""
+    
+    def setUp(self):
+        cache.clear_prediction_cache()
+        self.user = User.objects.create_user(
+            email='cache@example.com',
+            username='cacheuser',
+            password='testpass123'
+        )
+    
+    def create_input(self, integrity_hash='abc123'):
+        return SoilInput.objects.create(
+            user=self.user, N_level=80, P_level=45, K_level=40,
+            ph=6.5, moisture=80, temperature=24, integrity_hash=integrity_hash
+        )
+    
+    def test_repeat_input_skips_pipeline(self):
+        """An identical input is served from the cache without predicting again."""
+        first = services.create_recommendation_for_input(self.create_input())
+        
+        with mock.patch.object(services, 'score_inputs') as predict, \
+                mock.patch.object(services, 'generate_explanations_batch') as explain:
+            second = services.create_recommendation_for_input(self.create_input())
+            predict.assert_not_called()
+            explain.assert_not_called()
+        
+        self.assertEqual(second.crop_name, first.crop_name)
+        self.assertEqual(second.explanation, first.explanation)
+        stats = cache.get_prediction_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+    
+    def test_batch_uses_cache(self):
+        """Batch requests only predict inputs that are not cached."""
+        services.create_recommendation_for_input(self.create_input('cached'))
+        
+        inputs = [self.create_input('cached'), self.create_input('new')]
+        with mock.patch.object(services, 'score_inputs', wraps=services.score_inputs) as batch:
+            results = services.create_recommendations_for_inputs(inputs)
+            self.assertEqual(len(batch.call_args[0][0]), 1)
+        self.assertEqual(len(results), 2)
+    
+    def test_version_change_invalidates(self):
+        """Entries of an older model version are dropped from the process."""
+        cache.cache_prediction('v1', 'abc123', 'rice', 0.9, 'text')
+        self.assertIsNotNone(cache.get_cached_prediction('v1', 'abc123'))
+        self.assertIsNone(cache.get_cached_prediction('v2', 'abc123'))
+        self.assertEqual(cache.get_prediction_cache_stats()['size'], 0)
+    
+    def test_version_change_keeps_shared_entries(self):
+        """A worker picking up a new version keeps what other workers cached for it."""
+        cache.cache_prediction('v1', 'abc123', 'rice', 0.9, 'text')
+        # A worker already on v2 caches its result in the shared tier
+        TieredCache('predictions').set(('v2', 'abc123'), {'crop_name': 'maize', 'probability': 0.8,
+                                                          'explanation': 'text'})
+        
+        self.assertEqual(cache.get_cached_prediction('v2', 'abc123')['crop_name'], 'maize')
+        self.assertEqual(cache.get_prediction_cache_stats()['model_version'], 'v2')
+
+
+SOIL_SAMPLE = {'N_level': 80, 'P_level': 45, 'K_level': 40, 'ph': 6.5, 'moisture': 80, 'temperature': 24}
+
+
+@override_settings(FARMING_GUIDE_ASYNC=False)
+class FarmingGuideTest(TrainedModelsMixin, TestCase):
+    """Test cases for storing and polling farming guides."""
+    
+    def setUp(self):
+        clear_farming_guide_cache()
+        self.user = User.objects.create_user(
+            email='guide@example.com',
+            username='guideuser',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def test_guide_stored_on_recommendation(self):
+        """The generated guide is stored and served by the poll endpoint."""
+        with GeminiStubServer() as gemini:
+            response = self.client.post(reverse('soil-input-create'), SOIL_SAMPLE, format='json')
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.data['farming_guide_status'], 'READY')
+            
+            poll = self.client.get(response.data['farming_guide_url'])
+        
+        self.assertEqual(poll.status_code, 200)
+        self.assertEqual(poll.data['farming_guide']['source'], 'gemini_ai')
+        self.assertEqual(len(gemini.requests), 1)
+    
+    def test_cached_guide_skips_gemini(self):
+        """A second input with the same crop and soil profile hits the cache."""
+        with GeminiStubServer() as gemini:
+            self.client.post(reverse('soil-input-create'), SOIL_SAMPLE, format='json')
+            response = self.client.post(
+                reverse('soil-input-create'), dict(SOIL_SAMPLE, N_level=82), format='json'
+            )
+        self.assertEqual(response.data['farming_guide']['source'], 'gemini_ai')
+        self.assertEqual(len(gemini.requests), 1)
+
+
+class AsyncFarmingGuideTest(TrainedModelsMixin, TransactionTestCase):
+    """Test cases for background farming guide generation."""
+    
+    def setUp(self):
+        clear_farming_guide_cache()
+        self.user = User.objects.create_user(
+            email='async@example.com',
+            username='asyncuser',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def test_recommendation_returned_before_guide(self):
+        """A slow Gemini call does not delay the response; the guide is polled."""
+        with GeminiStubServer(delay=1.0) as gemini:
+            start = time.monotonic()
+            response = self.client.post(reverse('soil-input-create'), SOIL_SAMPLE, format='json')
+            self.assertLess(time.monotonic() - start, gemini.delay)
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.data['farming_guide_status'], 'PENDING')
+            self.assertIsNone(response.data['farming_guide'])
+            
+            deadline = time.monotonic() + 10
+            poll = self.client.get(response.data['farming_guide_url'])
+            while poll.status_code == 202 and time.monotonic() < deadline:
+                time.sleep(0.05)
+                poll = self.client.get(response.data['farming_guide_url'])
+        
+        self.assertEqual(poll.status_code, 200)
+        self.assertEqual(poll.data['farming_guide_status'], 'READY')
+        self.assertEqual(len(gemini.requests), 1)
+    
+    def test_one_job_per_recommendation(self):
+        """Repeated polls do not queue duplicate jobs."""
+        with GeminiStubServer(delay=0.3) as gemini:
+            response = self.client.post(reverse('soil-input-create'), SOIL_SAMPLE, format='json')
+            recommendation_id = response.data['recommendation']['id']
+            self.assertIsNone(tasks.submit_farming_guide(recommendation_id))
+            
+            deadline = time.monotonic() + 10
+            while (Recommendation.objects.get(id=recommendation_id).farming_guide_status == 'PENDING'
+                   and time.monotonic() < deadline):
+                time.sleep(0.05)
+        self.assertEqual(len(gemini.requests), 1)
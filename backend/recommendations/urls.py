@@ -2,9 +2,16 @@
 URL configuration for recommendations app.
 """
 from django.urls import path
-from .views import RecommendationListView, RecommendationDetailView
+from .views import (
+    RecommendationListView,
+    RecommendationDetailView,
+    FarmingGuideView,
+    PredictionCacheStatsView
+)
 
 urlpatterns = [
     path('', RecommendationListView.as_view(), name='recommendation-list'),
     path('<int:pk>/', RecommendationDetailView.as_view(), name='recommendation-detail'),
+    path('<int:pk>/farming-guide/', FarmingGuideView.as_view(), name='recommendation-farming-guide'),
+    path('cache-stats/', PredictionCacheStatsView.as_view(), name='prediction-cache-stats'),
 ]
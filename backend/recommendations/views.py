@@ -1,11 +1,17 @@
 """
 Views for crop recommendations.
 """
-from rest_framework import generics
+from django.conf import settings
+from rest_framework import generics, status
+from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from .models import Recommendation
-from .serializers import RecommendationSerializer
+from .serializers import RecommendationSerializer, FarmingGuideSerializer
+from .cache import get_prediction_cache_stats
+from .tasks import submit_farming_guide, generate_farming_guide
 from accounts.permissions import IsAdminUser
+from explainable_ai.services import get_farming_guide_cache_stats
+from securecrop.cache import get_shared_store
 
 
 class RecommendationListView(generics.ListAPIView):
@@ -21,9 +27,10 @@ class RecommendationListView(generics.ListAPIView):
     
     def get_queryset(self):
         user = self.request.user
+        queryset = RecommendationSerializer.setup_eager_loading(Recommendation.objects.all())
         if user.role == 'ADMIN':
-            return Recommendation.objects.all()
-        return Recommendation.objects.filter(input__user=user)
+            return queryset
+        return queryset.filter(input__user=user)
 
 
 class RecommendationDetailView(generics.RetrieveAPIView):
@@ -35,8 +42,64 @@ class RecommendationDetailView(generics.RetrieveAPIView):
     serializer_class = RecommendationSerializer
     permission_classes = [IsAuthenticated]
     
+    def get_queryset(self):
+        user = self.request.user
+        queryset = RecommendationSerializer.setup_eager_loading(Recommendation.objects.all())
+        if user.role == 'ADMIN':
+            return queryset
+        return queryset.filter(input__user=user)
+
+
+class FarmingGuideView(generics.RetrieveAPIView):
+    """
+    API endpoint to poll a recommendation's AI farming guide.
+    
+    GET /api/recommendations/<id>/farming-guide/
+    - 200 with the guide once farming_guide_status is READY (or FAILED)
+    - 202 while the guide is still being generated
+    Recommendations without a queued job (e.g. from the batch endpoint)
+    get one queued on the first request.
+    """
+    serializer_class = FarmingGuideSerializer
+    permission_classes = [IsAuthenticated]
+    
     def get_queryset(self):
         user = self.request.user
         if user.role == 'ADMIN':
             return Recommendation.objects.all()
         return Recommendation.objects.filter(input__user=user)
+    
+    def retrieve(self, request, *args, **kwargs):
+        recommendation = self.get_object()
+        
+        if recommendation.farming_guide_status == 'PENDING':
+            if getattr(settings, 'FARMING_GUIDE_ASYNC', True):
+                submit_farming_guide(recommendation.id)
+            else:
+                generate_farming_guide(recommendation.id)
+            recommendation.refresh_from_db()
+        
+        response_status = (
+            status.HTTP_202_ACCEPTED
+            if recommendation.farming_guide_status == 'PENDING'
+            else status.HTTP_200_OK
+        )
+        return Response(self.get_serializer(recommendation).data, status=response_status)
+
+
+class PredictionCacheStatsView(generics.GenericAPIView):
+    """
+    Admin-only endpoint to get prediction cache statistics.
+    
+    GET /api/recommendations/cache-stats/
+    Statistics are per worker process, except 'shared' (the cache tier
+    shared by the workers of the host).
+    """
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        return Response({
+            'predictions': get_prediction_cache_stats(),
+            'farming_guides': get_farming_guide_cache_stats(),
+            'shared': get_shared_store().stats(),
+        })
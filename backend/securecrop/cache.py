@@ -0,0 +1,657 @@
+"""
+Caches shared by the SecureCrop apps.
+
+This module provides:
+1. LRUCache: a thread-safe, bounded (entries and bytes) LRU cache with
+   per-entry TTL, living in one worker process
+2. SharedStore: a size-bounded SQLite file shared by all workers of a
+   host, which survives worker recycling
+3. TieredCache: a namespaced LRUCache in front of the SharedStore, with
+   the LRUCache interface; the apps' caches are TieredCaches
+4. TieredDjangoCache: the Django cache backend (CACHES) over a TieredCache
+5. Hit/miss/eviction counters for monitoring
+6. SingleFlight: coalesces concurrent cache misses for the same key into
+   one upstream call
+
+A value computed by one worker is therefore reused by the others and by
+the workers that replace it after a max_requests recycle.
+"""
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+# Sentinel distinguishing "not cached" from a cached None
+MISSING = object()
+
+
+class LRUCache:
+    """
+    Bounded least-recently-used cache with expiry.
+    
+    Attributes:
+        maxsize: Maximum number of entries (oldest are evicted first)
+        ttl: Seconds an entry stays valid (None for no expiry)
+        maxbytes: Maximum total size of the entries, as given to set()
+            (None for no limit)
+        hits / misses / evictions: Counters since creation or last clear()
+    """
+    
+    def __init__(self, maxsize=1024, ttl=None, maxbytes=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key, default=None):
+        """
+        Return the cached value for key, or default if absent or expired.
+        
+        Args:
+            key: Hashable cache key
+            default: Value returned on a miss
+        """
+        with self._lock:
+            entry = self._data.get(key, MISSING)
+            if entry is not MISSING:
+                value, expires_at, _ = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+            self.misses += 1
+            return default
+    
+    def peek(self, key, default=None):
+        """Return the cached value without touching recency or counters."""
+        with self._lock:
+            entry = self._data.get(key, MISSING)
+            if entry is not MISSING:
+                value, expires_at, _ = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    return value
+            return default
+    
+    def set(self, key, value, ttl=None, size=0):
+        """
+        Store value under key, evicting the least recently used entries.
+        
+        Args:
+            key: Hashable cache key
+            value: Value to cache
+            ttl: Seconds this entry stays valid (default: the cache's ttl)
+            size: Size of the value in bytes, counted against maxbytes
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._remove(key)
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            while len(self._data) > self.maxsize or (self.maxbytes and self._bytes > self.maxbytes):
+                _, (_, _, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+    
+    def _remove(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+    
+    def delete(self, key):
+        """Remove key if present."""
+        with self._lock:
+            self._remove(key)
+    
+    def clear(self):
+        """Remove every entry and reset the counters."""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+    
+    def __len__(self):
+        return len(self._data)
+    
+    def stats(self):
+        """
+        Return cache statistics.
+        
+        Returns:
+            dict: size, maxsize, bytes, maxbytes, ttl, hits, misses,
+                evictions, hit_rate
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'bytes': self._bytes,
+                'maxbytes': self.maxbytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class _Call:
+    """An in-progress SingleFlight call that other threads can wait on."""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time.
+    
+    Threads asking for a key that is already being fetched wait for that
+    call and share its result (or exception) instead of fetching again.
+    
+    Attributes:
+        calls: Number of calls actually executed
+        shared: Number of callers served by another thread's call
+    """
+    
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+    
+    def do(self, key, fn):
+        """
+        Return fn(), unless a call for key is already running.
+        
+        Args:
+            key: Hashable key identifying the call
+            fn: Zero-argument callable producing the value
+        """
+        with self._lock:
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _Call()
+                self.calls += 1
+            else:
+                self.shared += 1
+        
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
+
+
+# Shared tier: one SQLite file per host, used by every worker process
+SHARED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_entries_accessed ON cache_entries (accessed_at);
+CREATE TABLE IF NOT EXISTS cache_size (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL);
+INSERT OR IGNORE INTO cache_size VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_entries_insert AFTER INSERT ON cache_entries
+BEGIN UPDATE cache_size SET bytes = bytes + NEW.size WHERE id = 0; END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_update AFTER UPDATE OF size ON cache_entries
+BEGIN UPDATE cache_size SET bytes = bytes - OLD.size + NEW.size WHERE id = 0; END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_delete AFTER DELETE ON cache_entries
+BEGIN UPDATE cache_size SET bytes = bytes - OLD.size WHERE id = 0; END;
+"""
+
+# Evictions bring the shared tier down to this fraction of its limit
+SHARED_EVICT_TO = 0.9
+
+# Pending read times are written back after this many keys, even within the interval
+SHARED_TOUCH_BATCH = 1000
+
+
+class SharedStore:
+    """
+    Size-bounded byte store in a SQLite file shared by the workers of a host.
+    
+    Entries survive worker recycling. The total size of the values is kept
+    by triggers; when a write takes it over max_bytes, expired entries and
+    then the least recently read ones are deleted. Errors (locked or full
+    disk) are logged and treated as misses, so the cache never fails a
+    request. ':memory:' keeps the store inside the process (test runner).
+    
+    Reads are plain SELECTs, so hits from every worker proceed in parallel
+    under WAL instead of queuing for SQLite's single writer lock. Read times
+    are collected in the process and written back in one batch on the
+    process's next write, or by a read once touch_interval has passed, so
+    recency for eviction is accurate to about touch_interval.
+    
+    Attributes:
+        path: SQLite file path, or ':memory:'
+        max_bytes: Maximum total size of the stored values
+        touch_interval: Seconds between write-backs of read times from reads
+        evictions: Entries evicted by this process
+    """
+    
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, touch_interval=60):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.touch_interval = touch_interval
+        self.evictions = 0
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._touched = {}
+        self._touched_flushed_at = time.time()
+    
+    def _connection(self):
+        # Connections are not shared with forked workers (gunicorn preload_app)
+        if self._conn is None or self._pid != os.getpid():
+            if self.path != ':memory:':
+                self._create_private_file()
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            if self.path != ':memory:':
+                conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            # The schema script writes; workers opening an existing file only read
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'cache_entries_delete'").fetchone() is None:
+                conn.executescript(SHARED_SCHEMA)
+            self._conn, self._pid = conn, os.getpid()
+            self._touched = {}
+        return self._conn
+    
+    def _create_private_file(self):
+        # Stored values are unpickled, so nobody else may be able to write them
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), mode=0o700, exist_ok=True)
+        os.close(os.open(self.path, os.O_CREAT | os.O_RDWR, 0o600))
+        info = os.stat(self.path)
+        if info.st_uid != os.getuid() or info.st_mode & 0o077:
+            raise sqlite3.DatabaseError(
+                f"{self.path} must be owned by this user and not accessible to others"
+            )
+    
+    def _run(self, fn, default=None):
+        with self._lock:
+            try:
+                return fn(self._connection())
+            except sqlite3.Error as e:
+                print(f"⚠️ Shared cache {self.path} unavailable: {e}")
+                return default
+    
+    def get(self, key):
+        """
+        Read a value.
+        
+        Returns:
+            tuple: (value bytes, expires_at epoch seconds or None), or None on a miss
+        """
+        def read(conn):
+            now = time.time()
+            row = conn.execute(
+                'SELECT value, expires_at FROM cache_entries WHERE key = ?', (key,)
+            ).fetchone()
+            # Expired entries are left for the next eviction to delete
+            if row is None or (row[1] is not None and row[1] <= now):
+                return None
+            self._touched[key] = now
+            if (now - self._touched_flushed_at >= self.touch_interval
+                    or len(self._touched) >= SHARED_TOUCH_BATCH):
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    self._flush_touched(conn)
+                    conn.execute('COMMIT')
+                except sqlite3.Error:
+                    conn.execute('ROLLBACK')
+                    raise
+            return row
+        
+        return self._run(read)
+    
+    def set(self, key, value, expires_at=None):
+        """
+        Store value bytes under key, evicting entries if over max_bytes.
+        
+        Args:
+            key: String key
+            value: bytes
+            expires_at: Epoch seconds the entry expires at (None for never)
+        """
+        def write(conn):
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute(
+                    'INSERT INTO cache_entries (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?) '
+                    'ON CONFLICT(key) DO UPDATE SET value = excluded.value, size = excluded.size, '
+                    'expires_at = excluded.expires_at, accessed_at = excluded.accessed_at',
+                    (key, value, len(value), expires_at, time.time())
+                )
+                self._flush_touched(conn)
+                if self._size(conn) > self.max_bytes:
+                    self._evict(conn)
+                conn.execute('COMMIT')
+            except sqlite3.Error:
+                conn.execute('ROLLBACK')
+                raise
+        
+        self._run(write)
+    
+    def delete(self, key):
+        """Remove key; return True if it was stored."""
+        return self._run(
+            lambda conn: conn.execute('DELETE FROM cache_entries WHERE key = ?', (key,)).rowcount > 0,
+            default=False
+        )
+    
+    def delete_prefix(self, prefix):
+        """Remove every key starting with prefix (a namespace); return the count."""
+        # Range scan on the primary key: prefix <= key < prefix with its last character incremented
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return self._run(
+            lambda conn: conn.execute(
+                'DELETE FROM cache_entries WHERE key >= ? AND key < ?', (prefix, upper)
+            ).rowcount,
+            default=0
+        )
+    
+    def clear(self):
+        """Remove every entry."""
+        self._run(lambda conn: conn.execute('DELETE FROM cache_entries'))
+    
+    def _flush_touched(self, conn):
+        # Write back the read times collected since the last flush (inside a write transaction)
+        touched, self._touched = self._touched, {}
+        self._touched_flushed_at = time.time()
+        conn.executemany(
+            'UPDATE cache_entries SET accessed_at = ? WHERE key = ? AND accessed_at < ?',
+            [(accessed_at, key, accessed_at) for key, accessed_at in touched.items()]
+        )
+    
+    def _size(self, conn):
+        return conn.execute('SELECT bytes FROM cache_size WHERE id = 0').fetchone()[0]
+    
+    def _evict(self, conn):
+        target = self.max_bytes * SHARED_EVICT_TO
+        self.evictions += conn.execute(
+            'DELETE FROM cache_entries WHERE expires_at IS NOT NULL AND expires_at <= ?', (time.time(),)
+        ).rowcount
+        excess = self._size(conn) - target
+        if excess <= 0:
+            return
+        # Least recently read entries, just enough of them to free the excess
+        keys = []
+        for key, size in conn.execute('SELECT key, size FROM cache_entries ORDER BY accessed_at'):
+            keys.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany('DELETE FROM cache_entries WHERE key = ?', keys)
+        self.evictions += len(keys)
+    
+    def stats(self):
+        """
+        Return shared tier statistics.
+        
+        Returns:
+            dict: path, entries, bytes, max_bytes, evictions (this process)
+                and per-namespace entries and bytes
+        """
+        def read(conn):
+            namespaces = {
+                namespace: {'entries': entries, 'bytes': size}
+                for namespace, entries, size in conn.execute(
+                    "SELECT substr(key, 1, instr(key, ':') - 1), COUNT(*), SUM(size) "
+                    "FROM cache_entries GROUP BY 1"
+                )
+            }
+            return {
+                'entries': sum(ns['entries'] for ns in namespaces.values()),
+                'bytes': self._size(conn),
+                'namespaces': namespaces,
+            }
+        
+        stats = {'path': self.path, 'max_bytes': self.max_bytes, 'evictions': self.evictions}
+        stats.update(self._run(read, default={'entries': None, 'bytes': None, 'namespaces': {}}))
+        return stats
+
+
+_shared_stores = {}
+_shared_stores_lock = threading.Lock()
+
+
+def get_shared_store(path=None, max_bytes=None):
+    """
+    Return the process-wide SharedStore for path.
+    
+    Args:
+        path: SQLite file (default CACHE_SHARED_PATH)
+        max_bytes: Size limit (default CACHE_SHARED_MAX_BYTES)
+    """
+    path = path or getattr(settings, 'CACHE_SHARED_PATH', ':memory:')
+    with _shared_stores_lock:
+        if path not in _shared_stores:
+            _shared_stores[path] = SharedStore(
+                path, max_bytes or getattr(settings, 'CACHE_SHARED_MAX_BYTES', 256 * 1024 * 1024),
+                touch_interval=getattr(settings, 'CACHE_SHARED_TOUCH_INTERVAL', 60)
+            )
+        return _shared_stores[path]
+
+
+class TieredCache:
+    """
+    Namespaced cache: a bounded in-process LRUCache in front of the shared store.
+    
+    Drop-in for LRUCache (get/peek/set/delete/clear/stats). Reads try the
+    process's LRU, then the shared store (promoting hits into the LRU);
+    writes go to both. Values are pickled for the shared tier, and values
+    that cannot be pickled stay in the LRU only. Keys are stored as
+    "namespace:repr(key)", so clear() only removes this namespace.
+    
+    Another worker's delete() or clear() is not seen by this process's LRU
+    until its entries expire; cache values derived from their inputs.
+    
+    Attributes:
+        namespace: Key prefix in the shared store (no ':')
+        local: The in-process LRUCache tier
+        hits / shared_hits / misses: Lookups served by either tier, by the
+            shared tier, and by neither
+    """
+    
+    def __init__(self, namespace, maxsize=1024, ttl=None, maxbytes=None, store=None):
+        self.namespace = namespace
+        self.ttl = ttl
+        maxbytes = getattr(settings, 'CACHE_LOCAL_MAX_BYTES', None) if maxbytes is None else maxbytes
+        self.local = LRUCache(maxsize=maxsize, ttl=ttl, maxbytes=maxbytes)
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self._store = store
+        self._lock = threading.Lock()
+    
+    @property
+    def store(self):
+        return self._store or get_shared_store()
+    
+    def _key(self, key):
+        return f"{self.namespace}:{key!r}"
+    
+    def _load(self, key):
+        """Read key from the shared tier into the LRU; return the value or MISSING."""
+        row = self.store.get(self._key(key))
+        if row is None:
+            return MISSING
+        blob, expires_at = row
+        try:
+            value = pickle.loads(blob)
+        except Exception:
+            return MISSING
+        remaining = expires_at - time.time() if expires_at else 0
+        if expires_at and remaining <= 0:
+            return MISSING
+        self.local.set(key, value, ttl=remaining, size=len(blob))
+        return value
+    
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if absent or expired."""
+        value = self.local.get(key, MISSING)
+        if value is MISSING:
+            value = self._load(key)
+            with self._lock:
+                if value is MISSING:
+                    self.misses += 1
+                    return default
+                self.shared_hits += 1
+        with self._lock:
+            self.hits += 1
+        return value
+    
+    def peek(self, key, default=None):
+        """Return the cached value from either tier without touching the counters."""
+        value = self.local.peek(key, MISSING)
+        if value is MISSING:
+            value = self._load(key)
+        return default if value is MISSING else value
+    
+    def set(self, key, value, ttl=None):
+        """
+        Store value in both tiers.
+        
+        Args:
+            key: Hashable cache key with a stable repr()
+            value: Value to cache
+            ttl: Seconds this entry stays valid (default: the cache's ttl)
+        """
+        ttl = self.ttl if ttl is None else ttl
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            self.local.set(key, value, ttl=ttl)
+            return
+        self.local.set(key, value, ttl=ttl, size=len(blob))
+        self.store.set(self._key(key), blob, time.time() + ttl if ttl else None)
+    
+    def delete(self, key):
+        """Remove key from both tiers."""
+        self.local.delete(key)
+        self.store.delete(self._key(key))
+    
+    def clear(self):
+        """Remove the namespace from both tiers and reset the counters."""
+        self.local.clear()
+        self.store.delete_prefix(f"{self.namespace}:")
+        with self._lock:
+            self.hits = 0
+            self.shared_hits = 0
+            self.misses = 0
+    
+    def __len__(self):
+        return len(self.local)
+    
+    def stats(self):
+        """
+        Return cache statistics.
+        
+        Returns:
+            dict: LRUCache.stats() of the local tier, with hits, misses and
+                hit_rate over both tiers, plus namespace, local_hits and shared_hits
+        """
+        stats = self.local.stats()
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats.update({
+                'namespace': self.namespace,
+                'hits': self.hits,
+                'misses': self.misses,
+                'local_hits': self.hits - self.shared_hits,
+                'shared_hits': self.shared_hits,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            })
+        return stats
+
+
+class TieredDjangoCache(BaseCache):
+    """
+    Django cache backend over TieredCache (namespace 'django').
+    
+    CACHES options: LOCATION is the shared SQLite file, OPTIONS MAX_ENTRIES
+    bounds the in-process tier and MAX_BYTES the shared one.
+    """
+    
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._cache = TieredCache(
+            'django',
+            maxsize=self._max_entries,
+            store=get_shared_store(location or None, options.get('MAX_BYTES'))
+        )
+    
+    def _ttl(self, timeout):
+        """Seconds until expiry for a Django timeout (None: never, <= 0: already expired)."""
+        expires_at = self.get_backend_timeout(timeout)
+        return None if expires_at is None else expires_at - time.time()
+    
+    def get(self, key, default=None, version=None):
+        return self._cache.get(self.make_and_validate_key(key, version=version), default)
+    
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        ttl = self._ttl(timeout)
+        if ttl is not None and ttl <= 0:
+            self._cache.delete(key)
+            return
+        self._cache.set(key, value, ttl=ttl)
+    
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if self.has_key(key, version=version):
+            return False
+        self.set(key, value, timeout, version=version)
+        return True
+    
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        value = self.get(key, MISSING, version=version)
+        if value is MISSING:
+            return False
+        self.set(key, value, timeout, version=version)
+        return True
+    
+    def has_key(self, key, version=None):
+        return self._cache.peek(self.make_and_validate_key(key, version=version), MISSING) is not MISSING
+    
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        existed = self._cache.peek(key, MISSING) is not MISSING
+        self._cache.delete(key)
+        return existed
+    
+    def clear(self):
+        self._cache.clear()
@@ -0,0 +1,292 @@
+"""
+Outbound HTTP for third-party integrations (OpenWeatherMap, Overpass,
+Gemini, Brevo).
+
+This module provides:
+1. One keep-alive requests.Session per host, so repeat calls reuse
+   TCP/TLS connections
+2. Mandatory timeouts: calls without an explicit timeout get
+   (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+3. Bounded retries with full-jitter exponential backoff
+4. A per-host circuit breaker: after HTTP_BREAKER_THRESHOLD consecutive
+   failures the host is skipped for HTTP_BREAKER_RESET seconds, then a
+   single trial call decides whether it is closed again
+5. Per-host request, failure and latency statistics
+
+Retries: GET/HEAD are retried on connection errors, timeouts and
+429/5xx responses. Other methods (e.g. sending an email) are retried
+only when the connection could not be established, so a request the
+server may have processed is never sent twice, unless the caller opts
+in with retry_unsafe=True.
+
+Usage:
+    from securecrop import http
+    
+    response = http.get(url, params=params)
+    response = http.post(url, json=payload, timeout=30)
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+
+# Response statuses worth retrying (and counted as upstream failures)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+# Latency samples kept per host for percentiles
+LATENCY_WINDOW = 200
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """The host's circuit breaker is open; no request was sent."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for one host.
+    
+    States: 'closed' (requests flow), 'open' (requests fail fast) and
+    'half_open' (one trial request is allowed through).
+    """
+    
+    def __init__(self, threshold=5, reset_timeout=30.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+    
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+    
+    def allow(self):
+        """Return True if a request may be sent now."""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+    
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class HostStats:
+    """Request counters and recent latencies for one host."""
+    
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+        self.short_circuited = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+    
+    def record(self, latency_ms, failed):
+        with self._lock:
+            self.requests += 1
+            if failed:
+                self.failures += 1
+            self.latencies.append(latency_ms)
+    
+    def as_dict(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+        
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 1)
+        
+        return {
+            'requests': self.requests,
+            'failures': self.failures,
+            'retries': self.retries,
+            'short_circuited': self.short_circuited,
+            'latency_ms': {
+                'p50': percentile(0.50),
+                'p95': percentile(0.95),
+                'max': round(latencies[-1], 1) if latencies else None,
+            },
+        }
+
+
+class _Host:
+    """Session, breaker and stats of one upstream host."""
+    
+    def __init__(self):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=_setting('HTTP_POOL_SIZE', 10))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.breaker = CircuitBreaker(
+            threshold=_setting('HTTP_BREAKER_THRESHOLD', 5),
+            reset_timeout=_setting('HTTP_BREAKER_RESET', 30.0)
+        )
+        self.stats = HostStats()
+
+
+_hosts = {}
+_hosts_lock = threading.Lock()
+
+
+def _get_host(url):
+    # Created lazily so no sockets are opened before gunicorn forks workers
+    netloc = urlsplit(url).netloc
+    host = _hosts.get(netloc)
+    if host is None:
+        with _hosts_lock:
+            host = _hosts.get(netloc)
+            if host is None:
+                host = _hosts[netloc] = _Host()
+    return netloc, host
+
+
+def backoff_delay(attempt, base=None, cap=None):
+    """
+    Full-jitter exponential backoff before retry number attempt (0-based).
+    
+    Returns:
+        float: Seconds to sleep, uniform in [0, min(cap, base * 2**attempt)]
+    """
+    base = _setting('HTTP_BACKOFF_BASE', 0.25) if base is None else base
+    cap = _setting('HTTP_BACKOFF_MAX', 2.0) if cap is None else cap
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _is_retryable_error(error, method, retry_unsafe):
+    if method in IDEMPOTENT_METHODS or retry_unsafe:
+        return isinstance(error, (requests.ConnectionError, requests.Timeout))
+    # The request never reached the server
+    return isinstance(error, requests.ConnectTimeout)
+
+
+def request(method, url, timeout=None, retries=None, retry_unsafe=False, **kwargs):
+    """
+    Send an HTTP request through the host's pooled session.
+    
+    Args:
+        method: HTTP method
+        url: Absolute URL
+        timeout: Seconds, or (connect, read) tuple; defaults to
+            (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+        retries: Extra attempts after the first (default HTTP_RETRIES)
+        retry_unsafe: Also retry non-idempotent methods after errors that
+            may have reached the server (timeouts, 5xx responses)
+        **kwargs: Passed to requests.Session.request (params, json, headers...)
+    
+    Returns:
+        requests.Response: The last response (may have an error status)
+    
+    Raises:
+        CircuitOpenError: The host is failing and was not called
+        requests.RequestException: The last attempt failed
+    """
+    method = method.upper()
+    if timeout is None:
+        timeout = (_setting('HTTP_CONNECT_TIMEOUT', 3.05), _setting('HTTP_READ_TIMEOUT', 10))
+    if retries is None:
+        retries = _setting('HTTP_RETRIES', 2)
+    retry_statuses = method in IDEMPOTENT_METHODS or retry_unsafe
+    
+    netloc, host = _get_host(url)
+    attempt = 0
+    while True:
+        if not host.breaker.allow():
+            host.stats.short_circuited += 1
+            raise CircuitOpenError(f"Circuit open for {netloc}; skipping request")
+        
+        start = time.perf_counter()
+        try:
+            response = host.session.request(method, url, timeout=timeout, **kwargs)
+        except requests.RequestException as e:
+            host.stats.record((time.perf_counter() - start) * 1000, failed=True)
+            host.breaker.record_failure()
+            if attempt >= retries or not _is_retryable_error(e, method, retry_unsafe):
+                raise
+            print(f"[HTTP] {method} {netloc} failed ({e.__class__.__name__}), retrying")
+        except BaseException:
+            # E.g. invalid params or an adapter bug; a half-open trial must still be settled
+            host.stats.record((time.perf_counter() - start) * 1000, failed=True)
+            host.breaker.record_failure()
+            raise
+        else:
+            failed = response.status_code in RETRY_STATUSES
+            host.stats.record((time.perf_counter() - start) * 1000, failed=failed)
+            if not failed:
+                host.breaker.record_success()
+                return response
+            host.breaker.record_failure()
+            if attempt >= retries or not retry_statuses:
+                return response
+            print(f"[HTTP] {method} {netloc} returned {response.status_code}, retrying")
+            response.close()
+        
+        host.stats.retries += 1
+        time.sleep(backoff_delay(attempt))
+        attempt += 1
+
+
+def get(url, **kwargs):
+    """Send a GET request (see request())."""
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    """Send a POST request (see request())."""
+    return request('POST', url, **kwargs)
+
+
+def get_http_stats():
+    """
+    Return per-host statistics of outbound calls (this worker process).
+    
+    Returns:
+        dict: host -> requests, failures, retries, short_circuited,
+            latency_ms (p50/p95/max) and circuit state
+    """
+    stats = {}
+    for netloc, host in list(_hosts.items()):
+        stats[netloc] = host.stats.as_dict()
+        stats[netloc]['circuit'] = host.breaker.state
+    return stats
+
+
+def reset():
+    """Close every pooled session and forget breaker state and statistics."""
+    with _hosts_lock:
+        for host in _hosts.values():
+            host.session.close()
+        _hosts.clear()
@@ -5,6 +5,7 @@ Django settings for SecureCrop project.
 from pathlib import Path
 from datetime import timedelta
 import os
+import sys
 from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -13,6 +14,9 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Load environment variables
 load_dotenv(os.path.join(BASE_DIR, '.env'))
 
+# Running under the test runner (`manage.py test`, or DJANGO_TESTING=True for other runners)
+TESTING = os.getenv('DJANGO_TESTING', 'True' if sys.argv[1:2] == ['test'] else 'False') == 'True'
+
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.getenv('SECRET_KEY', 'django-insecure-dev-key-change-in-production')
 
@@ -209,9 +213,102 @@ CORS_ALLOW_HEADERS = [
     'x-requested-with',
 ]
 
+# Load ML models when the WSGI app starts (before gunicorn forks workers) instead of on first request
+ML_EAGER_LOAD = os.getenv('ML_EAGER_LOAD', 'True') == 'True'
+
+# App caches (securecrop/cache.py): each process keeps a bounded LRU per cache
+# (CACHE_LOCAL_MAX_BYTES) in front of a SQLite file shared by all workers of
+# the host, which survives worker recycling and is evicted by size.
+# ':memory:' keeps the shared tier inside the process (the test runner).
+# Values are unpickled, so the file must live in a directory only this user
+# can write: it is created with mode 0700 (directory) and 0600 (file).
+CACHE_SHARED_PATH = os.getenv(
+    'CACHE_SHARED_PATH',
+    ':memory:' if TESTING else str(BASE_DIR / 'var' / 'cache.sqlite3')
+)
+CACHE_SHARED_MAX_BYTES = int(os.getenv('CACHE_SHARED_MAX_BYTES', 256 * 1024 * 1024))
+# Cache hits record their read time (for eviction) in the shared file at most this often (seconds)
+CACHE_SHARED_TOUCH_INTERVAL = int(os.getenv('CACHE_SHARED_TOUCH_INTERVAL', 60))
+CACHE_LOCAL_MAX_BYTES = int(os.getenv('CACHE_LOCAL_MAX_BYTES', 32 * 1024 * 1024))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'securecrop.cache.TieredDjangoCache',
+        'LOCATION': CACHE_SHARED_PATH,
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1024,
+            'MAX_BYTES': CACHE_SHARED_MAX_BYTES,
+        },
+    }
+}
+
+# Reuse results for repeated soil inputs (keyed by model version + integrity hash)
+PREDICTION_CACHE_ENABLED = os.getenv('PREDICTION_CACHE_ENABLED', 'True') == 'True'
+PREDICTION_CACHE_SIZE = int(os.getenv('PREDICTION_CACHE_SIZE', 1024))
+PREDICTION_CACHE_TTL = int(os.getenv('PREDICTION_CACHE_TTL', 3600))
+
+# AI farming guides: generated on a background thread pool and cached per crop + soil profile
+FARMING_GUIDE_ASYNC = os.getenv('FARMING_GUIDE_ASYNC', 'True') == 'True'
+FARMING_GUIDE_WORKERS = int(os.getenv('FARMING_GUIDE_WORKERS', 2))
+FARMING_GUIDE_CACHE_SIZE = int(os.getenv('FARMING_GUIDE_CACHE_SIZE', 512))
+FARMING_GUIDE_CACHE_TTL = int(os.getenv('FARMING_GUIDE_CACHE_TTL', 7 * 24 * 3600))
+
+# CyberLog events are bulk-inserted by a background writer (inline under the test runner)
+CYBER_LOG_ASYNC = os.getenv('CYBER_LOG_ASYNC', 'False' if TESTING else 'True') == 'True'
+CYBER_LOG_QUEUE_SIZE = int(os.getenv('CYBER_LOG_QUEUE_SIZE', 10000))
+CYBER_LOG_BATCH_SIZE = int(os.getenv('CYBER_LOG_BATCH_SIZE', 500))
+CYBER_LOG_FLUSH_INTERVAL = float(os.getenv('CYBER_LOG_FLUSH_INTERVAL', 1.0))
+
+# Bulk weather alert emails: durable EmailLog queue sent by a background dispatcher (inline under the test runner)
+ALERT_MAIL_ASYNC = os.getenv('ALERT_MAIL_ASYNC', 'False' if TESTING else 'True') == 'True'
+ALERT_MAIL_WORKERS = int(os.getenv('ALERT_MAIL_WORKERS', 4))
+ALERT_MAIL_RATE = float(os.getenv('ALERT_MAIL_RATE', 10))
+ALERT_MAIL_BATCH_SIZE = int(os.getenv('ALERT_MAIL_BATCH_SIZE', 1000))
+ALERT_MAIL_CHUNK_SIZE = int(os.getenv('ALERT_MAIL_CHUNK_SIZE', 500))
+ALERT_MAIL_LEASE = int(os.getenv('ALERT_MAIL_LEASE', 300))
+ALERT_MAIL_MAX_ATTEMPTS = int(os.getenv('ALERT_MAIL_MAX_ATTEMPTS', 3))
+# Seconds between scheduled alert digests (manage.py run_alert_digest --loop)
+ALERT_DIGEST_INTERVAL = int(os.getenv('ALERT_DIGEST_INTERVAL', 1800))
+
+# Outbound HTTP (securecrop/http.py): pooled per-host sessions, timeouts, retries, circuit breaker
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 3.05))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 10))
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', 2))
+HTTP_BACKOFF_BASE = float(os.getenv('HTTP_BACKOFF_BASE', 0.25))
+HTTP_BACKOFF_MAX = float(os.getenv('HTTP_BACKOFF_MAX', 2.0))
+HTTP_BREAKER_THRESHOLD = int(os.getenv('HTTP_BREAKER_THRESHOLD', 5))
+HTTP_BREAKER_RESET = float(os.getenv('HTTP_BREAKER_RESET', 30))
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 10))
+# Farming guide generation takes longer than the default read timeout (seconds)
+GEMINI_READ_TIMEOUT = float(os.getenv('GEMINI_READ_TIMEOUT', 30))
+
 # OpenWeatherMap API Key
 OPENWEATHER_API_KEY = os.getenv('OPENWEATHER_API_KEY', '')
 
+# Current weather cached per ~1km cell, shared by the weather views and notifications
+WEATHER_CACHE_SIZE = int(os.getenv('WEATHER_CACHE_SIZE', 1024))
+WEATHER_CACHE_TTL = int(os.getenv('WEATHER_CACHE_TTL', 600))
+WEATHER_FANOUT_WORKERS = int(os.getenv('WEATHER_FANOUT_WORKERS', 8))
+# Forecasts are cached until the next 3-hour upstream run plus this publishing delay (seconds)
+WEATHER_FORECAST_PUBLISH_DELAY = int(os.getenv('WEATHER_FORECAST_PUBLISH_DELAY', 600))
+
+# Weather history: one observation per cell and interval (seconds); retention in days
+WEATHER_HISTORY_INTERVAL = int(os.getenv('WEATHER_HISTORY_INTERVAL', 3600))
+WEATHER_HISTORY_LOG_DAYS = int(os.getenv('WEATHER_HISTORY_LOG_DAYS', 30))
+WEATHER_HISTORY_SUMMARY_DAYS = int(os.getenv('WEATHER_HISTORY_SUMMARY_DAYS', 730))
+
+# Market search tile store (market_linkage/places.py): grid tile size in
+# degrees and seconds before a tile's places are fetched from Overpass again
+MARKET_TILE_SIZE = float(os.getenv('MARKET_TILE_SIZE', 0.05))
+MARKET_TILE_TTL = int(os.getenv('MARKET_TILE_TTL', 7 * 24 * 3600))
+# Largest search radius in meters (larger searches are rejected with a 400)
+MARKET_MAX_RADIUS = int(os.getenv('MARKET_MAX_RADIUS', 50000))
+# Tiles whose places each process keeps in memory as coordinate arrays
+MARKET_TILE_CACHE_SIZE = int(os.getenv('MARKET_TILE_CACHE_SIZE', 4096))
+# Stale tiles are served while a background thread refreshes them (inline under the test runner)
+MARKET_REFRESH_ASYNC = os.getenv('MARKET_REFRESH_ASYNC', 'False' if TESTING else 'True') == 'True'
+
 # Email Configuration
 EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
 EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
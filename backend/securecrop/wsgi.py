@@ -4,8 +4,16 @@ WSGI config for securecrop project.
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'securecrop.settings')
 
 application = get_wsgi_application()
+
+# Load all model artifacts when a server starts, not in management commands
+# (migrate, collectstatic). Under gunicorn's preload_app this runs in the
+# master, so forked workers share them.
+if settings.ML_EAGER_LOAD:
+    from ml_engine.registry import warm_up
+    warm_up()
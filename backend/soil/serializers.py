@@ -29,6 +29,27 @@ class SoilInputSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ('id', 'user', 'integrity_hash', 'created_at')
     
+    # Columns read when serializing, including the joined user's
+    query_fields = (
+        'id', 'user', 'user__email', 'user__username',
+        'N_level', 'P_level', 'K_level',
+        'ph', 'moisture', 'temperature',
+        'integrity_hash', 'created_at'
+    )
+    
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """
+        Join the user and load only the serialized columns.
+        
+        Args:
+            queryset: SoilInput queryset
+        
+        Returns:
+            QuerySet: Serializable without further queries per row
+        """
+        return queryset.select_related('user').only(*cls.query_fields)
+    
     def validate_N_level(self, value):
         """Validate nitrogen level range."""
         if value < 0 or value > 200:
@@ -1,5 +1,9 @@
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
 from accounts.models import User
+from ml_engine.tests import TrainedModelsMixin
+from recommendations.models import Recommendation
 from .models import SoilInput
 
 
@@ -41,3 +45,80 @@ class SoilInputModelTest(TestCase):
         features = soil_input.to_feature_array()
         self.assertEqual(len(features), 6)
         self.assertEqual(features[0], 50.0)
+
+
+class SoilInputListQueryTest(TestCase):
+    """Listing soil inputs costs the same queries however many rows a page has."""
+    
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email='soiladmin@example.com', username='soiladmin', password='testpass123', role='ADMIN'
+        )
+        self.farmers = [
+            User.objects.create_user(email=f"grower{index}@example.com", username=f"grower{index}",
+                                     password='testpass123')
+            for index in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+    
+    def add_inputs(self, count):
+        SoilInput.objects.bulk_create([
+            SoilInput(user=self.farmers[index % len(self.farmers)],
+                      N_level=80, P_level=45, K_level=40, ph=6.5, moisture=60, temperature=24)
+            for index in range(count)
+        ])
+    
+    def test_constant_queries_per_page(self):
+        """A count and one joined page query, for a page of 2 or of 20."""
+        for count, page_size in [(2, 2), (28, 20)]:
+            self.add_inputs(count)
+            for url in [reverse('soil-input-list'), reverse('admin-soil-input-list')]:
+                with self.assertNumQueries(2):
+                    response = self.client.get(url)
+                self.assertEqual(len(response.data['results']), page_size)
+        
+        usernames = {row['user_username'] for row in response.data['results']}
+        self.assertEqual(usernames, {farmer.username for farmer in self.farmers})
+
+
+class SoilInputBatchCreateTest(TrainedModelsMixin, TestCase):
+    """Test cases for the batch soil input endpoint."""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='batch@example.com',
+            username='batchuser',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('soil-input-batch-create')
+    
+    def test_batch_create(self):
+        """Test creating many soil inputs and recommendations in one call."""
+        samples = [
+            {'N_level': 80, 'P_level': 45, 'K_level': 40, 'ph': 6.5, 'moisture': 80, 'temperature': 24},
+            {'N_level': 30, 'P_level': 20, 'K_level': 30, 'ph': 7.2, 'moisture': 40, 'temperature': 30},
+        ]
+        response = self.client.post(self.url, {'samples': samples}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(SoilInput.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(Recommendation.objects.filter(input__user=self.user).count(), 2)
+        self.assertEqual(response.data['results'][0]['recommendation']['crop_name'], 'rice')
+    
+    def test_batch_rejects_invalid_sample(self):
+        """Test that one invalid sample rejects the whole batch."""
+        samples = [
+            {'N_level': 80, 'P_level': 45, 'K_level': 40, 'ph': 6.5, 'moisture': 80, 'temperature': 24},
+            {'N_level': 500, 'P_level': 20, 'K_level': 30, 'ph': 7.2, 'moisture': 40, 'temperature': 30},
+        ]
+        response = self.client.post(self.url, {'samples': samples}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(SoilInput.objects.count(), 0)
+    
+    def test_batch_requires_samples(self):
+        """Test that an empty batch is rejected."""
+        response = self.client.post(self.url, {'samples': []}, format='json')
+        self.assertEqual(response.status_code, 400)
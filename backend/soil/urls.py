@@ -4,6 +4,7 @@ URL configuration for soil app.
 from django.urls import path
 from .views import (
     SoilInputCreateView,
+    SoilInputBatchCreateView,
     SoilInputListView,
     SoilInputDetailView,
     AdminSoilInputListView
@@ -12,6 +13,7 @@ from .views import (
 urlpatterns = [
     path('', SoilInputListView.as_view(), name='soil-input-list'),
     path('create/', SoilInputCreateView.as_view(), name='soil-input-create'),
+    path('batch/', SoilInputBatchCreateView.as_view(), name='soil-input-batch-create'),
     path('<int:pk>/', SoilInputDetailView.as_view(), name='soil-input-detail'),
     path('admin/all/', AdminSoilInputListView.as_view(), name='admin-soil-input-list'),
 ]
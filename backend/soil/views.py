@@ -1,15 +1,22 @@
 """
 Views for soil input management and crop recommendation processing.
 """
+from django.db import transaction
+from django.urls import reverse
 from rest_framework import generics, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from .models import SoilInput
 from .serializers import SoilInputSerializer
 from accounts.permissions import IsAdminUser
-from cyber_layer.services import pre_ml_checks
-from recommendations.services import create_recommendation_for_input
-from explainable_ai.services import generate_ai_farming_guide
+from cyber_layer.services import pre_ml_checks, pre_ml_checks_batch
+from logs.writer import security_events
+from recommendations.services import (
+    create_recommendation_for_input,
+    create_recommendations_for_inputs
+)
+from recommendations.tasks import schedule_farming_guide
 
 
 class SoilInputCreateView(generics.CreateAPIView):
@@ -20,12 +27,14 @@ class SoilInputCreateView(generics.CreateAPIView):
     - Validates soil parameters
     - Runs cybersecurity checks (anomaly detection, integrity validation)
     - Generates crop recommendation with XAI explanation
-    - Generates AI-powered farming guide using Gemini
-    - Returns: soil input + recommendation + explanation + farming guide
+    - Schedules the AI-powered farming guide (Gemini) in the background
+    - Returns: soil input + recommendation + explanation, plus the farming
+      guide when it is already cached; otherwise poll farming_guide_url
     """
     serializer_class = SoilInputSerializer
     permission_classes = [IsAuthenticated]
     
+    @security_events()
     def create(self, request, *args, **kwargs):
         # Validate input data
         serializer = self.get_serializer(data=request.data)
@@ -66,6 +75,9 @@ class SoilInputCreateView(generics.CreateAPIView):
             integrity_hash=cyber_result.get('integrity_hash')
         )
         
+        # Link the pre-ML security event to the saved input
+        cyber_result['cyber_log'].input = soil_input
+        
         # Generate crop recommendation
         try:
             recommendation = create_recommendation_for_input(soil_input)
@@ -78,9 +90,9 @@ class SoilInputCreateView(generics.CreateAPIView):
                 'detail': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
-        # Generate AI-powered farming guide
+        # Schedule the AI-powered farming guide (returned now only if cached)
         try:
-            farming_guide = generate_ai_farming_guide(recommendation.crop_name, soil_input)
+            farming_guide = schedule_farming_guide(recommendation)
         except Exception as e:
             print(f"AI farming guide error: {e}")
             farming_guide = None
@@ -92,9 +104,14 @@ class SoilInputCreateView(generics.CreateAPIView):
                 'id': recommendation.id,
                 'crop_name': recommendation.crop_name,
                 'explanation': recommendation.explanation,
+                'model_version': recommendation.model_version,
                 'created_at': recommendation.created_at
             },
             'farming_guide': farming_guide,
+            'farming_guide_status': recommendation.farming_guide_status,
+            'farming_guide_url': reverse(
+                'recommendation-farming-guide', kwargs={'pk': recommendation.id}
+            ),
             'security_check': {
                 'anomaly_detected': cyber_result.get('anomaly_detected', False),
                 'integrity_status': cyber_result.get('integrity_status', 'OK')
@@ -103,6 +120,118 @@ class SoilInputCreateView(generics.CreateAPIView):
         }, status=status.HTTP_201_CREATED)
 
 
+class SoilInputBatchCreateView(generics.GenericAPIView):
+    """
+    API endpoint for submitting many soil samples in one request.
+    
+    POST /api/soil-inputs/batch/
+    Body: {"samples": [{N_level, P_level, K_level, ph, moisture, temperature}, ...]}
+    - Validates every sample and runs pre-ML cybersecurity checks in one
+      vectorized anomaly-scoring pass
+    - Predicts all crops in one vectorized pass
+    - Bulk-creates SoilInput and Recommendation rows
+    - Returns: one result per sample, in submission order
+    
+    AI farming guides are not generated for batches; fetch one on demand
+    from GET /api/recommendations/<id>/farming-guide/.
+    """
+    serializer_class = SoilInputSerializer
+    permission_classes = [IsAuthenticated]
+    
+    # Upper bound on samples per request to keep a single call within the worker timeout
+    MAX_BATCH_SIZE = 500
+    
+    @security_events()
+    def post(self, request, *args, **kwargs):
+        samples = request.data.get('samples') if hasattr(request.data, 'get') else None
+        
+        if not isinstance(samples, list) or not samples:
+            return Response({
+                'error': 'samples must be a non-empty list of soil inputs'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if len(samples) > self.MAX_BATCH_SIZE:
+            return Response({
+                'error': f'A batch may contain at most {self.MAX_BATCH_SIZE} samples',
+                'detail': f'Received {len(samples)} samples'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Validate all samples
+        serializer = self.get_serializer(data=samples, many=True)
+        serializer.is_valid(raise_exception=True)
+        
+        # Run pre-ML cybersecurity checks for all samples in one pass
+        try:
+            cyber_results = pre_ml_checks_batch([
+                {
+                    field: validated[field]
+                    for field in ('N_level', 'P_level', 'K_level', 'ph', 'moisture', 'temperature')
+                }
+                for validated in serializer.validated_data
+            ], request.user)
+        except ValidationError as e:
+            return Response({
+                'error': 'Security validation failed',
+                'index': int(e.detail['index']),
+                'detail': str(e.detail['detail'])
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({
+                'error': 'Security validation failed',
+                'detail': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            with transaction.atomic():
+                soil_inputs = SoilInput.objects.bulk_create([
+                    SoilInput(
+                        user=request.user,
+                        integrity_hash=cyber_result.get('integrity_hash'),
+                        **validated
+                    )
+                    for validated, cyber_result in zip(serializer.validated_data, cyber_results)
+                ])
+                results = create_recommendations_for_inputs(soil_inputs)
+                
+                # Link each pre-ML security event to its saved input
+                for soil_input, cyber_result in zip(soil_inputs, cyber_results):
+                    cyber_result['cyber_log'].input = soil_input
+        except Exception as e:
+            import traceback
+            print(f"Batch recommendation error: {e}")
+            print(traceback.format_exc())
+            return Response({
+                'error': 'Failed to generate recommendations',
+                'detail': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        soil_input_data = SoilInputSerializer(soil_inputs, many=True).data
+        
+        return Response({
+            'count': len(results),
+            'results': [
+                {
+                    'soil_input': soil_input_data[index],
+                    'recommendation': {
+                        'id': recommendation.id,
+                        'crop_name': recommendation.crop_name,
+                        'confidence': probability,
+                        'explanation': recommendation.explanation,
+                        'model_version': recommendation.model_version,
+                        'created_at': recommendation.created_at
+                    },
+                    'security_check': {
+                        'anomaly_detected': cyber_results[index].get('anomaly_detected', False),
+                        'anomaly_score': cyber_results[index].get('anomaly_score'),
+                        'integrity_status': cyber_results[index].get('integrity_status', 'OK')
+                    }
+                }
+                for index, (recommendation, probability) in enumerate(results)
+            ],
+            'message': f'{len(results)} crop recommendations generated successfully'
+        }, status=status.HTTP_201_CREATED)
+
+
 class SoilInputListView(generics.ListAPIView):
     """
     API endpoint to list soil inputs.
@@ -116,9 +245,10 @@ class SoilInputListView(generics.ListAPIView):
     
     def get_queryset(self):
         user = self.request.user
+        queryset = SoilInputSerializer.setup_eager_loading(SoilInput.objects.all())
         if user.role == 'ADMIN':
-            return SoilInput.objects.all()
-        return SoilInput.objects.filter(user=user)
+            return queryset
+        return queryset.filter(user=user)
 
 
 class SoilInputDetailView(generics.RetrieveAPIView):
@@ -132,9 +262,10 @@ class SoilInputDetailView(generics.RetrieveAPIView):
     
     def get_queryset(self):
         user = self.request.user
+        queryset = SoilInputSerializer.setup_eager_loading(SoilInput.objects.all())
         if user.role == 'ADMIN':
-            return SoilInput.objects.all()
-        return SoilInput.objects.filter(user=user)
+            return queryset
+        return queryset.filter(user=user)
 
 
 class AdminSoilInputListView(generics.ListAPIView):
@@ -145,4 +276,4 @@ class AdminSoilInputListView(generics.ListAPIView):
     """
     serializer_class = SoilInputSerializer
     permission_classes = [IsAdminUser]
-    queryset = SoilInput.objects.all()
+    queryset = SoilInputSerializer.setup_eager_loading(SoilInput.objects.all())
@@ -1,10 +1,10 @@
 from django.contrib import admin
-from .models import WeatherLog, WeatherAlert, ForecastLog
+from .models import WeatherLog, WeatherAlert, ForecastLog, WeatherDailySummary
 
 
 @admin.register(WeatherLog)
 class WeatherLogAdmin(admin.ModelAdmin):
-    list_display = ['user', 'city', 'temperature', 'humidity', 'description', 'recorded_at']
+    list_display = ['city', 'cell_lat', 'cell_lon', 'temperature', 'humidity', 'description', 'recorded_at']
     list_filter = ['city', 'recorded_at']
     search_fields = ['user__email', 'city', 'description']
     date_hierarchy = 'recorded_at'
@@ -20,7 +20,15 @@ class WeatherAlertAdmin(admin.ModelAdmin):
 
 @admin.register(ForecastLog)
 class ForecastLogAdmin(admin.ModelAdmin):
-    list_display = ['user', 'city', 'forecast_date', 'temperature_min', 'temperature_max', 'condition']
+    list_display = ['user', 'city', 'forecast_date', 'temperature_min', 'temperature_max', 'rainfall', 'condition']
     list_filter = ['city', 'forecast_date']
     search_fields = ['user__email', 'city']
     date_hierarchy = 'recorded_at'
+
+
+@admin.register(WeatherDailySummary)
+class WeatherDailySummaryAdmin(admin.ModelAdmin):
+    list_display = ['city', 'cell_lat', 'cell_lon', 'date', 'temperature_min', 'temperature_max', 'rainfall', 'samples']
+    list_filter = ['city', 'date']
+    search_fields = ['city']
+    date_hierarchy = 'date'
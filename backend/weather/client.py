@@ -0,0 +1,361 @@
+"""
+Shared OpenWeatherMap client.
+
+Every current-weather lookup (the weather views and the notification
+service) goes through get_current_weather():
+1. Coordinates are rounded to a grid cell (2 decimals, ~1km, like the
+   market search cache) so nearby requests share one entry
+2. Cells are cached for WEATHER_CACHE_TTL seconds (OpenWeatherMap
+   refreshes current conditions about every 10 minutes), shared by the
+   worker processes through the tiered cache (securecrop.cache)
+3. Concurrent misses for the same cell wait for a single upstream call
+
+A dashboard load (current, alerts, risk score, insights) therefore makes
+at most one OpenWeatherMap request. Failed calls are not cached. Each
+fetched payload is appended to the weather history (weather.history) by
+the thread that requested it.
+
+get_current_weather_many() serves many locations at once (e.g. a page of
+farmers): locations are reduced to distinct cells and the uncached cells
+are fetched concurrently on a small, bounded thread pool.
+
+get_forecast() caches the 5-day forecast per cell the same way. The
+forecast only changes when OpenWeatherMap publishes a new run (every 3
+hours), so entries expire at the next 3-hour boundary rather than after
+a fixed TTL. Daily aggregates are computed once per fetch, and each
+fetch is stored in ForecastLog with one bulk insert.
+"""
+
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from dotenv import load_dotenv
+
+from securecrop import http
+from securecrop.cache import SingleFlight, TieredCache
+from . import history
+from .models import ForecastLog
+
+# Reload .env to ensure latest values
+load_dotenv()
+
+# OpenWeatherMap API Key - use environment variable with fallback
+OPENWEATHER_API_KEY = os.getenv('OPENWEATHER_API_KEY', '90d15b7fdfc7a271fe97287339babf47')
+
+# OpenWeatherMap 2.5 API base URL (OPENWEATHER_API_URL overrides it, e.g. for a local stub)
+OPENWEATHER_API_URL = 'https://api.openweathermap.org/data/2.5'
+
+# Decimal places kept when bucketing coordinates (~1km cells)
+CELL_PRECISION = 2
+
+_current_cache = TieredCache(
+    'weather.current',
+    maxsize=getattr(settings, 'WEATHER_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'WEATHER_CACHE_TTL', 600)
+)
+_forecast_cache = TieredCache('weather.forecast', maxsize=getattr(settings, 'WEATHER_CACHE_SIZE', 1024))
+_flight = SingleFlight()
+
+# OpenWeatherMap publishes a new 5-day/3-hour forecast every 3 hours (UTC)
+FORECAST_UPDATE_INTERVAL = 3 * 3600
+
+
+class WeatherAPIError(Exception):
+    """OpenWeatherMap answered with a non-200 status."""
+    
+    def __init__(self, status_code, detail):
+        super().__init__(f"OpenWeatherMap returned {status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+def cell_key(lat, lon):
+    """
+    Round coordinates to the weather grid cell they fall in.
+    
+    Args:
+        lat: Latitude (number or numeric string)
+        lon: Longitude (number or numeric string)
+    
+    Returns:
+        tuple: (rounded_lat, rounded_lon)
+    """
+    return round(float(lat), CELL_PRECISION), round(float(lon), CELL_PRECISION)
+
+
+def _fetch_current(lat, lon):
+    """Call OpenWeatherMap /weather for one cell."""
+    url = f"{os.getenv('OPENWEATHER_API_URL', OPENWEATHER_API_URL)}/weather"
+    params = {
+        'lat': lat,
+        'lon': lon,
+        'appid': OPENWEATHER_API_KEY,
+        'units': 'metric'
+    }
+    
+    print(f"Fetching weather for lat={lat}, lon={lon}")
+    response = http.get(url, params=params)
+    
+    if response.status_code != 200:
+        error_data = response.json() if response.headers.get('content-type', '').startswith('application/json') else {}
+        print(f"Weather API error: {response.status_code} - {error_data}")
+        raise WeatherAPIError(response.status_code, error_data.get('message', 'Unknown error'))
+    
+    return response.json()
+
+
+def _get_current(key):
+    """
+    Get a cell's payload from the cache or a (single-flight) upstream call.
+    
+    Returns:
+        tuple: (payload, fetched) where fetched is True if this call made
+            the upstream request
+    """
+    data = _current_cache.get(key)
+    if data is not None:
+        return data, False
+    
+    fetched = []
+    
+    def fetch():
+        # A call that finished just before this one may have filled the cell
+        cached = _current_cache.peek(key)
+        if cached is not None:
+            return cached
+        data = _fetch_current(*key)
+        _current_cache.set(key, data)
+        fetched.append(True)
+        return data
+    
+    return _flight.do(('current', key), fetch), bool(fetched)
+
+
+def get_current_weather(lat, lon, user=None):
+    """
+    Get the raw OpenWeatherMap current-weather payload for a location.
+    
+    The returned dict is shared between callers and must not be modified.
+    
+    Args:
+        lat: Latitude
+        lon: Longitude
+        user: User whose request this is (recorded in the weather history
+            if it triggers an upstream fetch)
+    
+    Returns:
+        dict: OpenWeatherMap /weather response for the location's cell
+    
+    Raises:
+        WeatherAPIError: OpenWeatherMap returned an error status
+        requests.RequestException: Network error or timeout
+    """
+    key = cell_key(lat, lon)
+    data, fetched = _get_current(key)
+    if fetched:
+        history.record_observation(key, data, user=user)
+    return data
+
+
+def get_current_weather_many(locations, max_workers=None):
+    """
+    Get current weather for many locations, one fetch per distinct cell.
+    
+    Args:
+        locations: Iterable of (lat, lon) pairs
+        max_workers: Concurrent upstream calls (default WEATHER_FANOUT_WORKERS)
+    
+    Returns:
+        dict: cell_key(lat, lon) -> OpenWeatherMap payload, or None if the
+            cell could not be fetched
+    """
+    cells = {cell_key(lat, lon) for lat, lon in locations}
+    results = {}
+    missing = []
+    for cell in cells:
+        data = _current_cache.get(cell)
+        if data is None:
+            missing.append(cell)
+        else:
+            results[cell] = data
+    
+    def fetch(cell):
+        try:
+            return _get_current(cell)
+        except Exception as e:
+            print(f"Error fetching weather for {cell[0]}, {cell[1]}: {e}")
+            return None, False
+    
+    if missing:
+        max_workers = max_workers or getattr(settings, 'WEATHER_FANOUT_WORKERS', 8)
+        # Short-lived pool: threads exist only while this call is running
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(missing)),
+                                thread_name_prefix='weather-fanout') as executor:
+            for cell, (data, fetched) in zip(missing, executor.map(fetch, missing)):
+                results[cell] = data
+                # Database writes stay on the calling thread
+                if fetched:
+                    history.record_observation(cell, data)
+    
+    return results
+
+
+def forecast_ttl(now=None):
+    """
+    Seconds until the cached forecast of a cell should be refetched.
+    
+    Entries live until the next 3-hour upstream update, plus
+    WEATHER_FORECAST_PUBLISH_DELAY seconds for the new run to be published.
+    
+    Args:
+        now: Unix timestamp (default: current time)
+    """
+    now = time.time() if now is None else now
+    next_update = (int(now) // FORECAST_UPDATE_INTERVAL + 1) * FORECAST_UPDATE_INTERVAL
+    return next_update - now + getattr(settings, 'WEATHER_FORECAST_PUBLISH_DELAY', 600)
+
+
+def aggregate_daily(data):
+    """
+    Reduce an OpenWeatherMap /forecast payload to one summary per day.
+    
+    Days follow the location's local time (the payload's city.timezone).
+    
+    Args:
+        data: OpenWeatherMap /forecast response
+    
+    Returns:
+        list: Per-day dicts in date order with date, temperature_min,
+            temperature_max, temperature_mean, humidity (mean),
+            condition and condition_icon (most frequent), wind_speed (max),
+            rain_probability (max pop, %) and rainfall (summed mm)
+    """
+    offset = timedelta(seconds=data.get('city', {}).get('timezone', 0))
+    slots_by_day = {}
+    for item in data.get('list', []):
+        day = (datetime.fromtimestamp(item['dt'], tz=timezone.utc) + offset).strftime('%Y-%m-%d')
+        slots_by_day.setdefault(day, []).append(item)
+    
+    days = []
+    for day, slots in sorted(slots_by_day.items()):
+        temps = [slot['main']['temp'] for slot in slots]
+        conditions = Counter((slot['weather'][0]['description'], slot['weather'][0]['icon']) for slot in slots)
+        condition, icon = conditions.most_common(1)[0][0]
+        days.append({
+            'date': day,
+            'temperature_min': min(slot['main']['temp_min'] for slot in slots),
+            'temperature_max': max(slot['main']['temp_max'] for slot in slots),
+            'temperature_mean': round(sum(temps) / len(temps), 1),
+            'humidity': round(sum(slot['main']['humidity'] for slot in slots) / len(slots)),
+            'condition': condition,
+            'condition_icon': icon,
+            'wind_speed': max(slot.get('wind', {}).get('speed', 0) for slot in slots),
+            'rain_probability': round(max(slot.get('pop', 0) for slot in slots) * 100),
+            'rainfall': round(sum(slot.get('rain', {}).get('3h', 0) for slot in slots), 1),
+        })
+    return days
+
+
+def _fetch_forecast(lat, lon):
+    """Call OpenWeatherMap /forecast (all 40 3-hour slots) for one cell."""
+    url = f"{os.getenv('OPENWEATHER_API_URL', OPENWEATHER_API_URL)}/forecast"
+    params = {
+        'lat': lat,
+        'lon': lon,
+        'appid': OPENWEATHER_API_KEY,
+        'units': 'metric'
+    }
+    
+    print(f"Fetching forecast for lat={lat}, lon={lon}")
+    response = http.get(url, params=params)
+    
+    if response.status_code != 200:
+        error_data = response.json() if response.headers.get('content-type', '').startswith('application/json') else {}
+        print(f"Forecast API error: {response.status_code} - {error_data}")
+        raise WeatherAPIError(response.status_code, error_data.get('message', 'Unknown error'))
+    
+    return response.json()
+
+
+def _store_forecast(cell, forecast, user=None):
+    """Record a fetched forecast in ForecastLog (one row per day, one insert)."""
+    try:
+        ForecastLog.objects.bulk_create([
+            ForecastLog(
+                user=user,
+                latitude=cell[0],
+                longitude=cell[1],
+                city=forecast['city'],
+                forecast_date=day['date'],
+                temperature_min=day['temperature_min'],
+                temperature_max=day['temperature_max'],
+                temperature_mean=day['temperature_mean'],
+                humidity=day['humidity'],
+                condition=day['condition'],
+                rain_probability=day['rain_probability'],
+                rainfall=day['rainfall']
+            )
+            for day in forecast['days']
+        ])
+    except Exception as e:
+        print(f"Could not store forecast for {cell[0]}, {cell[1]}: {e}")
+
+
+def get_forecast(lat, lon, user=None):
+    """
+    Get the daily forecast for a location.
+    
+    The returned dict is shared between callers and must not be modified.
+    
+    Args:
+        lat: Latitude
+        lon: Longitude
+        user: Authenticated user whose request triggered an upstream fetch
+            (recorded on the ForecastLog rows)
+    
+    Returns:
+        dict: city and days (see aggregate_daily(), up to 6 days)
+    
+    Raises:
+        WeatherAPIError: OpenWeatherMap returned an error status
+        requests.RequestException: Network error or timeout
+    """
+    key = cell_key(lat, lon)
+    forecast = _forecast_cache.get(key)
+    if forecast is not None:
+        return forecast
+    
+    def fetch():
+        cached = _forecast_cache.peek(key)
+        if cached is not None:
+            return cached
+        data = _fetch_forecast(*key)
+        forecast = {
+            'city': data.get('city', {}).get('name', ''),
+            'days': aggregate_daily(data),
+        }
+        _forecast_cache.set(key, forecast, ttl=forecast_ttl())
+        _store_forecast(key, forecast, user)
+        return forecast
+    
+    return _flight.do(('forecast', key), fetch)
+
+
+def get_weather_cache_stats():
+    """Return cache and upstream call statistics of the weather client."""
+    stats = _current_cache.stats()
+    stats['forecast'] = _forecast_cache.stats()
+    stats['upstream_calls'] = _flight.calls
+    stats['coalesced'] = _flight.shared
+    return stats
+
+
+def clear_weather_cache():
+    """Remove every cached weather and forecast cell."""
+    _current_cache.clear()
+    _forecast_cache.clear()
+    history.clear_recorded()
@@ -0,0 +1,213 @@
+"""
+Weather history store.
+
+Every current-weather payload fetched from OpenWeatherMap (see
+weather.client) is recorded here:
+1. WeatherLog keeps the raw observation, at most one per location cell
+   and WEATHER_HISTORY_INTERVAL seconds of observation time (a unique
+   constraint deduplicates across worker processes)
+2. WeatherDailySummary keeps running daily aggregates per cell (local
+   date of the location), updated in the same transaction as the log row
+
+The history endpoint reads the summaries only, so it costs one indexed
+range query however many observations were recorded. Rainfall is summed
+from the observations' last-hour rain, so it approximates the daily
+total when the interval is one hour.
+
+Raw logs are only needed for recent detail: prune_history() (the
+prune_weather_history command) deletes logs older than
+WEATHER_HISTORY_LOG_DAYS and summaries older than
+WEATHER_HISTORY_SUMMARY_DAYS.
+"""
+
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+
+from securecrop.cache import LRUCache
+from .models import WeatherDailySummary, WeatherLog
+
+
+# Cell -> start of the last interval this process recorded (skips repeat inserts)
+_recorded = LRUCache(maxsize=getattr(settings, 'WEATHER_CACHE_SIZE', 1024))
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _add_to_summary(cell, date, city, temperature, humidity, rainfall):
+    """Fold one observation into the cell's daily summary."""
+    summary = WeatherDailySummary.objects.filter(cell_lat=cell[0], cell_lon=cell[1], date=date)
+    changes = {
+        'samples': F('samples') + 1,
+        'temperature_sum': F('temperature_sum') + temperature,
+        'temperature_min': Least('temperature_min', Value(temperature)),
+        'temperature_max': Greatest('temperature_max', Value(temperature)),
+        'humidity_sum': F('humidity_sum') + humidity,
+        'rainfall': F('rainfall') + rainfall,
+        'city': city,
+        'updated_at': timezone.now(),
+    }
+    if summary.update(**changes):
+        return
+    
+    try:
+        with transaction.atomic():
+            WeatherDailySummary.objects.create(
+                cell_lat=cell[0],
+                cell_lon=cell[1],
+                date=date,
+                city=city,
+                samples=1,
+                temperature_sum=temperature,
+                temperature_min=temperature,
+                temperature_max=temperature,
+                humidity_sum=humidity,
+                rainfall=rainfall
+            )
+    except IntegrityError:
+        # Another process created the day first
+        summary.update(**changes)
+
+
+def record_observation(cell, data, user=None):
+    """
+    Append a current-weather payload to the history of its cell.
+    
+    Never raises: history must not break the weather request that fetched it.
+    
+    Args:
+        cell: weather.client.cell_key() of the location
+        data: OpenWeatherMap /weather response
+        user: User whose request triggered the fetch, if known
+    
+    Returns:
+        bool: True if a new WeatherLog row was stored
+    """
+    interval = _setting('WEATHER_HISTORY_INTERVAL', 3600)
+    observed_at = int(data.get('dt') or time.time())
+    start = observed_at - observed_at % interval
+    if _recorded.peek(cell) == start:
+        return False
+    
+    try:
+        main = data['main']
+        weather = data.get('weather') or [{}]
+        rainfall = data.get('rain', {}).get('1h', 0)
+        local_date = (datetime.fromtimestamp(observed_at, tz=dt_timezone.utc)
+                      + timedelta(seconds=data.get('timezone', 0))).date()
+        
+        with transaction.atomic():
+            WeatherLog.objects.create(
+                user=user,
+                latitude=data.get('coord', {}).get('lat', cell[0]),
+                longitude=data.get('coord', {}).get('lon', cell[1]),
+                cell_lat=cell[0],
+                cell_lon=cell[1],
+                city=data.get('name', ''),
+                country=data.get('sys', {}).get('country', 'MY'),
+                temperature=main['temp'],
+                feels_like=main.get('feels_like'),
+                humidity=main['humidity'],
+                pressure=main.get('pressure'),
+                wind_speed=data.get('wind', {}).get('speed', 0),
+                wind_direction=data.get('wind', {}).get('deg'),
+                description=weather[0].get('description', ''),
+                weather_icon=weather[0].get('icon', ''),
+                clouds=data.get('clouds', {}).get('all', 0),
+                visibility=data['visibility'] / 1000 if data.get('visibility') is not None else None,
+                rainfall=rainfall,
+                weather_timestamp=observed_at,
+                interval_start=datetime.fromtimestamp(start, tz=dt_timezone.utc)
+            )
+            _add_to_summary(cell, local_date, data.get('name', ''), main['temp'], main['humidity'], rainfall)
+    except IntegrityError:
+        # Another process already recorded this interval
+        _recorded.set(cell, start)
+        return False
+    except Exception as e:
+        print(f"Could not record weather history for {cell[0]}, {cell[1]}: {e}")
+        return False
+    
+    _recorded.set(cell, start)
+    return True
+
+
+def get_daily_history(cell, days):
+    """
+    Get the most recent daily summaries of a cell.
+    
+    Args:
+        cell: weather.client.cell_key() of the location
+        days: Number of days (today included)
+    
+    Returns:
+        list: Per-day dicts in date order (days without observations are
+            omitted) with date, temp_avg, temp_min, temp_max, humidity,
+            rainfall and samples
+    """
+    # Local dates run up to a day ahead of UTC; the limit keeps the latest `days`
+    earliest = timezone.now().date() - timedelta(days=days)
+    summaries = (
+        WeatherDailySummary.objects
+        .filter(cell_lat=cell[0], cell_lon=cell[1], date__gte=earliest)
+        .order_by('-date')[:days]
+    )
+    
+    return [
+        {
+            'date': summary.date.strftime('%Y-%m-%d'),
+            'temp_avg': round(summary.temperature_mean, 1),
+            'temp_min': summary.temperature_min,
+            'temp_max': summary.temperature_max,
+            'humidity': round(summary.humidity_mean),
+            'rainfall': round(summary.rainfall, 1),
+            'samples': summary.samples,
+        }
+        for summary in reversed(summaries)
+    ]
+
+
+def prune_history(log_days=None, summary_days=None, batch_size=5000):
+    """
+    Delete history past its retention period.
+    
+    Raw logs are deleted in batches so no single statement locks the
+    table for long; their data lives on in the daily summaries.
+    
+    Args:
+        log_days: Keep WeatherLog rows this many days (default WEATHER_HISTORY_LOG_DAYS)
+        summary_days: Keep daily summaries this many days (default WEATHER_HISTORY_SUMMARY_DAYS)
+        batch_size: Rows deleted per statement
+    
+    Returns:
+        dict: Number of deleted 'logs' and 'summaries'
+    """
+    log_days = _setting('WEATHER_HISTORY_LOG_DAYS', 30) if log_days is None else log_days
+    summary_days = _setting('WEATHER_HISTORY_SUMMARY_DAYS', 730) if summary_days is None else summary_days
+    now = timezone.now()
+    deleted = {'logs': 0, 'summaries': 0}
+    
+    old_logs = WeatherLog.objects.filter(recorded_at__lt=now - timedelta(days=log_days))
+    while True:
+        ids = list(old_logs.order_by().values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        deleted['logs'] += WeatherLog.objects.filter(id__in=ids).delete()[0]
+    
+    deleted['summaries'] = WeatherDailySummary.objects.filter(
+        date__lt=(now - timedelta(days=summary_days)).date()
+    ).delete()[0]
+    
+    return deleted
+
+
+def clear_recorded():
+    """Forget which intervals this process has recorded."""
+    _recorded.clear()
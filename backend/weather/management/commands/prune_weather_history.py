@@ -0,0 +1,24 @@
+"""
+Management command to apply the weather history retention policy.
+Usage: python manage.py prune_weather_history [--log-days N] [--summary-days N]
+
+Deletes raw WeatherLog observations older than WEATHER_HISTORY_LOG_DAYS
+(their data is kept in the daily summaries) and daily summaries older
+than WEATHER_HISTORY_SUMMARY_DAYS. Run it daily, e.g. from cron.
+"""
+from django.core.management.base import BaseCommand
+from weather.history import prune_history
+
+
+class Command(BaseCommand):
+    help = 'Delete weather history past its retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log-days', type=int, help='Days of raw observations to keep')
+        parser.add_argument('--summary-days', type=int, help='Days of daily summaries to keep')
+
+    def handle(self, *args, **options):
+        deleted = prune_history(log_days=options.get('log_days'), summary_days=options.get('summary_days'))
+        self.stdout.write(self.style.SUCCESS(
+            f"Weather history pruned: {deleted['logs']} observations, {deleted['summaries']} daily summaries"
+        ))
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-17 13:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('weather', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='forecastlog',
+            name='rainfall',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='forecastlog',
+            name='temperature_mean',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='forecastlog',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='forecast_logs', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
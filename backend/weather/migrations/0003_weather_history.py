@@ -0,0 +1,79 @@
+# Generated by Django 4.2.7 on 2026-10-17 13:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('weather', '0002_forecast_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeatherDailySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cell_lat', models.FloatField()),
+                ('cell_lon', models.FloatField()),
+                ('date', models.DateField()),
+                ('city', models.CharField(blank=True, max_length=100)),
+                ('samples', models.IntegerField(default=0)),
+                ('temperature_sum', models.FloatField(default=0)),
+                ('temperature_min', models.FloatField()),
+                ('temperature_max', models.FloatField()),
+                ('humidity_sum', models.FloatField(default=0)),
+                ('rainfall', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Weather Daily Summary',
+                'verbose_name_plural': 'Weather Daily Summaries',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddField(
+            model_name='weatherlog',
+            name='cell_lat',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='weatherlog',
+            name='cell_lon',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='weatherlog',
+            name='interval_start',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='weatherlog',
+            name='rainfall',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='weatherlog',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='weather_logs', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='weatherlog',
+            index=models.Index(fields=['cell_lat', 'cell_lon', 'recorded_at'], name='weatherlog_cell_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weatherlog',
+            index=models.Index(fields=['recorded_at'], name='weatherlog_recorded_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='weatherlog',
+            constraint=models.UniqueConstraint(fields=('cell_lat', 'cell_lon', 'interval_start'), name='unique_weather_log_per_cell_interval'),
+        ),
+        migrations.AddConstraint(
+            model_name='weatherdailysummary',
+            constraint=models.UniqueConstraint(fields=('cell_lat', 'cell_lon', 'date'), name='unique_weather_summary_per_cell_day'),
+        ),
+    ]
@@ -7,16 +7,20 @@ from django.conf import settings
 
 
 class WeatherLog(models.Model):
-    """Store weather data for each farmer location check"""
+    """Store observed weather per location cell (at most one per cell and history interval)"""
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name='weather_logs'
+        related_name='weather_logs',
+        null=True,
+        blank=True
     )
     
     # Location data
     latitude = models.FloatField()
     longitude = models.FloatField()
+    cell_lat = models.FloatField(null=True, blank=True)  # weather.client.cell_key()
+    cell_lon = models.FloatField(null=True, blank=True)
     city = models.CharField(max_length=100, blank=True)
     state = models.CharField(max_length=100, blank=True)
     country = models.CharField(max_length=50, default='MY')
@@ -32,18 +36,69 @@ class WeatherLog(models.Model):
     weather_icon = models.CharField(max_length=10, blank=True)
     clouds = models.IntegerField(default=0)
     visibility = models.FloatField(null=True, blank=True)  # in km
+    rainfall = models.FloatField(default=0)  # Rain in the last hour, in mm
     
     # Timestamps
     recorded_at = models.DateTimeField(auto_now_add=True)
     weather_timestamp = models.IntegerField(null=True, blank=True)  # Unix timestamp from API
+    interval_start = models.DateTimeField(null=True, blank=True)  # History interval of weather_timestamp
     
     class Meta:
         ordering = ['-recorded_at']
         verbose_name = 'Weather Log'
         verbose_name_plural = 'Weather Logs'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['cell_lat', 'cell_lon', 'interval_start'],
+                name='unique_weather_log_per_cell_interval'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['cell_lat', 'cell_lon', 'recorded_at'], name='weatherlog_cell_time_idx'),
+            models.Index(fields=['recorded_at'], name='weatherlog_recorded_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.user.email} - {self.city} - {self.temperature}°C on {self.recorded_at}"
+        owner = self.user.email if self.user else f"{self.cell_lat}, {self.cell_lon}"
+        return f"{owner} - {self.city} - {self.temperature}°C on {self.recorded_at}"
+
+
+class WeatherDailySummary(models.Model):
+    """Daily weather aggregates per location cell, updated with every WeatherLog"""
+    cell_lat = models.FloatField()
+    cell_lon = models.FloatField()
+    date = models.DateField()  # Local date of the location
+    city = models.CharField(max_length=100, blank=True)
+    
+    # Running aggregates
+    samples = models.IntegerField(default=0)
+    temperature_sum = models.FloatField(default=0)
+    temperature_min = models.FloatField()
+    temperature_max = models.FloatField()
+    humidity_sum = models.FloatField(default=0)
+    rainfall = models.FloatField(default=0)  # Summed hourly rain, in mm
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-date']
+        verbose_name = 'Weather Daily Summary'
+        verbose_name_plural = 'Weather Daily Summaries'
+        constraints = [
+            # Also the index for per-cell date range queries
+            models.UniqueConstraint(fields=['cell_lat', 'cell_lon', 'date'], name='unique_weather_summary_per_cell_day'),
+        ]
+    
+    @property
+    def temperature_mean(self):
+        return self.temperature_sum / self.samples if self.samples else None
+    
+    @property
+    def humidity_mean(self):
+        return self.humidity_sum / self.samples if self.samples else None
+    
+    def __str__(self):
+        return f"{self.cell_lat}, {self.cell_lon} - {self.date} ({self.samples} samples)"
 
 
 class WeatherAlert(models.Model):
@@ -100,11 +155,13 @@ class WeatherAlert(models.Model):
 
 
 class ForecastLog(models.Model):
-    """Store forecast data history"""
+    """Store forecast data history (one row per forecast day of each upstream fetch)"""
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name='forecast_logs'
+        related_name='forecast_logs',
+        null=True,
+        blank=True
     )
     
     latitude = models.FloatField()
@@ -115,9 +172,11 @@ class ForecastLog(models.Model):
     forecast_date = models.DateField()
     temperature_min = models.FloatField()
     temperature_max = models.FloatField()
+    temperature_mean = models.FloatField(null=True, blank=True)
     humidity = models.IntegerField()
     condition = models.CharField(max_length=200)
     rain_probability = models.FloatField(default=0)
+    rainfall = models.FloatField(default=0)  # Summed 3-hour rain volumes, in mm
     
     recorded_at = models.DateTimeField(auto_now_add=True)
     
@@ -127,4 +186,5 @@ class ForecastLog(models.Model):
         verbose_name_plural = 'Forecast Logs'
     
     def __str__(self):
-        return f"{self.user.email} - {self.city} - {self.forecast_date}"
+        owner = self.user.email if self.user else f"{self.latitude}, {self.longitude}"
+        return f"{owner} - {self.city} - {self.forecast_date}"
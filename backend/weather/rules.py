@@ -0,0 +1,365 @@
+"""
+Weather rule engine shared by the dashboard (alerts, risk score,
+insights) and the alert emails.
+
+This module provides:
+1. RULES: the single table of weather thresholds and what each one
+   produces (an alert, risk points and recommendations, an insight)
+2. observations() / from_payloads(): columnar NumPy arrays of weather
+   observations for any number of locations
+3. evaluate(): which rules fire for every observation, vectorized over
+   the observations
+4. alerts(), risk_scores(), insights(): per-location results
+
+Units are fixed: temperature in °C, humidity in %, wind speed in m/s
+(OpenWeatherMap's metric units). Presentation units (e.g. km/h in emails)
+are only used in messages.
+
+Rules are grouped; within a group only the first matching rule in table
+order fires (e.g. a heat warning replaces the high temperature alert).
+Rules with op 'always' fire for every available observation, so they act
+as a group's default. Missing observations (None payloads) fire nothing.
+
+Risk points have their own groups and cut-offs: the risk score keeps the
+dashboard's original strict ranges (e.g. 12°C is moderate temperature
+stress without raising a cold alert).
+"""
+
+import numpy as np
+
+
+# Alert and insight thresholds (°C, %, m/s)
+TEMP_EXTREME_HEAT = 35
+TEMP_HEAT = 32
+TEMP_COLD = 10
+TEMP_FROST = 5
+TEMP_OPTIMAL = (20, 30)
+HUMIDITY_EXTREME = 90
+HUMIDITY_HIGH = 80
+HUMIDITY_MOIST = 70
+HUMIDITY_DRY = 30
+WIND_STORM = 15
+WIND_STRONG = 10
+
+# Risk score ranges (°C, %); values strictly outside a range score its points
+TEMP_RISK_EXTREME = (10, 35)
+TEMP_RISK_MODERATE = (15, 32)
+HUMIDITY_RISK_EXTREME = (30, 90)
+HUMIDITY_RISK_MODERATE = (40, 80)
+WIND_RISK_HIGH = 15
+WIND_RISK_MODERATE = 10
+
+# OpenWeatherMap condition groups that bring rain
+RAIN_CONDITIONS = {'rain', 'drizzle', 'thunderstorm'}
+
+TEMPERATURE_TIPS = ['Consider irrigation during cooler hours', 'Provide shade for sensitive crops']
+HUMIDITY_TIPS = ['Monitor for fungal diseases', 'Ensure proper ventilation']
+WIND_TIPS = ['Stake tall plants', 'Delay spraying operations']
+
+RULES = [
+    # Temperature
+    {
+        'group': 'temperature', 'field': 'temperature', 'op': '>=', 'value': TEMP_EXTREME_HEAT,
+        'alert': {'type': 'heat_warning', 'severity': 'high', 'icon': '🔥', 'title': 'Heat Warning',
+                  'description': 'Temperature is {temperature}°C. Protect your crops from heat stress. '
+                                 'Water plants early morning or late evening.'},
+    },
+    {
+        'group': 'temperature', 'field': 'temperature', 'op': '>=', 'value': TEMP_HEAT,
+        'alert': {'type': 'heat_warning', 'severity': 'medium', 'icon': '☀️', 'title': 'High Temperature Alert',
+                  'description': 'Temperature is {temperature}°C. Consider shade covers for sensitive crops.'},
+    },
+    {
+        'group': 'temperature', 'field': 'temperature', 'op': '<=', 'value': TEMP_FROST,
+        'alert': {'type': 'frost_warning', 'severity': 'high', 'icon': '❄️', 'title': 'Frost Warning',
+                  'description': 'Temperature is {temperature}°C. Protect crops from cold damage. '
+                                 'Cover sensitive plants.'},
+    },
+    {
+        'group': 'temperature', 'field': 'temperature', 'op': '<=', 'value': TEMP_COLD,
+        'alert': {'type': 'cold_warning', 'severity': 'medium', 'icon': '🌡️', 'title': 'Cold Alert',
+                  'description': 'Temperature dropped to {temperature}°C. Monitor cold-sensitive crops.'},
+    },
+    
+    # Humidity
+    {
+        'group': 'humidity', 'field': 'humidity', 'op': '>=', 'value': HUMIDITY_EXTREME,
+        'alert': {'type': 'humidity_warning', 'severity': 'medium', 'icon': '💧', 'title': 'High Humidity Alert',
+                  'description': 'Humidity at {humidity}%. Watch for fungal diseases. Ensure good ventilation.'},
+    },
+    {
+        'group': 'humidity', 'field': 'humidity', 'op': '<=', 'value': HUMIDITY_DRY,
+        'alert': {'type': 'drought_risk', 'severity': 'medium', 'icon': '🏜️', 'title': 'Low Humidity Alert',
+                  'description': 'Humidity at {humidity}%. Increase watering frequency for crops.'},
+    },
+    
+    # Wind
+    {
+        'group': 'wind', 'field': 'wind_speed', 'op': '>=', 'value': WIND_STORM,
+        'alert': {'type': 'storm_warning', 'severity': 'critical', 'icon': '🌪️', 'title': 'Storm Warning',
+                  'description': 'Wind speed {wind_speed} m/s ({wind_kmh} km/h). Secure equipment and protect crops!'},
+    },
+    {
+        'group': 'wind', 'field': 'wind_speed', 'op': '>=', 'value': WIND_STRONG,
+        'alert': {'type': 'wind_warning', 'severity': 'medium', 'icon': '💨', 'title': 'Strong Wind Alert',
+                  'description': 'Wind speed {wind_speed} m/s ({wind_kmh} km/h). Consider wind barriers for tall crops.'},
+    },
+    
+    # Rain
+    {
+        'group': 'rain', 'field': 'raining', 'op': 'is',
+        'alert': {'type': 'rain_alert', 'severity': 'low', 'icon': '🌧️', 'title': 'Rain Expected',
+                  'description': '{description}. Plan irrigation and harvesting accordingly.'},
+    },
+    
+    # Risk score
+    {
+        'group': 'temperature_risk', 'field': 'temperature', 'op': 'outside', 'value': TEMP_RISK_EXTREME,
+        'points': 30, 'factor': 'Extreme temperature', 'recommendations': TEMPERATURE_TIPS,
+    },
+    {
+        'group': 'temperature_risk', 'field': 'temperature', 'op': 'outside', 'value': TEMP_RISK_MODERATE,
+        'points': 15, 'factor': 'Moderate temperature stress', 'recommendations': TEMPERATURE_TIPS,
+    },
+    {
+        'group': 'humidity_risk', 'field': 'humidity', 'op': 'outside', 'value': HUMIDITY_RISK_EXTREME,
+        'points': 25, 'factor': 'Extreme humidity', 'recommendations': HUMIDITY_TIPS,
+    },
+    {
+        'group': 'humidity_risk', 'field': 'humidity', 'op': 'outside', 'value': HUMIDITY_RISK_MODERATE,
+        'points': 10, 'factor': 'Moderate humidity concern', 'recommendations': HUMIDITY_TIPS,
+    },
+    {
+        'group': 'wind_risk', 'field': 'wind_speed', 'op': '>', 'value': WIND_RISK_HIGH,
+        'points': 25, 'factor': 'High wind speed', 'recommendations': WIND_TIPS,
+    },
+    {
+        'group': 'wind_risk', 'field': 'wind_speed', 'op': '>', 'value': WIND_RISK_MODERATE,
+        'points': 10, 'factor': 'Moderate wind', 'recommendations': WIND_TIPS,
+    },
+    
+    # Insights (one per group for every location)
+    {
+        'group': 'irrigation', 'field': 'humidity', 'op': '>', 'value': HUMIDITY_MOIST,
+        'insight': {'category': 'irrigation', 'title': 'Irrigation Recommendation', 'priority': 'low',
+                    'description': 'With current humidity at {humidity}%, reduce watering.'},
+    },
+    {
+        'group': 'irrigation', 'op': 'always',
+        'insight': {'category': 'irrigation', 'title': 'Irrigation Recommendation', 'priority': 'medium',
+                    'description': 'With current humidity at {humidity}%, maintain regular watering schedule.'},
+    },
+    {
+        'group': 'pest_control', 'field': 'humidity', 'op': '>', 'value': HUMIDITY_HIGH,
+        'insight': {'category': 'pest_control', 'title': 'Pest & Disease Alert', 'priority': 'high',
+                    'description': 'Current conditions favor fungal growth. Monitor closely.'},
+    },
+    {
+        'group': 'pest_control', 'op': 'always',
+        'insight': {'category': 'pest_control', 'title': 'Pest & Disease Alert', 'priority': 'low',
+                    'description': 'Current conditions are moderate for pest activity.'},
+    },
+    {
+        'group': 'planting', 'field': 'temperature', 'op': 'between', 'value': TEMP_OPTIMAL,
+        'insight': {'category': 'planting', 'title': 'Planting Conditions', 'priority': 'medium',
+                    'description': 'Temperature of {temperature}°C is optimal for most crops.'},
+    },
+    {
+        'group': 'planting', 'op': 'always',
+        'insight': {'category': 'planting', 'title': 'Planting Conditions', 'priority': 'medium',
+                    'description': 'Temperature of {temperature}°C is suboptimal for most crops.'},
+    },
+    {
+        'group': 'harvest', 'op': 'always',
+        'insight': {'category': 'harvest', 'title': 'Harvest Timing', 'priority': 'low',
+                    'description': 'Best to harvest in early morning when moisture levels are optimal.'},
+    },
+]
+
+# Risk level thresholds on the summed points (checked in order)
+RISK_LEVELS = [(60, 'high'), (30, 'medium'), (0, 'low')]
+
+_OPS = {
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '<': np.less,
+    '<=': np.less_equal,
+}
+
+
+def observations(temperature, humidity, wind_speed, condition=None, description=None):
+    """
+    Build columnar observation arrays.
+    
+    Args:
+        temperature: Temperatures in °C (None where unavailable)
+        humidity: Relative humidity in %
+        wind_speed: Wind speeds in m/s
+        condition: OpenWeatherMap condition groups (weather[0].main), e.g. 'Rain'
+        description: Condition descriptions, used in messages
+    
+    Returns:
+        dict: Field name -> NumPy array (NaN for missing values)
+    """
+    n = len(temperature)
+    condition = list(condition) if condition is not None else [''] * n
+    description = list(description) if description is not None else [''] * n
+    return {
+        'temperature': np.array(temperature, dtype=float),
+        'humidity': np.array(humidity, dtype=float),
+        'wind_speed': np.array(wind_speed, dtype=float),
+        'raining': np.array([(c or '').lower() in RAIN_CONDITIONS for c in condition]),
+        'description': description,
+    }
+
+
+def from_payloads(payloads):
+    """
+    Build observation arrays from OpenWeatherMap /weather payloads.
+    
+    Args:
+        payloads: List of payloads (None where the location has no data)
+    """
+    def value(data, section, key):
+        return data[section][key] if data is not None else None
+    
+    def condition(data, key):
+        return (data.get('weather') or [{}])[0].get(key, '') if data is not None else ''
+    
+    return observations(
+        temperature=[value(data, 'main', 'temp') for data in payloads],
+        humidity=[value(data, 'main', 'humidity') for data in payloads],
+        wind_speed=[value(data, 'wind', 'speed') for data in payloads],
+        condition=[condition(data, 'main') for data in payloads],
+        description=[condition(data, 'description') for data in payloads],
+    )
+
+
+def evaluate(obs):
+    """
+    Find the rules that fire for every observation.
+    
+    Args:
+        obs: Observation arrays from observations() or from_payloads()
+    
+    Returns:
+        np.ndarray: Boolean matrix of shape (len(RULES), n_observations)
+    """
+    available = ~np.isnan(obs['temperature'])
+    matches = np.zeros((len(RULES), len(available)), dtype=bool)
+    for index, rule in enumerate(RULES):
+        op = rule['op']
+        if op == 'always':
+            hits = available
+        elif op == 'is':
+            hits = obs[rule['field']] & available
+        elif op == 'between':
+            low, high = rule['value']
+            column = obs[rule['field']]
+            hits = (column >= low) & (column <= high)
+        elif op == 'outside':
+            low, high = rule['value']
+            column = obs[rule['field']]
+            hits = (column < low) | (column > high)
+        else:
+            # NaN compares False, so missing observations never match
+            hits = _OPS[op](obs[rule['field']], rule['value'])
+        matches[index] = hits
+    
+    # Only the first matching rule of each group fires
+    taken = {}
+    for index, rule in enumerate(RULES):
+        group_taken = taken.get(rule['group'])
+        if group_taken is None:
+            taken[rule['group']] = matches[index].copy()
+        else:
+            matches[index] &= ~group_taken
+            group_taken |= matches[index]
+    return matches
+
+
+def _message_values(obs, column):
+    wind = obs['wind_speed'][column]
+    return {
+        'temperature': round(float(obs['temperature'][column]), 1),
+        'humidity': round(float(obs['humidity'][column])),
+        'wind_speed': round(float(wind), 1),
+        'wind_kmh': round(float(wind) * 3.6, 1),
+        'description': (obs['description'][column] or 'Rain').capitalize(),
+    }
+
+
+def _collect(obs, fired, output):
+    """Build output dicts (alerts or insights) for each observation."""
+    results = [[] for _ in range(fired.shape[1])]
+    values = {}
+    for index, rule in enumerate(RULES):
+        spec = rule.get(output)
+        if spec is None:
+            continue
+        for column in np.flatnonzero(fired[index]):
+            if column not in values:
+                values[column] = _message_values(obs, column)
+            item = dict(spec, description=spec['description'].format(**values[column]))
+            if output == 'alert':
+                item['message'] = f"{item['icon']} {item['title']}: {item['description']}"
+            results[column].append(item)
+    return results
+
+
+def alerts(obs, fired=None):
+    """
+    Alerts for every observation.
+    
+    Returns:
+        list: Per observation, a list of alert dicts with type, severity
+            (low/medium/high/critical), icon, title, description and
+            message (icon, title and description in one line)
+    """
+    return _collect(obs, evaluate(obs) if fired is None else fired, 'alert')
+
+
+def insights(obs, fired=None):
+    """
+    Farming insights for every observation.
+    
+    Returns:
+        list: Per observation, a list of insight dicts with category,
+            title, description and priority
+    """
+    return _collect(obs, evaluate(obs) if fired is None else fired, 'insight')
+
+
+def risk_scores(obs, fired=None):
+    """
+    Climate risk score for every observation.
+    
+    Returns:
+        list: Per observation, a dict with score (0-100), level
+            (low/medium/high, or unknown without data), factors and
+            recommendations
+    """
+    fired = evaluate(obs) if fired is None else fired
+    points = np.array([rule.get('points', 0) for rule in RULES])
+    scores = np.minimum(points @ fired, 100)
+    levels = np.select([scores >= threshold for threshold, _ in RISK_LEVELS], [level for _, level in RISK_LEVELS])
+    available = ~np.isnan(obs['temperature'])
+    
+    results = []
+    for column in range(fired.shape[1]):
+        if not available[column]:
+            results.append({'score': 0, 'level': 'unknown', 'factors': [], 'recommendations': []})
+            continue
+        factors, recommendations = [], []
+        for index in np.flatnonzero(fired[:, column]):
+            rule = RULES[index]
+            if rule.get('factor'):
+                factors.append(rule['factor'])
+                recommendations.extend(rule['recommendations'])
+        results.append({
+            'score': int(scores[column]),
+            'level': str(levels[column]),
+            'factors': factors,
+            'recommendations': recommendations,
+        })
+    return results
@@ -0,0 +1,483 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import timedelta
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from notifications.services import _format_weather, get_weather_alerts_for_location, get_weather_for_location
+from securecrop import http
+from . import client, history, rules
+from .models import ForecastLog, WeatherDailySummary, WeatherLog
+
+
+def current_weather_payload(lat, lon):
+    """A minimal OpenWeatherMap /weather response."""
+    return {
+        'coord': {'lat': lat, 'lon': lon},
+        'weather': [{'main': 'Clouds', 'description': 'scattered clouds', 'icon': '03d'}],
+        'main': {'temp': 31.5, 'feels_like': 36.0, 'humidity': 82, 'pressure': 1009},
+        'wind': {'speed': 3.1, 'deg': 200},
+        'clouds': {'all': 40},
+        'visibility': 10000,
+        'sys': {'country': 'MY', 'sunrise': 1700000000, 'sunset': 1700040000},
+        'name': 'Kuala Lumpur' if lat < 4 else 'George Town',
+        'dt': 1700020000,
+    }
+
+
+def forecast_payload(lat, lon):
+    """
+    A minimal OpenWeatherMap /forecast response: two local (UTC+8) days of 3-hour slots.
+    
+    Day one is 24-31.5°C and dry; day two is 25-32.5°C with 2mm of rain
+    in each of its first four slots.
+    """
+    start = 1699977600  # 2023-11-15 00:00 in Kuala Lumpur
+    slots = []
+    for index in range(16):
+        day, hour = divmod(index, 8)
+        temp = 24 + day + hour
+        slot = {
+            'dt': start + index * 3 * 3600,
+            'main': {'temp': temp, 'temp_min': temp - 0.5, 'temp_max': temp + 0.5, 'humidity': 70 + hour},
+            'weather': [{'description': 'light rain' if day and hour < 4 else 'few clouds',
+                         'icon': '10d' if day and hour < 4 else '02d'}],
+            'wind': {'speed': 2.0 + hour / 2},
+            'pop': 0.2 * hour / 7 + 0.5 * day,
+        }
+        if day and hour < 4:
+            slot['rain'] = {'3h': 2.0}
+        slots.append(slot)
+    return {
+        'cnt': len(slots),
+        'list': slots,
+        'city': {'name': 'Kuala Lumpur' if lat < 4 else 'George Town', 'timezone': 28800},
+    }
+
+
+class OpenWeatherStubServer:
+    """
+    Local HTTP server standing in for the OpenWeatherMap 2.5 API.
+    
+    Use as a context manager; while active, OPENWEATHER_API_URL points at
+    the stub. Every request is recorded as (path, query params), and the
+    client port of each request in ports. statuses scripts the status of
+    the first responses; later ones use status. weather builds the
+    /weather payload for (lat, lon).
+    """
+    
+    def __init__(self, delay=0.0, status=200, statuses=(), weather=current_weather_payload):
+        self.delay = delay
+        self.status = status
+        self.statuses = list(statuses)
+        self.weather = weather
+        self.requests = []
+        self.ports = []
+        stub = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, so pooled connections can be observed
+            protocol_version = 'HTTP/1.1'
+            
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                if self.headers.get('Content-Length'):
+                    self.rfile.read(int(self.headers['Content-Length']))
+                stub.requests.append((url.path, params))
+                stub.ports.append(self.client_address[1])
+                time.sleep(stub.delay)
+                status = stub.statuses.pop(0) if stub.statuses else stub.status
+                lat, lon = float(params.get('lat', 0)), float(params.get('lon', 0))
+                if status == 200 and url.path.endswith('/forecast'):
+                    body = forecast_payload(lat, lon)
+                elif status == 200:
+                    body = stub.weather(lat, lon)
+                else:
+                    body = {'cod': stub.status, 'message': 'Invalid API key'}
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            
+            do_POST = do_GET
+            
+            def log_message(self, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/data/2.5"
+    
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self._env = mock.patch.dict('os.environ', {'OPENWEATHER_API_URL': self.url})
+        self._env.start()
+        client.clear_weather_cache()
+        http.reset()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._env.stop()
+        self.server.shutdown()
+        self.server.server_close()
+        client.clear_weather_cache()
+
+
+class WeatherClientTest(TestCase):
+    """Test cases for the shared current-weather cache."""
+    
+    def setUp(self):
+        self.client = APIClient()
+    
+    def test_dashboard_load_makes_one_upstream_call(self):
+        """Current weather, alerts, risk score and insights share one fetch."""
+        params = {'lat': 3.1390, 'lon': 101.6869}
+        with OpenWeatherStubServer() as owm:
+            for name in ['current-weather', 'alerts', 'risk-score', 'insights']:
+                response = self.client.get(reverse(name), params)
+                self.assertEqual(response.status_code, 200)
+            self.assertEqual(get_weather_for_location(3.1391, 101.6871)['city'], 'Kuala Lumpur')
+        
+        self.assertEqual(len(owm.requests), 1)
+        self.assertEqual(owm.requests[0][0], '/data/2.5/weather')
+    
+    def test_cells_are_geo_bucketed(self):
+        """Nearby coordinates share a cell; distant ones do not."""
+        self.assertEqual(client.cell_key('3.1390', '101.6869'), client.cell_key(3.1441, 101.6851))
+        with OpenWeatherStubServer() as owm:
+            client.get_current_weather(3.1390, 101.6869)
+            client.get_current_weather(3.1441, 101.6851)
+            client.get_current_weather(5.4141, 100.3288)
+        self.assertEqual(len(owm.requests), 2)
+        self.assertEqual(owm.requests[0][1]['lat'], '3.14')
+    
+    def test_concurrent_misses_coalesce(self):
+        """Simultaneous misses for one cell wait for a single upstream call."""
+        with OpenWeatherStubServer(delay=0.3) as owm:
+            results = []
+            threads = [
+                threading.Thread(target=lambda: results.append(client.get_current_weather(3.139, 101.687)))
+                for _ in range(8)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        
+        self.assertEqual(len(results), 8)
+        self.assertEqual(len(owm.requests), 1)
+    
+    def test_errors_are_not_cached(self):
+        """Upstream errors keep the view's status code and are retried."""
+        with OpenWeatherStubServer(status=401) as owm:
+            response = self.client.get(reverse('current-weather'), {'lat': 3.139, 'lon': 101.687})
+            self.assertEqual(response.status_code, 401)
+            self.assertEqual(response.data['detail'], 'Invalid API key')
+            self.assertIsNone(get_weather_for_location(3.139, 101.687))
+        self.assertEqual(len(owm.requests), 2)
+
+
+class ForecastCacheTest(TestCase):
+    """Test cases for the per-cell forecast cache and daily aggregates."""
+    
+    def test_daily_aggregates(self):
+        """Slots are grouped by local day and summarised once."""
+        first, second = client.aggregate_daily(forecast_payload(3.139, 101.687))
+        
+        self.assertEqual(first['date'], '2023-11-15')
+        self.assertEqual(first['temperature_min'], 23.5)
+        self.assertEqual(first['temperature_max'], 31.5)
+        self.assertEqual(first['temperature_mean'], 27.5)
+        self.assertEqual(first['rain_probability'], 20)
+        self.assertEqual(first['rainfall'], 0)
+        self.assertEqual(first['condition'], 'few clouds')
+        
+        self.assertEqual(second['date'], '2023-11-16')
+        self.assertEqual(second['temperature_max'], 32.5)
+        self.assertEqual(second['rain_probability'], 70)
+        self.assertEqual(second['rainfall'], 8.0)
+        self.assertEqual(second['wind_speed'], 5.5)
+    
+    def test_ttl_follows_upstream_cadence(self):
+        """Entries expire after the next 3-hour forecast run is published."""
+        with self.settings(WEATHER_FORECAST_PUBLISH_DELAY=600):
+            run = 1699984800  # 2023-11-14 18:00 UTC
+            self.assertEqual(client.forecast_ttl(now=run + 3600), 2 * 3600 + 600)
+            self.assertEqual(client.forecast_ttl(now=run + 3 * 3600 - 1), 1 + 600)
+    
+    def test_repeat_loads_are_served_from_cache(self):
+        """Repeat dashboard loads in a cell make no upstream calls or inserts."""
+        api = APIClient()
+        with OpenWeatherStubServer() as owm:
+            with self.assertNumQueries(1):
+                response = api.get(reverse('forecast'), {'lat': 3.1390, 'lon': 101.6869, 'days': 3})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([day['date'] for day in response.data], ['2023-11-15', '2023-11-16'])
+            self.assertEqual(response.data[1]['rainfall'], 8.0)
+            
+            with self.assertNumQueries(0):
+                response = api.get(reverse('forecast'), {'lat': 3.1391, 'lon': 101.6871, 'days': 1})
+            self.assertEqual(len(response.data), 1)
+        
+        self.assertEqual(len(owm.requests), 1)
+        self.assertEqual(owm.requests[0][0], '/data/2.5/forecast')
+        self.assertNotIn('cnt', owm.requests[0][1])
+        
+        logs = ForecastLog.objects.order_by('forecast_date')
+        self.assertEqual(logs.count(), 2)
+        self.assertIsNone(logs[0].user)
+        self.assertEqual((logs[0].latitude, logs[0].city), (3.14, 'Kuala Lumpur'))
+        self.assertEqual(logs[1].rainfall, 8.0)
+        self.assertEqual(logs[1].temperature_mean, 28.5)
+    
+    def test_forecast_errors_are_not_cached(self):
+        """A failed fetch keeps its status and is retried on the next load."""
+        with OpenWeatherStubServer(status=401) as owm:
+            response = APIClient().get(reverse('forecast'), {'lat': 3.139, 'lon': 101.687})
+            self.assertEqual(response.status_code, 401)
+            owm.status = 200
+            response = APIClient().get(reverse('forecast'), {'lat': 3.139, 'lon': 101.687})
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(owm.requests), 2)
+        self.assertEqual(ForecastLog.objects.count(), 2)
+
+
+class WeatherHistoryTest(TestCase):
+    """Test cases for the recorded weather history and its daily rollup."""
+    
+    def setUp(self):
+        history.clear_recorded()
+    
+    def observation(self, timestamp, temp, humidity, rain=0):
+        data = dict(current_weather_payload(3.139, 101.687), dt=timestamp)
+        data['main'] = dict(data['main'], temp=temp, humidity=humidity)
+        if rain:
+            data['rain'] = {'1h': rain}
+        return data
+    
+    def test_fetches_are_recorded_once_per_interval(self):
+        """Upstream fetches append to WeatherLog, deduplicated per cell and hour."""
+        with OpenWeatherStubServer() as owm:
+            client.get_current_weather(3.1390, 101.6869)
+            client._current_cache.clear()
+            client.get_current_weather(3.1391, 101.6871)
+            client.get_current_weather_many([(5.4141, 100.3288), (3.1390, 101.6869)])
+        
+        self.assertEqual(len(owm.requests), 3)
+        self.assertEqual(
+            sorted(WeatherLog.objects.values_list('cell_lat', 'cell_lon')),
+            [(3.14, 101.69), (5.41, 100.33)]
+        )
+        self.assertEqual(WeatherDailySummary.objects.get(cell_lat=3.14).samples, 1)
+    
+    def test_history_served_from_daily_rollup(self):
+        """Observations are folded into daily summaries read with one query."""
+        midnight = int(time.time()) // 86400 * 86400
+        cell = (3.14, 101.69)
+        for timestamp, temp, humidity, rain in [
+            (midnight - 86400 + 3600, 25.0, 90, 0),
+            (midnight + 3600, 24.0, 88, 1.5),
+            (midnight + 3600 + 1800, 99.0, 10, 9.9),  # same interval: ignored
+            (midnight + 2 * 3600, 30.0, 70, 0.5),
+            (midnight + 3 * 3600, 32.0, 60, 0),
+        ]:
+            history.record_observation(cell, self.observation(timestamp, temp, humidity, rain))
+        
+        self.assertEqual(WeatherLog.objects.count(), 4)
+        with self.assertNumQueries(1):
+            response = APIClient().get(reverse('history'), {'lat': 3.139, 'lon': 101.687, 'days': 2})
+        self.assertEqual(response.status_code, 200)
+        yesterday, today = response.data
+        self.assertEqual(yesterday['samples'], 1)
+        self.assertEqual(today['samples'], 3)
+        self.assertEqual((today['temp_min'], today['temp_max'], today['temp_avg']), (24.0, 32.0, 28.7))
+        self.assertEqual(today['humidity'], 73)
+        self.assertEqual(today['rainfall'], 2.0)
+        
+        response = APIClient().get(reverse('history'), {'lat': 3.139, 'lon': 101.687, 'days': 1})
+        self.assertEqual([day['date'] for day in response.data], [today['date']])
+    
+    def test_history_rejects_bad_days(self):
+        """Zero, negative and non-numeric day counts are a 400, not a server error."""
+        for days in ['0', '-1', 'week']:
+            response = APIClient().get(reverse('history'), {'lat': 3.139, 'lon': 101.687, 'days': days})
+            self.assertEqual(response.status_code, 400)
+    
+    def test_prune_history(self):
+        """Raw observations expire before the daily summaries."""
+        midnight = int(time.time()) // 86400 * 86400
+        history.record_observation((3.14, 101.69), self.observation(midnight - 40 * 86400, 25.0, 80))
+        history.record_observation((3.14, 101.69), self.observation(midnight + 3600, 27.0, 80))
+        WeatherLog.objects.filter(weather_timestamp__lt=midnight).update(
+            recorded_at=timezone.now() - timedelta(days=40)
+        )
+        
+        self.assertEqual(history.prune_history(log_days=30, summary_days=365), {'logs': 1, 'summaries': 0})
+        self.assertEqual(WeatherDailySummary.objects.count(), 2)
+        self.assertEqual(history.prune_history(log_days=30, summary_days=30), {'logs': 0, 'summaries': 1})
+
+
+class RuleEngineTest(TestCase):
+    """Test cases for the shared weather rule engine."""
+    
+    def test_alert_tiers_per_location(self):
+        """Each group yields its most severe matching alert, for all locations at once."""
+        obs = rules.observations(
+            temperature=[36, 33, 4, 25, None],
+            humidity=[60, 92, 25, 85, None],
+            wind_speed=[2, 11, 16, 3, None],
+            condition=['Clear', 'Clouds', 'Clear', 'Rain', ''],
+            description=['clear sky', 'broken clouds', 'clear sky', 'light rain', '']
+        )
+        types = [[alert['type'] for alert in location] for location in rules.alerts(obs)]
+        
+        self.assertEqual(types, [
+            ['heat_warning'],
+            ['heat_warning', 'humidity_warning', 'wind_warning'],
+            ['frost_warning', 'drought_risk', 'storm_warning'],
+            ['rain_alert'],
+            [],
+        ])
+        self.assertEqual(rules.alerts(obs)[0][0]['severity'], 'high')
+        self.assertEqual(rules.alerts(obs)[1][0]['severity'], 'medium')
+        self.assertEqual(rules.alerts(obs)[3][0]['message'], '🌧️ Rain Expected: Light rain. Plan irrigation and harvesting accordingly.')
+    
+    def test_risk_scores_and_insights(self):
+        """Risk points and insights come from the same rule table."""
+        obs = rules.observations(temperature=[36, 25, None], humidity=[92, 50, None], wind_speed=[16, 2, None])
+        extreme, calm, missing = rules.risk_scores(obs)
+        
+        self.assertEqual(extreme['score'], 80)
+        self.assertEqual(extreme['level'], 'high')
+        self.assertEqual(extreme['factors'], ['Extreme temperature', 'Extreme humidity', 'High wind speed'])
+        self.assertIn('Delay spraying operations', extreme['recommendations'])
+        self.assertEqual((calm['score'], calm['level'], calm['factors']), (0, 'low', []))
+        self.assertEqual(missing['level'], 'unknown')
+        
+        hot, mild, none = rules.insights(obs)
+        self.assertEqual([insight['priority'] for insight in hot], ['low', 'high', 'medium', 'low'])
+        self.assertIn('suboptimal', hot[2]['description'])
+        self.assertIn('maintain regular watering', mild[0]['description'])
+        self.assertEqual(none, [])
+    
+    def test_risk_cut_offs(self):
+        """Risk points keep the dashboard's strict ranges, independent of the alert thresholds."""
+        obs = rules.observations(
+            temperature=[12, 8, 35, 32.5, 25, 25, 25],
+            humidity=[60, 60, 60, 60, 90, 80, 29],
+            wind_speed=[2, 2, 2, 2, 10, 15, 15.5]
+        )
+        scores = [result['score'] for result in rules.risk_scores(obs)]
+        self.assertEqual(scores, [15, 30, 15, 15, 10, 10, 25 + 25])
+        
+        # 35°C raises the heat warning while scoring as moderate stress
+        self.assertEqual(rules.alerts(obs)[2][0]['severity'], 'high')
+        self.assertEqual(rules.risk_scores(obs)[2]['factors'], ['Moderate temperature stress'])
+        self.assertEqual(rules.insights(obs)[5][1]['priority'], 'low')
+    
+    def test_dashboard_and_email_use_same_units(self):
+        """A 12 m/s wind raises the same alert on the dashboard and in emails."""
+        payload = current_weather_payload(3.139, 101.687)
+        payload['wind'] = {'speed': 12.0}
+        dashboard = rules.alerts(rules.from_payloads([payload]))[0]
+        email = get_weather_alerts_for_location(_format_weather(payload))
+        
+        self.assertEqual([alert['type'] for alert in dashboard], ['wind_warning'])
+        self.assertEqual(email, dashboard)
+        self.assertIn('43.2 km/h', email[0]['message'])
+
+
+@override_settings(HTTP_BACKOFF_BASE=0)
+class OutboundHTTPTest(TestCase):
+    """Test cases for the pooled, retrying outbound HTTP layer."""
+    
+    def test_connections_are_reused(self):
+        """Calls to one host share a keep-alive connection."""
+        with OpenWeatherStubServer() as owm:
+            for _ in range(3):
+                http.get(f"{owm.url}/weather").close()
+        self.assertEqual(len(set(owm.ports)), 1)
+        self.assertEqual(len(owm.ports), 3)
+    
+    def test_get_retried_post_not(self):
+        """GETs retry 5xx responses; POSTs (e.g. emails) are sent once."""
+        with OpenWeatherStubServer(statuses=[503, 200]) as owm:
+            self.assertEqual(http.get(f"{owm.url}/weather").status_code, 200)
+            self.assertEqual(len(owm.requests), 2)
+            
+            owm.statuses = [503, 200]
+            self.assertEqual(http.post(f"{owm.url}/email", json={}).status_code, 503)
+            self.assertEqual(len(owm.requests), 3)
+            
+            host = http.get_http_stats()[owm.url.split('/')[2]]
+        self.assertEqual(host['retries'], 1)
+        self.assertEqual(host['failures'], 2)
+        self.assertIsNotNone(host['latency_ms']['p95'])
+    
+    @override_settings(HTTP_READ_TIMEOUT=0.2, HTTP_RETRIES=1)
+    def test_default_timeout(self):
+        """Calls without a timeout still give up on a hung upstream."""
+        with OpenWeatherStubServer(delay=1.0) as owm:
+            start = time.monotonic()
+            with self.assertRaises(requests.Timeout):
+                http.get(f"{owm.url}/weather")
+            self.assertLess(time.monotonic() - start, 1.0)
+    
+    @override_settings(HTTP_RETRIES=0, HTTP_BREAKER_THRESHOLD=2, HTTP_BREAKER_RESET=0.2)
+    def test_circuit_breaker(self):
+        """A failing host is skipped until a trial call succeeds."""
+        with OpenWeatherStubServer(status=500) as owm:
+            http.get(f"{owm.url}/weather")
+            http.get(f"{owm.url}/weather")
+            with self.assertRaises(http.CircuitOpenError):
+                http.get(f"{owm.url}/weather")
+            self.assertEqual(len(owm.requests), 2)
+            
+            # Fail fast in the view instead of waiting on the upstream
+            response = APIClient().get(reverse('current-weather'), {'lat': 3.139, 'lon': 101.687})
+            self.assertEqual(response.status_code, 503)
+            
+            time.sleep(0.25)
+            owm.status = 200
+            self.assertEqual(http.get(f"{owm.url}/weather").status_code, 200)
+            self.assertEqual(http.get_http_stats()[owm.url.split('/')[2]]['circuit'], 'closed')
+    
+    def test_derived_views_degrade_on_outage(self):
+        """Timeouts and an open circuit give the no-data result, not a 500."""
+        params = {'lat': 3.139, 'lon': 101.687}
+        for error in [requests.ConnectTimeout('timed out'), http.CircuitOpenError('open')]:
+            with mock.patch('weather.views.get_current_weather', side_effect=error):
+                self.assertEqual(APIClient().get(reverse('alerts'), params).data, [])
+                self.assertEqual(APIClient().get(reverse('insights'), params).data, [])
+                risk = APIClient().get(reverse('risk-score'), params)
+            self.assertEqual(risk.status_code, 200)
+            self.assertEqual(risk.data['level'], 'unknown')
+    
+    @override_settings(HTTP_RETRIES=0, HTTP_BREAKER_THRESHOLD=1, HTTP_BREAKER_RESET=0.2)
+    def test_trial_settled_on_unexpected_error(self):
+        """A half-open trial that raises a non-requests error does not keep the circuit shut."""
+        with OpenWeatherStubServer(status=500) as owm:
+            url = f"{owm.url}/weather"
+            http.get(url)
+            time.sleep(0.25)
+            
+            _, host = http._get_host(url)
+            with mock.patch.object(host.session, 'request', side_effect=ValueError('bad params')):
+                with self.assertRaises(ValueError):
+                    http.get(url)
+            self.assertEqual(host.breaker.state, 'open')
+            
+            time.sleep(0.25)
+            owm.status = 200
+            self.assertEqual(http.get(url).status_code, 200)
+            self.assertEqual(host.breaker.state, 'closed')
@@ -9,6 +9,7 @@ interface ForecastCardProps {
   temperature_max: number;
   temperature_min: number;
   rain_probability: number;
+  rainfall?: number;
   condition: string;
   condition_icon: string;
 }
@@ -18,6 +19,7 @@ export const ForecastCard: React.FC<ForecastCardProps> = ({
   temperature_max,
   temperature_min,
   rain_probability,
+  rainfall = 0,
   condition,
   condition_icon,
 }) => {
@@ -55,6 +57,7 @@ export const ForecastCard: React.FC<ForecastCardProps> = ({
             <path fillRule="evenodd" d="M5.5 3A2.5 2.5 0 0 0 3 5.5c0 .536.17 1.031.459 1.436C2.57 7.417 2 8.15 2 9c0 1.105.895 2 2 2h10c1.105 0 2-.895 2-2 0-.85-.57-1.583-1.459-2.064A2.488 2.488 0 0 0 15 5.5 2.5 2.5 0 0 0 12.5 3c-.76 0-1.438.337-1.898.87A2.99 2.99 0 0 0 8 3a2.99 2.99 0 0 0-2.602.87A2.486 2.486 0 0 0 5.5 3z" clipRule="evenodd"/>
           </svg>
           <span className="text-xs font-medium">{Math.round(rain_probability)}%</span>
+          {rainfall > 0 && <span className="text-xs text-blue-500">· {rainfall} mm</span>}
         </div>
       )}
     </div>
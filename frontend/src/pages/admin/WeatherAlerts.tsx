@@ -42,6 +42,10 @@ interface AlertHistory {
 const WeatherAlerts: React.FC = () => {
     const [stats, setStats] = useState<Stats | null>(null);
     const [eligibleUsers, setEligibleUsers] = useState<User[]>([]);
+    const [eligibleCount, setEligibleCount] = useState(0);
+    const [eligiblePage, setEligiblePage] = useState(1);
+    const [hasMoreUsers, setHasMoreUsers] = useState(false);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [alertHistory, setAlertHistory] = useState<AlertHistory[]>([]);
     const [selectedUsers, setSelectedUsers] = useState<number[]>([]);
     const [loading, setLoading] = useState(true);
@@ -66,6 +70,9 @@ const WeatherAlerts: React.FC = () => {
             ]);
             setStats(statsRes);
             setEligibleUsers(usersRes.eligible_users?.users || []);
+            setEligibleCount(usersRes.eligible_users?.count || 0);
+            setEligiblePage(1);
+            setHasMoreUsers(Boolean(usersRes.eligible_users?.next));
             setUsersWithoutLocation(usersRes.users_without_location?.count || 0);
             setAlertHistory(historyRes.alerts || []);
         } catch (error: any) {
@@ -76,12 +83,27 @@ const WeatherAlerts: React.FC = () => {
         }
     };
 
+    // Eligible farmers are paginated; load the next page on demand
+    const loadMoreUsers = async () => {
+        try {
+            setLoadingMore(true);
+            const usersRes = await notificationsAPI.getEligibleUsers(eligiblePage + 1);
+            setEligibleUsers(prev => [...prev, ...(usersRes.eligible_users?.users || [])]);
+            setEligiblePage(eligiblePage + 1);
+            setHasMoreUsers(Boolean(usersRes.eligible_users?.next));
+        } catch (error: any) {
+            setErrorMessage(error.response?.data?.detail || 'Failed to load more farmers.');
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     const handleSendToAll = async () => {
-        if (eligibleUsers.length === 0) {
+        if (eligibleCount === 0) {
             setErrorMessage('No eligible farmers to send alerts to');
             return;
         }
-        if (!window.confirm(`Send weather alerts to all ${eligibleUsers.length} eligible farmers?`)) return;
+        if (!window.confirm(`Send weather alerts to all ${eligibleCount} eligible farmers?`)) return;
 
         try {
             setSending(true);
@@ -225,13 +247,13 @@ const WeatherAlerts: React.FC = () => {
                                     <div className="flex flex-wrap gap-4">
                                         <button
                                             onClick={handleSendToAll}
-                                            disabled={sending || eligibleUsers.length === 0}
-                                            className={`px-6 py-3 rounded-lg font-semibold transition-all flex items-center gap-2 ${sending || eligibleUsers.length === 0
+                                            disabled={sending || eligibleCount === 0}
+                                            className={`px-6 py-3 rounded-lg font-semibold transition-all flex items-center gap-2 ${sending || eligibleCount === 0
                                                     ? 'bg-gray-300 text-gray-500 cursor-not-allowed'
                                                     : 'bg-green-600 hover:bg-green-700 text-white shadow-lg'
                                                 }`}
                                         >
-                                            {sending ? '⏳ Sending...' : `🌍 Send to All (${eligibleUsers.length} farmers)`}
+                                            {sending ? '⏳ Sending...' : `🌍 Send to All (${eligibleCount} farmers)`}
                                         </button>
                                         <button
                                             onClick={handleSendToSelected}
@@ -255,7 +277,7 @@ const WeatherAlerts: React.FC = () => {
                                 <div className="bg-white rounded-xl border border-gray-200 p-6 shadow-sm">
                                     <div className="flex items-center justify-between mb-4">
                                         <h2 className="text-lg font-semibold text-gray-800 flex items-center gap-2">
-                                            👥 Eligible Farmers
+                                            👥 Eligible Farmers {eligibleCount > 0 && `(${eligibleUsers.length} of ${eligibleCount})`}
                                         </h2>
                                         {eligibleUsers.length > 0 && (
                                             <button
@@ -309,6 +331,17 @@ const WeatherAlerts: React.FC = () => {
                                             ))}
                                         </div>
                                     )}
+                                    {hasMoreUsers && (
+                                        <div className="text-center mt-4">
+                                            <button
+                                                onClick={loadMoreUsers}
+                                                disabled={loadingMore}
+                                                className="text-sm text-green-600 hover:text-green-700 font-medium"
+                                            >
+                                                {loadingMore ? '⏳ Loading...' : 'Load more farmers'}
+                                            </button>
+                                        </div>
+                                    )}
                                 </div>
                             </div>
                         )}
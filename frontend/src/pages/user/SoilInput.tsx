@@ -1,8 +1,8 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import Layout from '../../components/Layout';
 import { Card, Input, Button, Badge } from '../../components/UI';
 import { LocationSelector, LocationData } from '../../components/LocationSelector';
-import { soilAPI } from '../../services/api';
+import { soilAPI, recommendationAPI } from '../../services/api';
 import { Sprout, AlertTriangle, CheckCircle, Shield, TrendingUp, TrendingDown, Minus, Lightbulb, Droplets, ThermometerSun, Activity, Printer } from 'lucide-react';
 import type { SoilInputResponse } from '../../types';
 
@@ -41,6 +41,32 @@ const SoilInput: React.FC = () => {
     return { status: 'acceptable', color: 'yellow', icon: Minus };
   };
 
+  // The farming guide is generated in the background; poll until it is ready
+  useEffect(() => {
+    if (!result || result.farming_guide_status !== 'PENDING') return;
+
+    const recommendationId = result.recommendation.id;
+    let attempts = 0;
+    const timer = setInterval(async () => {
+      attempts += 1;
+      try {
+        const guide = await recommendationAPI.getFarmingGuide(recommendationId);
+        if (guide.farming_guide_status !== 'PENDING' || attempts >= 30) {
+          clearInterval(timer);
+          setResult((current) =>
+            current && current.recommendation.id === recommendationId
+              ? { ...current, farming_guide: guide.farming_guide, farming_guide_status: guide.farming_guide_status }
+              : current
+          );
+        }
+      } catch {
+        clearInterval(timer);
+      }
+    }, 2000);
+
+    return () => clearInterval(timer);
+  }, [result?.recommendation.id, result?.farming_guide_status]);
+
   const handleChange = (e: React.ChangeEvent<HTMLInputElement>) => {
     setFormData({
       ...formData,
@@ -602,6 +628,12 @@ const SoilInput: React.FC = () => {
                 </div>
 
                 {/* AI Farming Guide */}
+                {!result.farming_guide && result.farming_guide_status === 'PENDING' && (
+                  <div className="bg-purple-50 border-2 border-purple-200 rounded-2xl p-6 flex items-center gap-3">
+                    <Lightbulb size={24} className="text-purple-600 animate-pulse" />
+                    <p className="text-sm text-purple-700">Preparing your AI farming guide...</p>
+                  </div>
+                )}
                 {result.farming_guide && (
                   <div className="bg-gradient-to-br from-purple-50 via-indigo-50 to-blue-50 border-2 border-purple-200 rounded-2xl p-6 shadow-lg">
                     <div className="flex items-center gap-3 mb-6">
@@ -7,6 +7,7 @@ import type {
   SoilInputResponse,
   SoilInput,
   Recommendation,
+  FarmingGuideResponse,
   FeedbackData,
   Feedback,
   CyberLog,
@@ -118,6 +119,12 @@ export const recommendationAPI = {
     const response = await api.get(`/recommendations/${id}/`);
     return response.data;
   },
+
+  // Returns status PENDING (HTTP 202) until the guide has been generated
+  getFarmingGuide: async (id: number): Promise<FarmingGuideResponse> => {
+    const response = await api.get(`/recommendations/${id}/farming-guide/`);
+    return response.data;
+  },
 };
 
 // Feedback APIs
@@ -177,8 +184,8 @@ export const notificationsAPI = {
     return response.data;
   },
 
-  getEligibleUsers: async () => {
-    const response = await api.get('/notifications/eligible-users/');
+  getEligibleUsers: async (page = 1) => {
+    const response = await api.get('/notifications/eligible-users/', { params: { page } });
     return response.data;
   },
 
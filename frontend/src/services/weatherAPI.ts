@@ -91,9 +91,14 @@ export const weatherAPI = {
   },
 
   // Get weather history
-  getHistory: async (days: number = 7) => {
+  getHistory: async (lat?: number, lon?: number, days: number = 7) => {
+    const params: any = { days };
+    if (lat && lon) {
+      params.lat = lat;
+      params.lon = lon;
+    }
     const response = await axios.get(`${API_BASE_URL}/history/`, {
-      params: { days },
+      params,
       headers: getAuthHeader(),
     });
     return response.data;
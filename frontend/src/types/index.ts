@@ -73,10 +73,21 @@ export interface FarmingGuide {
   growth_duration: string;
 }
 
+export type FarmingGuideStatus = 'PENDING' | 'READY' | 'FAILED';
+
+export interface FarmingGuideResponse {
+  recommendation_id: number;
+  crop_name: string;
+  farming_guide_status: FarmingGuideStatus;
+  farming_guide: FarmingGuide | null;
+}
+
 export interface SoilInputResponse {
   soil_input: SoilInput;
   recommendation: Recommendation;
-  farming_guide?: FarmingGuide;
+  farming_guide?: FarmingGuide | null;
+  farming_guide_status?: FarmingGuideStatus;
+  farming_guide_url?: string;
   security_check: {
     anomaly_detected: boolean;
     integrity_status: string;